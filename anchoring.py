@@ -0,0 +1,303 @@
+"""Merkle-batched anchoring: one on-chain transaction for thousands of file records.
+
+With CHAIN_MODE=anchor, records that pass check_duplicate are queued as
+leaves in the local DB instead of going to storeFiles. Every
+ANCHOR_BATCH_SIZE leaves, or every ANCHOR_INTERVAL_S seconds, the pending
+leaves are built into a Merkle tree and only its root is sent, to
+DedupStorage.anchorRoot. Each record keeps its inclusion proof, which can
+be checked offline (verify_proof) or on chain (DedupStorage.verifyFile).
+The contract keeps anchors per sending address, so an on-chain check
+names the anchorer it trusts: this node's submitter, stored with the root.
+
+Hashing, the same on both sides:
+
+    leaf = sha256(0x00 || sha256 digest || phash as uint72 big-endian || CID)
+    node = sha256(0x01 || min(a, b) || max(a, b))
+
+An odd node is carried up unchanged. Sorted pairs mean a proof is just
+the sibling hashes from leaf to root, with no left/right bits.
+
+Anchored records are not in the contract's sha256/phash mappings, so
+cross-node dedup for them comes from the local DB and the replication log.
+
+Usage:
+    python anchoring.py flush                # anchor everything pending now
+    python anchoring.py status
+    python anchoring.py verify <sha256> [--on-chain]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import clients
+import storage
+from interact import encode_record
+from utils import metrics
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+RESUBMIT_AFTER_S = 900  # for roots recorded without a nonce: not on chain by then is presumed dropped
+
+
+def file_leaf(digest, phash, cid):
+    """DedupStorage.fileLeaf: leaf from the contract's (bytes32, uint72, string) arguments."""
+    return hashlib.sha256(LEAF_PREFIX + digest + phash.to_bytes(9, "big") + cid.encode()).digest()
+
+
+def leaf_hash(sha256, phash, cid):
+    """Leaf for a (sha256 hex, phash hex or None, cid) record."""
+    return file_leaf(*encode_record(sha256, phash, cid))
+
+
+def node_hash(a, b):
+    return hashlib.sha256(NODE_PREFIX + min(a, b) + max(a, b)).digest()
+
+
+def build_levels(leaves):
+    """All tree levels, leaves first and [root] last."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def proof_for(levels, index):
+    """Sibling hashes from leaf `index` up to the root."""
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(level[sibling])
+        index //= 2
+    return path
+
+
+def verify_proof(sha256, phash, cid, path, root):
+    """Offline check that the record is under root; path and root as hex."""
+    node = leaf_hash(sha256, phash, cid)
+    for sibling in path:
+        node = node_hash(node, bytes.fromhex(sibling))
+    return node.hex() == root
+
+
+def verify_on_chain(record):
+    """DedupStorage.verifyFile for a get_file_data() result carrying a proof."""
+    proof = record["proof"]
+    if proof["root"] is None:
+        return False
+    return clients.contract().functions.verifyFile(
+        proof["anchorer"],
+        bytes.fromhex(proof["root"]),
+        *encode_record(record["sha256"], record["phash"], record["cid"]),
+        [bytes.fromhex(sibling) for sibling in proof["path"]],
+    ).call()
+
+
+def _anchored_on_chain(root, anchorer):
+    """True once anchorer's own anchorRoot for root is on chain; another address anchoring the same root does not count."""
+    leaf_count = clients.contract().functions.anchors(anchorer, bytes.fromhex(root)).call()[1]
+    return leaf_count != 0
+
+
+class Anchorer:
+    """Queues leaves in the DB and anchors a root every batch_size leaves or interval_s seconds.
+
+    Roots go through the shared submitter, so they draw nonces from the same
+    counter as storeFiles transactions. A root whose transaction fails goes
+    back to the queue; roots left unconfirmed by a restart are checked
+    against the contract and re-queued if they never landed. The timer thread
+    starts with start() or the first add(), so a CLI can resume() and flush()
+    directly.
+    """
+
+    def __init__(self, batch_size=None, interval_s=None):
+        cfg = clients.config()
+        self.batch_size = batch_size or cfg["anchor_batch_size"]
+        self.interval_s = cfg["anchor_interval_s"] if interval_s is None else interval_s
+        self._lock = threading.Lock()  # one flush or resume at a time
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def add(self, records):
+        """Queue (sha256, phash, cid) records; returns how many were new."""
+        with storage.connection() as conn:
+            with conn:
+                added = storage.queue_anchor_leaves(conn, records, time.time())
+            pending = storage.pending_anchor_count(conn)
+        metrics.count("anchor_leaves_queued", added)
+        self.start()
+        if pending >= self.batch_size:
+            self._wake.set()
+        return added
+
+    def start(self):
+        """Start the timer thread (resumes unsettled roots first); add() calls this."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="anchorer", daemon=True)
+                    self._thread.start()
+
+    def flush(self):
+        """Anchor everything pending now, batch_size leaves per root; returns a PendingTx per root."""
+        sent = []
+        with self._lock:
+            while True:
+                with storage.connection() as conn:
+                    records = storage.pending_anchor_leaves(conn, self.batch_size)
+                if not records:
+                    return sent
+                sent.append(self._anchor(records))
+
+    def close(self, flush=True):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if flush:
+            self.flush()
+
+    def _anchor(self, records):
+        with metrics.timed("merkle_build"):
+            levels = build_levels([leaf_hash(*record) for record in records])
+            proofs = [
+                (record[0], i, json.dumps([sibling.hex() for sibling in proof_for(levels, i)]))
+                for i, record in enumerate(records)
+            ]
+        root = levels[-1][0].hex()
+        submitter = clients.submitter()
+        with storage.connection() as conn, conn:
+            storage.create_anchor_batch(conn, root, proofs, submitter.address, time.time())
+        try:
+            with metrics.timed("tx_submit"):
+                call = clients.contract().functions.anchorRoot(bytes.fromhex(root), len(records))
+                pending = submitter.submit_call(call)
+        except Exception:
+            with storage.connection() as conn, conn:
+                storage.release_anchor_batch(conn, root)
+            raise
+        with storage.connection() as conn, conn:
+            storage.set_anchor_status(conn, root, "submitted", "0x" + bytes(pending.tx_hashes[0]).hex(), pending.nonce)
+        metrics.count("anchor_roots")
+        metrics.count("anchor_leaves", len(records))
+        pending.future.add_done_callback(lambda future: self._settle(root, submitter.address, future))
+        return pending
+
+    def _settle(self, root, anchorer, future):
+        try:
+            landed = future.result().status == 1 or _anchored_on_chain(root, anchorer)
+        except Exception as e:
+            print(f"Error confirming anchor {root}: {e}")
+            return  # left as submitted; resume() sorts it out on the next start
+        with storage.connection() as conn, conn:
+            if landed:
+                storage.set_anchor_status(conn, root, "anchored")
+            else:
+                print(f"Anchor transaction for {root} reverted; its leaves go back to the queue")
+                storage.release_anchor_batch(conn, root)
+
+    def resume(self):
+        """Settle roots a previous process built or submitted but never saw confirmed.
+
+        A root on chain is marked anchored. One never sent goes back to the
+        queue, and so does a sent one whose nonce is now mined without the
+        root landing: that nonce went to another transaction (or ours
+        reverted), so ours can never be mined. A root whose nonce is still
+        open may yet land and keeps waiting, however old it is.
+        """
+        with self._lock:
+            with storage.connection() as conn:
+                unsettled = storage.anchor_roots(conn, ("built", "submitted"))
+            submitter = clients.submitter() if unsettled else None
+            for root, _, anchorer, status, _, nonce, created_at in unsettled:
+                if status == "built":
+                    lost = True
+                elif nonce is None:  # submitted before nonces were recorded
+                    lost = time.time() - created_at > RESUBMIT_AFTER_S
+                else:
+                    # Read before the anchor check, so a transaction mined in between can't look lost
+                    lost = submitter.nonce_mined(nonce, anchorer)
+                if _anchored_on_chain(root, anchorer):
+                    with storage.connection() as conn, conn:
+                        storage.set_anchor_status(conn, root, "anchored")
+                elif lost:
+                    with storage.connection() as conn, conn:
+                        storage.release_anchor_batch(conn, root)
+
+    def _run(self):
+        try:
+            self.resume()
+        except Exception as e:
+            print(f"Error resuming anchors: {e}")
+        while not self._stopped:
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error anchoring batch: {e}")
+
+
+_anchorer = None
+_anchorer_pid = None
+_anchorer_lock = threading.Lock()
+
+
+def get():
+    """This process's anchorer, started on first use (and again after a fork)."""
+    global _anchorer, _anchorer_pid
+    if _anchorer is None or _anchorer_pid != os.getpid():
+        with _anchorer_lock:
+            if _anchorer is None or _anchorer_pid != os.getpid():
+                _anchorer = Anchorer()
+                _anchorer_pid = os.getpid()
+    return _anchorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merkle-batched anchoring of file records.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("flush", help="Anchor every pending record now and wait for the receipts")
+    sub.add_parser("status", help="Pending leaves and anchored roots")
+    verify = sub.add_parser("verify", help="Check a record's inclusion proof")
+    verify.add_argument("sha256")
+    verify.add_argument("--on-chain", action="store_true", help="Also ask DedupStorage.verifyFile")
+    args = parser.parse_args(argv)
+
+    storage.init_db()
+    if args.command == "flush":
+        anchorer = Anchorer()
+        anchorer.resume()
+        for pending in anchorer.flush():
+            receipt = pending.future.result()
+            print(f"Anchored root in tx 0x{bytes(receipt.transactionHash).hex()} (status {receipt.status})")
+    elif args.command == "status":
+        with storage.connection() as conn:
+            print(f"Pending leaves: {storage.pending_anchor_count(conn)}")
+            for root, leaf_count, _, status, tx_hash, _, _ in storage.anchor_roots(conn):
+                print(f"{root}  {leaf_count:>6} leaves  {status:<9}  {tx_hash or ''}")
+    else:
+        with storage.connection() as conn:
+            record = storage.get_anchored_file(conn, args.sha256)
+        if record is None or record["proof"]["root"] is None:
+            raise SystemExit("No anchored record for this SHA-256 (unknown or still pending)")
+        proof = record["proof"]
+        ok = verify_proof(record["sha256"], record["phash"], record["cid"], proof["path"], proof["root"])
+        print(f"Offline proof: {'valid' if ok else 'INVALID'} (root {proof['root']} by {proof['anchorer']}, {proof['status']})")
+        if args.on_chain:
+            print(f"On-chain verifyFile: {verify_on_chain(record)}")
+
+
+if __name__ == "__main__":
+    main()
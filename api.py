@@ -0,0 +1,250 @@
+"""Async HTTP API for dedup checks, ingestion and record lookups.
+
+Usage:
+    python api.py                          # real Pinata and chain, settings from .env
+    python api.py --stub --port 8080       # in-memory Pinata/contract, no network
+
+Endpoints:
+    POST /check?name=a.jpg       raw image body -> duplicate verdict; nothing is stored
+    POST /batch-check            multipart images, or JSON [{"sha256", "phash" or "fingerprints"}]
+    POST /ingest?name=a.jpg      raw image body -> check, store, pin to IPFS, submit on-chain
+                                 (add &wait=1 to wait for the receipt; with CHAIN_MODE=anchor
+                                 the record is queued for the next Merkle root instead)
+    GET  /records/{sha256}       local and on-chain record, with its inclusion proof if anchored
+    GET  /metrics                Prometheus text format
+    GET  /health
+
+Bodies are read in chunks as they arrive. Hashing runs in a process pool,
+and DB, RPC and IPFS calls run in a thread pool, so the event loop only
+moves bytes.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aiohttp import web
+
+import interact
+import prefilter
+import storage
+import uploader
+from utils import metrics
+from utils.fingerprint import generate_fingerprints, generate_fingerprints_and_cid
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # same limit as the Streamlit uploader
+MAX_BATCH_ITEMS = 1000
+READ_CHUNK = 256 * 1024
+IO_WORKERS = 32
+RECEIPT_TIMEOUT_S = 300
+STUB_DB_PATH = "data/stub_db.sqlite"
+
+POOLS = web.AppKey("pools", dict)
+
+
+async def read_stream(reader, limit=MAX_UPLOAD_BYTES):
+    """Read a request body or multipart part chunk by chunk, enforcing the size limit."""
+    buf = bytearray()
+    while True:
+        chunk = await (reader.read_chunk(READ_CHUNK) if hasattr(reader, "read_chunk") else reader.read(READ_CHUNK))
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+        if len(buf) > limit:
+            raise web.HTTPRequestEntityTooLarge(max_size=limit, actual_size=len(buf))
+
+
+def _run(request, pool, fn, *args):
+    return asyncio.get_running_loop().run_in_executor(request.app[POOLS][pool], fn, *args)
+
+
+async def _fingerprint(request, data, fingerprint=generate_fingerprints):
+    hashes = await _run(request, "hash", fingerprint, data)
+    if not hashes[1]:
+        raise web.HTTPUnprocessableEntity(text="Not a decodable image")
+    return hashes
+
+
+def _verdict(sha256, phash, is_duplicate, message):
+    return {"sha256": sha256, "phash": phash, "duplicate": is_duplicate, "message": message}
+
+
+async def check(request):
+    data = await read_stream(request.content)
+    sha256, fingerprints = await _fingerprint(request, data)
+    is_duplicate, message, sha256, phash = await _run(
+        request, "io", uploader.check_duplicate, data, request.query.get("name", ""), sha256, fingerprints, False
+    )
+    return web.json_response(_verdict(sha256, phash, is_duplicate, message))
+
+
+async def batch_check(request):
+    if request.content_type.startswith("multipart/"):
+        reader = await request.multipart()
+        names, hashing = [], []
+        while (part := await reader.next()) is not None:
+            if len(hashing) >= MAX_BATCH_ITEMS:
+                raise web.HTTPRequestEntityTooLarge(max_size=MAX_BATCH_ITEMS, actual_size=len(hashing) + 1)
+            names.append(part.filename or part.name)
+            # Hash each part while the next one is still arriving
+            hashing.append(asyncio.ensure_future(
+                _run(request, "hash", generate_fingerprints, await read_stream(part))
+            ))
+        items = await asyncio.gather(*hashing)
+    else:
+        try:
+            body = await request.json()
+            items = [
+                (entry["sha256"], entry.get("fingerprints") or {"ahash": entry.get("phash")})
+                for entry in body
+            ]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise web.HTTPBadRequest(text='Expected a JSON list of {"sha256", "phash" or "fingerprints"}')
+        if len(items) > MAX_BATCH_ITEMS:
+            raise web.HTTPRequestEntityTooLarge(max_size=MAX_BATCH_ITEMS, actual_size=len(items))
+        names = [None] * len(items)
+
+    verdicts = await _run(request, "io", uploader.check_duplicates, items)
+    results = []
+    for name, (sha256, fingerprints), (is_duplicate, message) in zip(names, items, verdicts):
+        result = _verdict(sha256, fingerprints.get("ahash"), is_duplicate, message)
+        if name:
+            result["name"] = name
+        results.append(result)
+    return web.json_response({"results": results})
+
+
+async def ingest(request):
+    data = await read_stream(request.content)
+    name = request.query.get("name", "upload")
+    # The CID comes out of the SHA-256 pass, so pinning doesn't hash the upload again
+    sha256, fingerprints, cid = await _fingerprint(request, data, generate_fingerprints_and_cid)
+    is_duplicate, message, sha256, phash = await _run(
+        request, "io", uploader.check_duplicate, data, name, sha256, fingerprints
+    )
+    result = _verdict(sha256, phash, is_duplicate, message)
+    if is_duplicate:
+        return web.json_response(result)
+
+    try:
+        result["cid"] = await _run(request, "io", uploader.upload_to_pinata, data, name, cid)
+    except Exception as e:
+        raise web.HTTPBadGateway(text=f"IPFS upload failed: {e}")
+    await _run(request, "io", uploader.save_cid, sha256, result["cid"])
+
+    try:
+        submitted = await _run(request, "io", interact.store_files_on_chain, [(sha256, phash, result["cid"])])
+    except Exception as e:
+        raise web.HTTPBadGateway(text=f"Chain submission failed: {e}")
+    if not submitted:  # anchor mode: the proof is served by GET /records/{sha256} once the root is sent
+        result["status"] = "queued"
+        return web.json_response(result, status=201)
+    pending, = submitted
+    result["tx_hash"] = "0x" + bytes(pending.tx_hashes[0]).hex()
+    result["status"] = "submitted"
+    if request.query.get("wait"):
+        with metrics.timed("tx_confirmation"):
+            receipt = await asyncio.wait_for(asyncio.wrap_future(pending.future), RECEIPT_TIMEOUT_S)
+        result["status"] = "confirmed" if receipt.status == 1 else "reverted"
+    return web.json_response(result, status=201)
+
+
+def _lookup(sha256):
+    with storage.connection() as conn:
+        local = storage.get_file(conn, sha256)
+    return local, interact.get_file_data(sha256)
+
+
+async def record(request):
+    local, chain = await _run(request, "io", _lookup, request.match_info["sha256"])
+    if local is None and chain is None:
+        raise web.HTTPNotFound(text="No record for this SHA-256")
+    return web.json_response({"sha256": request.match_info["sha256"], "local": local, "chain": chain})
+
+
+async def prometheus(request):
+    return web.Response(text=metrics.export_prometheus(), content_type="text/plain")
+
+
+async def health(request):
+    return web.json_response({"status": "ok"})
+
+
+@web.middleware
+async def timing(request, handler):
+    route = request.match_info.route.name or "unmatched"
+    with metrics.timed(f"http_{route}"):
+        return await handler(request)
+
+
+def create_app(hash_workers=None, io_workers=IO_WORKERS, background=True):
+    """Build the aiohttp app. background=False skips replication and event sync (stub/local runs)."""
+    app = web.Application(middlewares=[timing], client_max_size=MAX_UPLOAD_BYTES)
+    app.add_routes([
+        web.post("/check", check, name="check"),
+        web.post("/batch-check", batch_check, name="batch_check"),
+        web.post("/ingest", ingest, name="ingest"),
+        web.get("/records/{sha256}", record, name="record"),
+        web.get("/metrics", prometheus, name="metrics"),
+        web.get("/health", health, name="health"),
+    ])
+
+    async def start(app):
+        # forkserver workers don't inherit the server's threads or open DB connections
+        app[POOLS] = {
+            "hash": ProcessPoolExecutor(hash_workers, mp_context=multiprocessing.get_context("forkserver")),
+            "io": ThreadPoolExecutor(io_workers, thread_name_prefix="api-io"),
+        }
+        with storage.connection() as conn:
+            prefilter.get(conn)
+        if background:
+            import clients
+            import indexer
+            import replication
+
+            replication.start()
+            try:
+                indexer.start_background_sync(clients.web3(), clients.contract())
+            except Exception as e:
+                logging.error(f"Event sync not started: {e}")
+            if interact.anchor_mode():
+                import anchoring
+
+                anchoring.get().start()  # leaves queued before a restart don't wait for the next upload
+
+    async def stop(app):
+        for pool in app[POOLS].values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        prefilter.save()
+
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DeduVault dedup HTTP API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--hash-workers", type=int, default=os.cpu_count(), help="Hashing processes")
+    parser.add_argument("--io-workers", type=int, default=IO_WORKERS, help="Threads for DB, RPC and IPFS calls")
+    parser.add_argument("--stub", action="store_true", help="Use in-memory Pinata and contract stand-ins")
+    parser.add_argument("--db", help=f"SQLite path (default: {storage.DEDUP_DB_PATH}, or {STUB_DB_PATH} with --stub)")
+    args = parser.parse_args(argv)
+
+    storage.DEDUP_DB_PATH = args.db or (STUB_DB_PATH if args.stub else storage.DEDUP_DB_PATH)
+    storage.init_db()
+    if args.stub:
+        import replication
+        import stubs
+
+        stubs.install()
+        # Keep stub records out of the shipped replication log
+        replication.get_log(base_dir=os.path.join(os.path.dirname(os.path.abspath(storage.DEDUP_DB_PATH)), "replication-stub"))
+    web.run_app(create_app(args.hash_workers, args.io_workers, background=not args.stub), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Concurrent-uploader write benchmark: per-request commits vs the group-commit writer.
+
+Usage:
+    python -m benchmarks.concurrent_ingest                       # 32 uploaders, 500 files each
+    python -m benchmarks.concurrent_ingest --uploaders 64 --files 1000 --overlap 0.1
+    python -m benchmarks.concurrent_ingest --synchronous FULL --flush-interval-ms 2
+    python -m benchmarks.concurrent_ingest --json results.json
+
+Each uploader stores seeded (sha256, fingerprints) records the way
+check_duplicate does: exact lookup, then insert. A share of the records
+(--overlap) is also uploaded by another uploader at the same time, to
+exercise the duplicate race. Both paths run on fresh temporary DBs:
+
+    baseline      SELECT, then INSERT in its own transaction (the pre-writer path)
+    group_commit  SELECT, then writer.GroupCommitWriter upsert
+
+Reports files/s, per-file latency and how many racing duplicates each path
+caught. Every path must store each SHA-256 exactly once.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import storage
+import writer
+
+PATHS = ("baseline", "group_commit")
+
+
+def make_workload(uploaders, files, overlap, seed):
+    """One record list per uploader; uploaders are paired and each pair shares the first `overlap` of its lists."""
+    rng = random.Random(seed)
+    lists = []
+    for u in range(uploaders):
+        records = []
+        for i in range(files):
+            sha256 = hashlib.sha256(f"{seed}-{u}-{i}".encode()).hexdigest()
+            ahash = f"{rng.getrandbits(64):016x}"
+            records.append((sha256, ahash, f"u{u}-{i}.jpg", {"ahash": ahash, "dhash": f"{rng.getrandbits(64):016x}"}))
+        lists.append(records)
+    shared = int(files * overlap)
+    for u in range(1, uploaders, 2):
+        # Same records, same order, both at the start, so the pair races on them
+        lists[u][:shared] = lists[u - 1][:shared]
+    return lists
+
+
+def _baseline_store(record):
+    with storage.connection() as conn:
+        if storage.sha256_exists(conn, record[0]):
+            return False
+        try:
+            with conn:
+                storage.insert_file(conn, *record)
+        except sqlite3.IntegrityError:
+            return None  # lost the race between SELECT and INSERT
+    return True
+
+
+def _group_commit_store(record, group_writer):
+    with storage.connection() as conn:
+        if storage.sha256_exists(conn, record[0]):
+            return False
+    return True if group_writer.insert(*record) else None
+
+
+def run_path(path, lists, flush_interval_s=writer.FLUSH_INTERVAL_S):
+    storage.DEDUP_DB_PATH = os.path.join(tempfile.mkdtemp(prefix=f"bench-{path}-"), "dedup.sqlite")
+    storage.close_pool()
+    storage.init_db()
+    group_writer = writer.GroupCommitWriter(flush_interval_s) if path == "group_commit" else None
+    store = _baseline_store if group_writer is None else (lambda record: _group_commit_store(record, group_writer))
+
+    latencies, outcomes = [], {True: 0, False: 0, None: 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(len(lists) + 1)
+
+    def uploader(records):
+        mine, counts = [], {True: 0, False: 0, None: 0}
+        start_gate.wait()
+        for record in records:
+            t = time.perf_counter()
+            counts[store(record)] += 1
+            mine.append(time.perf_counter() - t)
+        with lock:
+            latencies.extend(mine)
+            for key, n in counts.items():
+                outcomes[key] += n
+
+    threads = [threading.Thread(target=uploader, args=(records,)) for records in lists]
+    for thread in threads:
+        thread.start()
+    start_gate.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if group_writer:
+        group_writer.close()
+
+    with storage.connection() as conn:
+        stored = storage.count_files(conn)
+    unique = len({record[0] for records in lists for record in records})
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    return {
+        "path": path,
+        "files": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "files_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "new": outcomes[True],
+        "duplicates_seen_by_select": outcomes[False],
+        "duplicates_caught_at_insert": outcomes[None],
+        "stored": stored,
+        "correct": stored == unique == outcomes[True],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploaders", type=int, default=32)
+    parser.add_argument("--files", type=int, default=500, help="Files per uploader")
+    parser.add_argument("--overlap", type=float, default=0.05, help="Share of each uploader's files also sent by another")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--synchronous", choices=("NORMAL", "FULL"), default="NORMAL", help="SQLite fsync policy")
+    parser.add_argument("--flush-interval-ms", type=float, default=writer.FLUSH_INTERVAL_S * 1000,
+                        help="How long the writer lingers for more rows per group")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args(argv)
+
+    storage.PRAGMAS = tuple(
+        f"PRAGMA synchronous={args.synchronous}" if pragma.startswith("PRAGMA synchronous") else pragma
+        for pragma in storage.PRAGMAS
+    )
+
+    lists = make_workload(args.uploaders, args.files, args.overlap, args.seed)
+    report = {"args": vars(args), "results": []}
+    for path in args.paths:
+        print(path, file=sys.stderr)
+        result = run_path(path, lists, args.flush_interval_ms / 1000)
+        report["results"].append(result)
+        print(
+            f"  {result['files_per_s']:>9.1f} files/s  p50 {result['p50_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  "
+            f"p99 {result['p99_ms']:.2f} ms  races caught {result['duplicates_caught_at_insert']}  "
+            f"{'ok' if result['correct'] else 'WRONG COUNT'}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(result["correct"] for result in report["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
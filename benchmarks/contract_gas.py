@@ -0,0 +1,169 @@
+"""Contract gas benchmark: DedupStorage vs the string-keyed DedupStorageLegacy on a local dev chain.
+
+Usage:
+    python -m benchmarks.contract_gas                                 # in-process py-evm chain (eth-tester)
+    python -m benchmarks.contract_gas --rpc http://127.0.0.1:8545     # anvil / hardhat node, unlocked account 0
+    python -m benchmarks.contract_gas --files 200 --batch 50 --json gas.json
+    python -m benchmarks.contract_gas --solc-binary /usr/local/bin/solc --write-abi
+
+Both contracts are compiled with py-solc-x (the solc version is installed
+on first use, or --solc-binary points at one already on disk) and
+deployed on the same chain. The compiled DedupStorage ABI is compared with
+contracts/DedupStorage_abi.json; --write-abi replaces the file with it. Both are then fed the same
+records: random SHA-256 digests, 64-bit phashes and CIDv1 strings, sent as
+hex strings to the legacy contract and through interact.encode_record to
+the new one. The report gives gas and calldata bytes per storeFile, gas
+per file in storeFiles batches, and gas for a fileExists lookup.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+from web3 import Web3
+
+from interact import encode_record
+from utils.cid import compute_cid
+
+CONTRACTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contracts")
+CONTRACTS = {
+    "legacy": ("DedupStorageLegacy.sol", "DedupStorageLegacy"),
+    "packed": ("DedupStorage.sol", "DedupStorage"),
+}
+ABI_PATH = os.path.join(CONTRACTS_DIR, "DedupStorage_abi.json")
+
+
+def make_records(count, seed):
+    """[(sha256, phash, cid)] shaped like real uploads."""
+    rng = random.Random(seed)
+    return [
+        (rng.randbytes(32).hex(), format(rng.getrandbits(64), "016x"), compute_cid(rng.randbytes(64)))
+        for _ in range(count)
+    ]
+
+
+def compile_contracts(solc_version, evm_version, solc_binary=None):
+    import solcx
+
+    if solc_binary:
+        version = {"solc_binary": solc_binary}
+    else:
+        if solc_version not in {str(v) for v in solcx.get_installed_solc_versions()}:
+            solcx.install_solc(solc_version)
+        version = {"solc_version": solc_version}
+    paths = [os.path.join(CONTRACTS_DIR, source) for source, _ in CONTRACTS.values()]
+    output = solcx.compile_files(paths, output_values=["abi", "bin"], optimize=True, evm_version=evm_version, **version)
+    compiled = {}
+    for key, (source, name) in CONTRACTS.items():
+        compiled[key] = next(out for path, out in output.items() if path.endswith(f"{source}:{name}"))
+    return compiled
+
+
+def _canonical(abi):
+    return sorted(json.dumps(entry, sort_keys=True) for entry in abi)
+
+
+def check_abi(abi, write=False):
+    """Compare the compiled ABI with the committed one; with write, replace the file instead. True if they match."""
+    if write:
+        with open(ABI_PATH, "w") as f:
+            f.write(json.dumps(abi, indent=2, sort_keys=True) + "\n")
+        return True
+    with open(ABI_PATH) as f:
+        return _canonical(json.load(f)) == _canonical(abi)
+
+
+def connect(rpc=None):
+    if rpc:
+        w3 = Web3(Web3.HTTPProvider(rpc))
+    else:
+        from web3 import EthereumTesterProvider
+
+        w3 = Web3(EthereumTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+    return w3
+
+
+def _transact(w3, call):
+    tx_hash = call.transact()
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    if receipt.status != 1:
+        raise RuntimeError(f"Transaction reverted: {tx_hash.hex()}")
+    return receipt, len(w3.eth.get_transaction(tx_hash)["input"])
+
+
+def deploy(w3, compiled):
+    factory = w3.eth.contract(abi=compiled["abi"], bytecode=compiled["bin"])
+    receipt, _ = _transact(w3, factory.constructor())
+    return w3.eth.contract(address=receipt.contractAddress, abi=compiled["abi"]), receipt.gasUsed
+
+
+def _mean(values):
+    return round(sum(values) / len(values)) if values else None
+
+
+def bench(w3, contract, args_of, singles, batched, batch_size):
+    """Gas and calldata for storeFile on singles, storeFiles on batched, and one fileExists lookup."""
+    gas, calldata = [], []
+    for record in singles:
+        receipt, size = _transact(w3, contract.functions.storeFile(*args_of(record)))
+        gas.append(receipt.gasUsed)
+        calldata.append(size)
+    batch_gas = []
+    for start in range(0, len(batched), batch_size):
+        columns = [list(column) for column in zip(*(args_of(record) for record in batched[start:start + batch_size]))]
+        receipt, _ = _transact(w3, contract.functions.storeFiles(*columns))
+        batch_gas.append(receipt.gasUsed / len(batched[start:start + batch_size]))
+    sha256, phash, _ = args_of(singles[0])
+    return {
+        "store_file_gas": _mean(gas),
+        "store_file_calldata_bytes": _mean(calldata),
+        "store_files_gas_per_file": _mean(batch_gas),
+        "file_exists_gas": contract.functions.fileExists(sha256, phash).estimate_gas(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rpc", help="Dev chain JSON-RPC URL (default: in-process eth-tester)")
+    parser.add_argument("--files", type=int, default=100, help="storeFile calls per contract")
+    parser.add_argument("--batch", type=int, default=50, help="Files per storeFiles call")
+    parser.add_argument("--batches", type=int, default=4, help="storeFiles calls per contract")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--solc", default="0.8.24")
+    parser.add_argument("--solc-binary", help="Compile with this solc instead of installing --solc")
+    parser.add_argument("--write-abi", action="store_true", help=f"Write the compiled ABI to {os.path.relpath(ABI_PATH)}")
+    parser.add_argument("--evm-version", default="paris", help="Target EVM; paris avoids PUSH0 for older dev chains")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args(argv)
+
+    records = make_records(args.files + args.batch * args.batches, args.seed)
+    singles, batched = records[:args.files], records[args.files:]
+    encoders = {"legacy": lambda record: record, "packed": lambda record: encode_record(*record)}
+
+    compiled = compile_contracts(args.solc, args.evm_version, args.solc_binary)
+    if not check_abi(compiled["packed"]["abi"], args.write_abi):
+        print(f"Compiled ABI differs from {ABI_PATH}; rerun with --write-abi to update it", file=sys.stderr)
+    w3 = connect(args.rpc)
+    report = {}
+    for key in CONTRACTS:
+        contract, deploy_gas = deploy(w3, compiled[key])
+        report[key] = {"deploy_gas": deploy_gas, **bench(w3, contract, encoders[key], singles, batched, args.batch)}
+
+    print(f"{'metric':<28} {'legacy':>10} {'packed':>10} {'saved':>7}")
+    for metric in report["legacy"]:
+        old, new = report["legacy"][metric], report["packed"][metric]
+        print(f"{metric:<28} {old:>10} {new:>10} {1 - new / old:>7.1%}")
+    summary = {
+        "store_file_gas_saved": report["legacy"]["store_file_gas"] - report["packed"]["store_file_gas"],
+        "store_file_ratio": round(report["packed"]["store_file_gas"] / report["legacy"]["store_file_gas"], 3),
+    }
+    print(json.dumps(summary), file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "contracts": report, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
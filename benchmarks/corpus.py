@@ -0,0 +1,106 @@
+"""Seeded synthetic corpus: base images plus transformed near-duplicates.
+
+Usage:
+    python -m benchmarks.corpus out/ --bases 50 --seed 7   # write files + manifest.json
+
+Every base image gets one copy per entry in VARIANTS. Images sharing a
+`group` are duplicates of each other; images in different groups are not.
+The same seed always produces byte-identical output.
+"""
+import argparse
+import io
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+BASE_SIZE = (1024, 768)
+
+
+def _encode(img, fmt, **params):
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def base_image(rng, size=BASE_SIZE):
+    """One product-photo-like image: shapes on a randomly oriented gradient."""
+    img = Image.linear_gradient("L").rotate(rng.randrange(360)).resize(size)
+    img = Image.merge("RGB", [img.point(lambda v, k=rng.random(): int(v * k)) for _ in range(3)])
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(6, 16)):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(40, size[0] // 2), y0 + rng.randrange(40, size[1] // 2)
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x0, y0, x1, y1), fill=colour)
+    return img.filter(ImageFilter.GaussianBlur(2))
+
+
+def _crop(img, rng):
+    w, h = img.size
+    dx, dy = int(w * rng.uniform(0.03, 0.08)), int(h * rng.uniform(0.03, 0.08))
+    return img.crop((dx, dy, w - dx, h - dy))
+
+
+def _watermark(img, rng):
+    img = img.convert("RGBA")
+    overlay = Image.new("RGBA", img.size)
+    draw = ImageDraw.Draw(overlay)
+    w, h = img.size
+    x, y = int(w * rng.uniform(0.55, 0.7)), int(h * rng.uniform(0.8, 0.88))
+    draw.rectangle((x, y, x + w // 4, y + h // 12), fill=(255, 255, 255, 110))
+    draw.text((x + 8, y + 8), "SAMPLE", fill=(0, 0, 0, 160))
+    return Image.alpha_composite(img, overlay).convert("RGB")
+
+
+# variant name -> (image bytes, extension); each takes the base image and an RNG
+VARIANTS = {
+    "original": lambda img, rng: (_encode(img, "JPEG", quality=92), "jpg"),
+    "reencode": lambda img, rng: (_encode(img, "JPEG", quality=rng.randint(40, 70)), "jpg"),
+    "resize": lambda img, rng: (_encode(img.resize((img.width // 2, img.height // 2)), "JPEG", quality=90), "jpg"),
+    "crop": lambda img, rng: (_encode(_crop(img, rng), "JPEG", quality=90), "jpg"),
+    "watermark": lambda img, rng: (_encode(_watermark(img, rng), "JPEG", quality=90), "jpg"),
+    "colour_shift": lambda img, rng: (
+        _encode(ImageEnhance.Color(ImageEnhance.Brightness(img).enhance(rng.uniform(0.85, 1.15)))
+                .enhance(rng.uniform(0.6, 1.4)), "JPEG", quality=90), "jpg"),
+    "png": lambda img, rng: (_encode(img, "PNG"), "png"),
+    "webp": lambda img, rng: (_encode(img, "WEBP", quality=80), "webp"),
+}
+
+
+def build_corpus(bases=20, seed=1234, variants=tuple(VARIANTS), size=BASE_SIZE):
+    """Return a list of {"name", "group", "variant", "data"} dicts."""
+    rng = random.Random(seed)
+    corpus = []
+    for group in range(bases):
+        img = base_image(rng, size)
+        for variant in variants:
+            data, ext = VARIANTS[variant](img, rng)
+            corpus.append({"name": f"base{group:04d}-{variant}.{ext}", "group": group, "variant": variant, "data": data})
+    return corpus
+
+
+def write_corpus(corpus, out_dir):
+    """Write images and a manifest.json (name, group, variant) to out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+    for item in corpus:
+        with open(os.path.join(out_dir, item["name"]), "wb") as f:
+            f.write(item["data"])
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump([{k: v for k, v in item.items() if k != "data"} for item in corpus], f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--bases", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+    corpus = build_corpus(args.bases, args.seed)
+    write_corpus(corpus, args.out_dir)
+    print(f"Wrote {len(corpus)} images ({args.bases} groups x {len(VARIANTS)} variants) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
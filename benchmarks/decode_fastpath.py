@@ -0,0 +1,113 @@
+"""Compare the reduced-resolution phash decode against a full-resolution decode.
+
+Usage:
+    python -m benchmarks.decode_fastpath                   # synthetic 12 MP JPEGs
+    python -m benchmarks.decode_fastpath --images photos/  # your own images
+    python -m benchmarks.decode_fastpath --tolerance 2 --json results.json
+
+Exits non-zero if any image's fast-path hash differs from the full decode by
+more than --tolerance bits.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import imagehash
+from PIL import Image, ImageDraw, ImageFilter
+
+from utils.hasher import open_reduced
+
+
+def synthetic_jpegs(count=8, size=(4000, 3000), seed=1234):
+    """Seeded product-photo-like JPEGs (shapes on a gradient), as bytes."""
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        img = Image.linear_gradient("L").resize(size).convert("RGB")
+        draw = ImageDraw.Draw(img)
+        for _ in range(rng.randint(5, 15)):
+            x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+            x1, y1 = x0 + rng.randrange(200, size[0] // 2), y0 + rng.randrange(200, size[1] // 2)
+            colour = tuple(rng.randrange(256) for _ in range(3))
+            (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x0, y0, x1, y1), fill=colour)
+        img = img.filter(ImageFilter.GaussianBlur(3))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=90)
+        images.append((f"synthetic-{i}.jpg", buf.getvalue()))
+    return images
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+def full_decode_hash(data):
+    return imagehash.average_hash(Image.open(io.BytesIO(data)))
+
+
+def fast_decode_hash(data):
+    return imagehash.average_hash(open_reduced(io.BytesIO(data)))
+
+
+def timed(fn, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(data)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", help="Directory of images (default: synthetic 12 MP JPEGs)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=int, default=2, help="Max allowed Hamming distance in bits")
+    parser.add_argument("--json", help="Write per-image results to this file")
+    args = parser.parse_args(argv)
+
+    images = load_images(args.images) if args.images else synthetic_jpegs()
+    results = []
+    for name, data in images:
+        try:
+            full_hash, full_s = timed(full_decode_hash, data, args.repeat)
+            fast_hash, fast_s = timed(fast_decode_hash, data, args.repeat)
+        except Exception as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            continue
+        results.append({
+            "image": name,
+            "bytes": len(data),
+            "full_ms": round(full_s * 1000, 2),
+            "fast_ms": round(fast_s * 1000, 2),
+            "speedup": round(full_s / fast_s, 2),
+            "distance": full_hash - fast_hash,
+        })
+
+    if not results:
+        print("No decodable images", file=sys.stderr)
+        return 1
+    for r in results:
+        print(f"{r['image']:<30} full {r['full_ms']:>8.1f} ms  fast {r['fast_ms']:>7.1f} ms  "
+              f"x{r['speedup']:<5} distance {r['distance']}")
+    full_total = sum(r["full_ms"] for r in results)
+    fast_total = sum(r["fast_ms"] for r in results)
+    worst = max(r["distance"] for r in results)
+    print(f"overall speedup x{full_total / fast_total:.2f}, worst distance {worst} (tolerance {args.tolerance})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"tolerance": args.tolerance, "results": results}, f, indent=2)
+    return 0 if worst <= args.tolerance else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""Dedup benchmark suite: hashing throughput, lookup latency and match accuracy.
+
+Usage:
+    python -m benchmarks.dedup                              # all sections, default sizes
+    python -m benchmarks.dedup --sections accuracy --bases 50
+    python -m benchmarks.dedup --sizes 1000 10000 100000 1000000 --json results.json
+    python -m benchmarks.dedup --json new.json --baseline old.json --max-regression 0.2
+
+Sections:
+    throughput  per-stage hashing cost (SHA-256, reduced decode, each fingerprint, end to end)
+    lookup      exact (SQLite) and near-duplicate (phash index) lookup latency as the DB grows
+    accuracy    precision/recall per fingerprint algorithm across Hamming thresholds, plus the
+                production cascade, on the seeded corpus from benchmarks.corpus
+
+With --baseline, key metrics are compared against an earlier --json report
+and the run exits non-zero if any regressed by more than --max-regression.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import build_corpus
+from utils.fingerprint import ALGORITHMS, CASCADE, cascade_match, compute_fingerprints, generate_fingerprints
+from utils.hasher import generate_sha256, open_reduced
+
+SECTIONS = ("throughput", "lookup", "accuracy")
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+
+def _percentiles(samples_s):
+    samples = sorted(samples_s)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6
+    return {"p50_us": round(pick(0.50), 2), "p95_us": round(pick(0.95), 2), "p99_us": round(pick(0.99), 2)}
+
+
+def _timed(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+
+def bench_throughput(corpus, repeat=3):
+    """Seconds per image for each hashing stage."""
+    datas = [item["data"] for item in corpus]
+    total_mb = sum(map(len, datas)) / 1e6
+    decoded = []
+    for data in datas:
+        rgb = open_reduced(io.BytesIO(data), mode="RGB")
+        decoded.append((rgb.convert("L"), rgb))
+
+    stages = {
+        "sha256": (generate_sha256, datas),
+        "decode_reduced": (lambda d: open_reduced(io.BytesIO(d), mode="RGB").convert("L"), datas),
+    }
+    for name, fn in ALGORITHMS.items():
+        stages[f"fingerprint_{name}"] = (lambda pair, fn=fn: fn(*pair), decoded)
+    stages["fingerprints_all"] = (compute_fingerprints, datas)
+    stages["end_to_end"] = (generate_fingerprints, datas)
+
+    results = []
+    for stage, (fn, items) in stages.items():
+        per_image = _timed(fn, items, repeat)
+        results.append({
+            "stage": stage,
+            "ms_per_image": round(per_image * 1000, 3),
+            "images_per_s": round(1 / per_image, 1),
+            "mb_per_s": round(total_mb / len(datas) / per_image, 1),
+        })
+    return results
+
+
+def _random_rows(rng, count):
+    for i in range(count):
+        sha256 = "%064x" % rng.getrandbits(256)
+        fingerprints = {name: "%016x" % rng.getrandbits(64) for name in ("ahash", "phash", "dhash", "whash")}
+        yield sha256, fingerprints["ahash"], f"row{i}.jpg", fingerprints
+
+
+def bench_lookup(sizes=DEFAULT_SIZES, queries=1000, seed=1234):
+    """Exact and near-duplicate lookup latency at each DB size.
+
+    Rows are random fingerprints; half the near-duplicate probes are a stored
+    hash with a few bits flipped so the index has real matches to return.
+    """
+    import storage
+    from utils.hamming import phash_to_int
+    from utils.phash_index import PhashIndex
+
+    radius = CASCADE[0][1]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.DEDUP_DB_PATH = os.path.join(tmp, "bench.sqlite")
+        storage.init_db()
+        rng = random.Random(seed)
+        index = PhashIndex()
+        stored_shas, stored_hashes = [], []
+        with storage.connection() as conn:
+            for size in sorted(sizes):
+                start = time.perf_counter()
+                batch = list(_random_rows(rng, size - len(index)))
+                with conn:
+                    storage.insert_files(conn, batch)
+                insert_s = time.perf_counter() - start
+                start = time.perf_counter()
+                for sha256, phash, _, _ in batch:
+                    index.add(sha256, phash_to_int(phash))
+                index_s = time.perf_counter() - start
+                stored_shas += [row[0] for row in batch[:queries]]
+                stored_hashes += [phash_to_int(row[1]) for row in batch[:queries]]
+
+                exact = []
+                for i in range(queries):
+                    sha256 = rng.choice(stored_shas) if i % 2 else "%064x" % rng.getrandbits(256)
+                    t = time.perf_counter()
+                    storage.sha256_exists(conn, sha256)
+                    exact.append(time.perf_counter() - t)
+
+                near, hits = [], 0
+                for i in range(queries):
+                    if i % 2:
+                        value = rng.choice(stored_hashes)
+                        for bit in rng.sample(range(64), rng.randint(0, radius)):
+                            value ^= 1 << bit
+                    else:
+                        value = rng.getrandbits(64)
+                    t = time.perf_counter()
+                    hits += bool(index.query(value, radius))
+                    near.append(time.perf_counter() - t)
+
+                results.append({
+                    "rows": size,
+                    "insert_rows_per_s": round(len(batch) / insert_s, 1) if batch else None,
+                    "index_rows_per_s": round(len(batch) / index_s, 1) if batch else None,
+                    "exact": _percentiles(exact),
+                    "near": dict(_percentiles(near), radius=radius, hit_rate=round(hits / queries, 3)),
+                })
+                print(f"  {size:>9,} rows: exact p50 {results[-1]['exact']['p50_us']} us, "
+                      f"near p50 {results[-1]['near']['p50_us']} us", file=sys.stderr)
+    return results
+
+
+def _distance(a, b):
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def _scores(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"tp": tp, "fp": fp, "fn": fn, "precision": round(precision, 4),
+            "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def bench_accuracy(corpus, max_threshold=20):
+    """Precision/recall over every image pair; same-group pairs are the positives."""
+    prints = [compute_fingerprints(item["data"]) for item in corpus]
+    pairs = [(i, j) for i in range(len(corpus)) for j in range(i + 1, len(corpus))]
+    same = [corpus[i]["group"] == corpus[j]["group"] for i, j in pairs]
+    positives = sum(same)
+
+    algorithms = {}
+    for name in ALGORITHMS:
+        distances = [
+            _distance(prints[i][name], prints[j][name]) if name in prints[i] and name in prints[j] else None
+            for i, j in pairs
+        ]
+        curve = []
+        for threshold in range(max_threshold + 1):
+            tp = sum(1 for d, s in zip(distances, same) if s and d is not None and d <= threshold)
+            fp = sum(1 for d, s in zip(distances, same) if not s and d is not None and d <= threshold)
+            curve.append(dict(_scores(tp, fp, positives - tp), threshold=threshold))
+        best = max(curve, key=lambda row: row["f1"])
+        algorithms[name] = {"best_threshold": best["threshold"], "best_f1": best["f1"], "curve": curve}
+
+    tp = fp = 0
+    misses = {}
+    for (i, j), s in zip(pairs, same):
+        matched = cascade_match(prints[i], prints[j], CASCADE)
+        tp += matched and s
+        fp += matched and not s
+        if s and not matched:
+            variant = corpus[j]["variant"] if corpus[i]["variant"] == "original" else corpus[i]["variant"]
+            misses[variant] = misses.get(variant, 0) + 1
+    cascade = dict(_scores(tp, fp, positives - tp), stages=[list(stage) for stage in CASCADE], missed_by_variant=misses)
+    return {"images": len(corpus), "pairs": len(pairs), "positive_pairs": positives,
+            "algorithms": algorithms, "cascade": cascade}
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# (report section, metric path within each row, row key field, higher_is_better)
+_TRACKED = (
+    ("throughput", "images_per_s", "stage", True),
+    ("lookup", "exact.p50_us", "rows", False),
+    ("lookup", "near.p50_us", "rows", False),
+)
+
+
+def _dig(row, path):
+    for part in path.split("."):
+        row = row[part]
+    return row
+
+
+def compare(report, baseline, max_regression):
+    """Return a list of regression messages for tracked metrics."""
+    regressions = []
+    for section, path, key, higher_is_better in _TRACKED:
+        old_rows = {row[key]: row for row in baseline.get(section) or []}
+        for row in report.get(section) or []:
+            if row[key] not in old_rows:
+                continue
+            new, old = _dig(row, path), _dig(old_rows[row[key]], path)
+            if not old or not new:
+                continue
+            change = (old - new) / old if higher_is_better else (new - old) / old
+            if change > max_regression:
+                regressions.append(f"{section} {row[key]} {path}: {old} -> {new} ({change:+.0%} worse)")
+    old_acc, new_acc = baseline.get("accuracy"), report.get("accuracy")
+    if old_acc and new_acc:
+        for name, result in new_acc["algorithms"].items():
+            old = old_acc["algorithms"].get(name, {}).get("best_f1")
+            if old and old - result["best_f1"] > max_regression * old:
+                regressions.append(f"accuracy {name} best_f1: {old} -> {result['best_f1']}")
+        if old_acc["cascade"]["f1"] - new_acc["cascade"]["f1"] > max_regression * old_acc["cascade"]["f1"]:
+            regressions.append(f"accuracy cascade f1: {old_acc['cascade']['f1']} -> {new_acc['cascade']['f1']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--bases", type=int, default=20, help="Base images in the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per throughput stage")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="DB sizes for lookup")
+    parser.add_argument("--queries", type=int, default=1000, help="Lookups per DB size")
+    parser.add_argument("--json", help="Write the full report to this file")
+    parser.add_argument("--baseline", help="Earlier --json report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative slowdown/accuracy loss")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+        }
+    }
+    corpus = build_corpus(args.bases, args.seed) if {"throughput", "accuracy"} & set(args.sections) else None
+
+    if "throughput" in args.sections:
+        print("throughput", file=sys.stderr)
+        report["throughput"] = bench_throughput(corpus, args.repeat)
+        for row in report["throughput"]:
+            print(f"  {row['stage']:<22} {row['ms_per_image']:>9.3f} ms/image {row['images_per_s']:>9.1f} images/s")
+    if "lookup" in args.sections:
+        print("lookup", file=sys.stderr)
+        report["lookup"] = bench_lookup(args.sizes, args.queries, args.seed)
+    if "accuracy" in args.sections:
+        print("accuracy", file=sys.stderr)
+        report["accuracy"] = bench_accuracy(corpus)
+        for name, result in report["accuracy"]["algorithms"].items():
+            print(f"  {name:<10} best F1 {result['best_f1']:.3f} at distance <= {result['best_threshold']}")
+        cascade = report["accuracy"]["cascade"]
+        print(f"  cascade    precision {cascade['precision']:.3f} recall {cascade['recall']:.3f} F1 {cascade['f1']:.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
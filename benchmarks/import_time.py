@@ -0,0 +1,91 @@
+"""Check that core modules import within a time budget and without touching the network.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 5 --json results.json
+
+Each module is imported in a fresh interpreter with socket connections
+disabled and the chain/IPFS settings pointed at an unroutable address, so an
+import that connects fails instead of hanging. Exits non-zero if any import
+fails or its best time exceeds the budget.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# module -> cumulative import budget in ms. Hashing modules pay for
+# PIL/NumPy/imagehash; everything else should be close to free.
+BUDGETS_MS = {
+    "clients": 50,
+    "storage": 50,
+    "interact": 75,
+    "replication": 75,
+    "utils.hasher": 250,
+    "utils.fingerprint": 300,
+    "ingest": 300,
+    "uploader": 350,
+}
+
+_CHILD = """
+import socket, sys
+def _blocked(*args, **kwargs):
+    raise OSError("network access during import")
+socket.socket.connect = _blocked
+socket.create_connection = _blocked
+import {module}
+"""
+
+OFFLINE_ENV = {
+    "INFURA_RPC_URL": "http://192.0.2.1:8545",  # TEST-NET-1, never routed
+    "PINATA_API_URL": "http://192.0.2.1",
+}
+
+
+def import_time_ms(module, cwd):
+    """Return (cumulative import time in ms, error or None) for one fresh import."""
+    env = dict(os.environ, **OFFLINE_ENV)
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.format(module=module)],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if res.returncode != 0:
+        return None, res.stderr.strip().splitlines()[-1]
+    for line in reversed(res.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000, None
+    return None, "module not found in -X importtime output"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh imports per module; the best is kept")
+    parser.add_argument("--json", help="Write per-module results to this file")
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results, failed = [], False
+    for module, budget in BUDGETS_MS.items():
+        times, error = [], None
+        for _ in range(args.repeat):
+            ms, error = import_time_ms(module, root)
+            if error:
+                break
+            times.append(ms)
+        best = min(times) if times else None
+        ok = error is None and best <= budget
+        failed |= not ok
+        results.append({"module": module, "best_ms": best, "budget_ms": budget, "error": error, "ok": ok})
+        shown = f"{best:8.1f} ms" if best is not None else "  failed"
+        print(f"{'ok  ' if ok else 'FAIL'} {module:<20} {shown}  (budget {budget} ms){'  ' + error if error else ''}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Content-addressed blob storage behind one interface, fronted by a local pin index.
+
+Backends:
+    PinataBlobStore   pins through the shared Pinata client (CIDv1, 256 KiB raw leaves);
+                      reads come from an IPFS gateway (IPFS_GATEWAY_URL)
+    LocalBlobStore    files named by CID under a directory, for tests and air-gapped runs
+
+pin() computes the CIDv1 locally (utils/cid.py) before anything goes over
+the network. If the pin index (the `pins` table) or the backend already
+has that CID, the upload is skipped. The content is addressed by that
+CID, so only a pins row is written.
+
+Callers that hash the content before uploading it compute the CID in
+that same pass (utils.fingerprint.generate_fingerprints_and_cid, as the
+API's /ingest does) and hand it over with pin(cid=...). Otherwise pin()
+computes it itself, which for a path or file-like object is a read of its
+own before the upload.
+
+Pick the backend with BLOB_BACKEND=pinata|local (and BLOB_DIR for local).
+"""
+import os
+import time
+
+import requests
+
+import clients
+import storage
+from utils import metrics
+from utils.cid import CIDBuilder, compute_cid
+from utils.hasher import iter_chunks
+
+REMOTE_CHECK_MIN_BYTES = 1024 * 1024  # below this, asking the backend costs about as much as uploading
+
+
+class BlobStore:
+    """Backend interface: store content and return its CID; answer has/get by CID."""
+
+    name = None
+
+    def put(self, source, file_name):
+        raise NotImplementedError
+
+    def put_many(self, items):
+        """Store (source, file_name) pairs; CIDs or exceptions in input order."""
+        results = []
+        for item in items:
+            try:
+                results.append(self.put(*item))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def has(self, cid):
+        raise NotImplementedError
+
+    def get(self, cid):
+        raise NotImplementedError
+
+
+class PinataBlobStore(BlobStore):
+    name = "pinata"
+    OPTIONS = {"cidVersion": 1}  # so Pinata's CID is the one computed locally
+    GATEWAY_TIMEOUT = (10, 300)
+
+    def __init__(self, client, gateway_url="https://gateway.pinata.cloud/ipfs"):
+        self.client = client
+        self.gateway_url = gateway_url.rstrip("/")
+
+    def put(self, source, file_name):
+        return self.client.pin_file(source, file_name, options=self.OPTIONS)
+
+    def put_many(self, items):
+        return self.client.pin_files(items, options=self.OPTIONS)
+
+    def has(self, cid):
+        return self.client.is_pinned(cid)
+
+    def get(self, cid):
+        """Fetch content from the gateway. CIDv1 content is checked against its CID, since any gateway may be asked."""
+        res = requests.get(f"{self.gateway_url}/{cid}", timeout=self.GATEWAY_TIMEOUT)
+        res.raise_for_status()
+        if cid.startswith("b") and compute_cid(res.content) != cid:  # CIDv0 (Qm...) records use other chunking
+            raise ValueError(f"Gateway returned content that does not match {cid}")
+        return res.content
+
+
+class LocalBlobStore(BlobStore):
+    name = "local"
+
+    def __init__(self, directory=os.path.join("data", "blobs")):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, cid):
+        return os.path.join(self.directory, cid)
+
+    def put(self, source, file_name):
+        builder = CIDBuilder()
+        tmp = os.path.join(self.directory, f".{os.getpid()}.{time.monotonic_ns()}.tmp")
+        with open(tmp, "wb") as f:
+            for chunk in iter_chunks(source):
+                builder.update(chunk)
+                f.write(chunk)
+        cid = builder.cid()
+        os.replace(tmp, self._path(cid))
+        return cid
+
+    def has(self, cid):
+        return os.path.exists(self._path(cid))
+
+    def get(self, cid):
+        with open(self._path(cid), "rb") as f:
+            return f.read()
+
+
+def _size(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return None
+
+
+def _rewind(source, start):
+    if start is not None:
+        source.seek(start)
+
+
+def _already_pinned(store, cid, size, conn=None):
+    """True if the pin index, or (for large content) the backend itself, already holds cid."""
+    with storage.connection(conn) as conn:
+        if storage.is_pinned(conn, cid, store.name):
+            return True
+    if size is not None and size >= REMOTE_CHECK_MIN_BYTES and store.has(cid):
+        return True
+    return False
+
+
+def _record(store, cid, size, file_name, local_cid, conn=None):
+    if cid != local_cid:
+        # Different chunking on the backend; index what it returned so lookups still work
+        print(f"CID mismatch for {file_name}: computed {local_cid}, backend returned {cid}")
+        metrics.count("cid_mismatches")
+    with storage.connection(conn) as conn, conn:
+        storage.record_pin(conn, cid, store.name, size, file_name, time.time())
+
+
+def pin(source, file_name, store=None, cid=None):
+    """Store bytes, a path or a seekable file object; returns the CID. Known content is metadata-only.
+
+    Pass cid if the hashing pass already computed it, to skip reading the content for it.
+    """
+    store = store or clients.blobstore()
+    if cid is None:
+        start = source.tell() if hasattr(source, "tell") else None
+        with metrics.timed("cid"):
+            cid = compute_cid(source)
+        _rewind(source, start)
+    size = _size(source)
+    if _already_pinned(store, cid, size):
+        metrics.count("pin_dedup_hits")
+        with storage.connection() as conn, conn:
+            storage.record_pin(conn, cid, store.name, size, file_name, time.time())
+        return cid
+    remote = store.put(source, file_name)
+    _record(store, remote, size, file_name, cid)
+    return remote
+
+
+def pin_many(items, store=None, conn=None):
+    """pin() for many (source, file_name) pairs; uploads the unknown ones concurrently.
+
+    Returns CIDs or exceptions in input order. Pass conn if the caller
+    already holds a pooled connection.
+    """
+    store = store or clients.blobstore()
+    results, uploads = [None] * len(items), []
+    for i, (source, file_name) in enumerate(items):
+        try:
+            start = source.tell() if hasattr(source, "tell") else None
+            cid = compute_cid(source)
+            _rewind(source, start)
+            if _already_pinned(store, cid, _size(source), conn):
+                metrics.count("pin_dedup_hits")
+                with storage.connection(conn) as db, db:
+                    storage.record_pin(db, cid, store.name, _size(source), file_name, time.time())
+                results[i] = cid
+            else:
+                uploads.append((i, cid))
+        except Exception as e:
+            results[i] = e
+    remote = store.put_many([items[i] for i, _ in uploads])
+    for (i, cid), result in zip(uploads, remote):
+        results[i] = result
+        if not isinstance(result, Exception):
+            _record(store, result, _size(items[i][0]), items[i][1], cid, conn)
+    return results
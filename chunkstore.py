@@ -0,0 +1,148 @@
+"""Content-defined chunk dedup for large and non-image files (videos, PDFs, archives).
+
+Files are cut into FastCDC chunks (utils/chunking.py). The chunk index in
+the dedup DB maps each chunk's SHA-256 to its size and IPFS CID. Each file
+is recorded as a manifest: its ordered list of chunk references. Only
+chunks the index hasn't seen are uploaded. A re-exported video, or a
+catalogue with one page changed, costs only the chunks around the change.
+
+Usage:
+    python chunkstore.py catalogue.pdf promo.mp4            # record manifests, report savings
+    python chunkstore.py --upload assets/*.mp4              # also pin unseen chunks to IPFS
+    python chunkstore.py --avg-size 65536 --json report.json big.bin
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import storage
+from utils import metrics
+from utils.chunking import AVG_SIZE, MAX_SIZE, MIN_SIZE, iter_cdc_chunks
+
+UPLOAD_BATCH = 16  # unseen chunks pinned concurrently (and held in memory) at a time
+
+
+def store_file(source, file_name, upload=False, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE):
+    """Chunk source (path, bytes or file-like), pin unseen chunks if upload, and record the manifest.
+
+    Returns a report dict: sizes, chunk counts, new bytes, dedup ratio and
+    throughput. Without upload, chunks are indexed with no CID, and a later
+    upload run pins them.
+    """
+    file_hash = hashlib.sha256()
+    chunks = []  # (sha256, size, cid) in file order
+    first_seen = {}  # sha256 -> cid for chunks this file adds to the index
+    pending = []  # (sha256, data) still to pin
+    size = new_bytes = 0
+    chunking_s = 0.0
+
+    def pin_pending(conn):
+        import uploader
+
+        items = [(data, f"{file_name}.{sha256[:16]}.chunk") for sha256, data in pending]
+        cids = uploader.upload_many_to_pinata(items, conn)  # our connection, so the pool can't run dry mid-file
+        for (sha256, _), cid in zip(pending, cids):
+            if isinstance(cid, Exception):
+                raise cid
+            first_seen[sha256] = cid
+        pending.clear()
+
+    start = time.perf_counter()
+    with storage.connection() as conn:
+        pieces = iter_cdc_chunks(source, min_size, avg_size, max_size)
+        while True:
+            t = time.perf_counter()
+            data = next(pieces, None)
+            chunking_s += time.perf_counter() - t
+            if data is None:
+                break
+            sha256 = hashlib.sha256(data).hexdigest()
+            file_hash.update(data)
+            size += len(data)
+            chunks.append([sha256, len(data), None])
+            if sha256 in first_seen:
+                continue
+            known = storage.chunk_cids(conn, [sha256])
+            if sha256 in known and (known[sha256] or not upload):
+                continue
+            first_seen[sha256] = None
+            new_bytes += len(data)
+            if upload:
+                pending.append((sha256, data))
+                if len(pending) >= UPLOAD_BATCH:
+                    pin_pending(conn)
+        if pending:
+            pin_pending(conn)
+
+        sha256 = file_hash.hexdigest()
+        duplicate_file = storage.get_manifest(conn, sha256) is not None
+        for chunk in chunks:
+            chunk[2] = first_seen.get(chunk[0])
+        with conn:
+            storage.insert_manifest(conn, sha256, file_name, size, [tuple(chunk) for chunk in chunks], time.time())
+    elapsed = time.perf_counter() - start
+
+    metrics.observe("cdc_chunking", chunking_s)
+    metrics.count("chunk_bytes_new", new_bytes)
+    metrics.count("chunk_bytes_deduped", size - new_bytes)
+    return {
+        "file": file_name,
+        "sha256": sha256,
+        "duplicate_file": duplicate_file,
+        "size": size,
+        "chunks": len(chunks),
+        "new_chunks": len(first_seen),
+        "new_bytes": new_bytes,
+        "dedup_ratio": round(size / new_bytes, 3) if new_bytes else None,
+        "savings": round(1 - new_bytes / size, 4) if size else 0.0,
+        "chunking_mb_s": round(size / 1e6 / chunking_s, 1) if chunking_s else None,
+        "mb_s": round(size / 1e6 / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunk-level dedup for large files.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--upload", action="store_true", help="Pin unseen chunks to IPFS via Pinata")
+    parser.add_argument("--min-size", type=int, default=MIN_SIZE)
+    parser.add_argument("--avg-size", type=int, default=AVG_SIZE)
+    parser.add_argument("--max-size", type=int, default=MAX_SIZE)
+    parser.add_argument("--json", help="Write the per-file reports and totals to this file")
+    args = parser.parse_args(argv)
+
+    storage.init_db()
+    reports = []
+    for path in args.files:
+        report = store_file(path, os.path.basename(path), args.upload, args.min_size, args.avg_size, args.max_size)
+        reports.append(report)
+        print(
+            f"{report['file']}: {report['size'] / 1e6:.1f} MB in {report['chunks']} chunks, "
+            f"{report['new_chunks']} new ({report['new_bytes'] / 1e6:.1f} MB), saved {report['savings']:.1%}, "
+            f"chunking {report['chunking_mb_s']} MB/s, overall {report['mb_s']} MB/s"
+            + (" [whole-file duplicate]" if report["duplicate_file"] else "")
+        )
+
+    with storage.connection() as conn:
+        files, logical, unique_chunks, stored = storage.chunk_totals(conn)
+    totals = {
+        "files": files,
+        "logical_bytes": logical,
+        "unique_chunks": unique_chunks,
+        "stored_bytes": stored,
+        "dedup_ratio": round(logical / stored, 3) if stored else None,
+    }
+    print(
+        f"Chunk store: {files} files, {logical / 1e6:.1f} MB logical, {stored / 1e6:.1f} MB stored "
+        f"in {unique_chunks} chunks (dedup ratio {totals['dedup_ratio']})",
+        file=sys.stderr,
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"files": reports, "totals": totals}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Process-wide clients, built on first use.
+
+Importing this module does no network or file I/O, so CLIs and hashing
+workers that never touch the chain or IPFS start fast and work offline.
+Configuration is read from the environment (and .env) once.
+"""
+import json
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ABI_PATH = os.path.join(BASE_DIR, "contracts", "DedupStorage_abi.json")
+
+# config() key -> environment variable, for settings some client requires
+ENV_NAMES = {
+    "rpc_url": "INFURA_RPC_URL",
+    "wallet_address": "WALLET_ADDRESS",
+    "private_key": "PRIVATE_KEY",
+    "contract_address": "CONTRACT_ADDRESS",
+    "pinata_api_key": "PINATA_API_KEY",
+    "pinata_secret_api_key": "PINATA_SECRET_API_KEY",
+}
+
+_lock = threading.RLock()
+_instances = {}
+
+
+def _once(name):
+    """Decorator: build the value on the first call and return it afterwards."""
+    def wrap(build):
+        def get():
+            if name not in _instances:
+                with _lock:
+                    if name not in _instances:
+                        _instances[name] = build()
+            return _instances[name]
+        get.__name__ = build.__name__
+        get.__doc__ = build.__doc__
+        return get
+    return wrap
+
+
+@_once("config")
+def config():
+    """Resolved settings from the environment and .env."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    cfg = {key: os.getenv(env) for key, env in ENV_NAMES.items()}
+    cfg.update({
+        "pinata_api_url": os.getenv("PINATA_API_URL"),  # point at a local stand-in for testing
+        "contract_start_block": int(os.getenv("CONTRACT_START_BLOCK", "0")),
+        "mirror_max_age_s": int(os.getenv("MIRROR_MAX_AGE_S", "300")),
+        "bloom_fp_rate": float(os.getenv("BLOOM_FP_RATE", "0.01")),
+        "blob_backend": os.getenv("BLOB_BACKEND", "pinata"),  # pinata | local
+        "blob_dir": os.getenv("BLOB_DIR", os.path.join("data", "blobs")),
+        "ipfs_gateway_url": os.getenv("IPFS_GATEWAY_URL", "https://gateway.pinata.cloud/ipfs"),
+        "chain_mode": os.getenv("CHAIN_MODE", "per_file"),  # per_file | anchor (see anchoring.py)
+        "anchor_batch_size": int(os.getenv("ANCHOR_BATCH_SIZE", "2048")),
+        "anchor_interval_s": float(os.getenv("ANCHOR_INTERVAL_S", "300")),
+    })
+    return cfg
+
+
+def _require(*keys):
+    cfg = config()
+    missing = [k for k in keys if not cfg[k]]
+    if missing:
+        raise ValueError(f"Missing required environment variables in .env: {', '.join(ENV_NAMES[k] for k in missing)}")
+    return cfg
+
+
+@_once("web3")
+def web3():
+    """Connected Web3 client."""
+    from web3 import Web3
+
+    cfg = _require("rpc_url")
+    w3 = Web3(Web3.HTTPProvider(cfg["rpc_url"]))
+    if not w3.is_connected():
+        raise ConnectionError("Failed to connect to Ethereum node")
+    return w3
+
+
+@_once("contract")
+def contract():
+    """DedupStorage contract bound to CONTRACT_ADDRESS."""
+    cfg = _require("contract_address")
+    with open(ABI_PATH) as f:
+        abi = json.load(f)
+    return web3().eth.contract(address=cfg["contract_address"], abi=abi)
+
+
+@_once("submitter")
+def submitter():
+    """Shared BatchSubmitter, so every caller draws nonces from one local counter."""
+    from tx_submitter import BatchSubmitter
+
+    cfg = _require("wallet_address", "private_key")
+    return BatchSubmitter(web3(), contract(), cfg["wallet_address"], cfg["private_key"])
+
+
+@_once("pinata")
+def pinata():
+    """Shared Pinata client, so uploads reuse pooled connections."""
+    from pinata import PINATA_API_URL, PinataClient
+
+    cfg = _require("pinata_api_key", "pinata_secret_api_key")
+    return PinataClient(cfg["pinata_api_key"], cfg["pinata_secret_api_key"],
+                        base_url=cfg["pinata_api_url"] or PINATA_API_URL)
+
+
+@_once("blobstore")
+def blobstore():
+    """The configured content-addressed blob backend (see blobstore.py)."""
+    import blobstore as backends
+
+    cfg = config()
+    if cfg["blob_backend"] == "local":
+        return backends.LocalBlobStore(cfg["blob_dir"])
+    if cfg["blob_backend"] != "pinata":
+        raise ValueError(f"Unknown BLOB_BACKEND: {cfg['blob_backend']}")
+    return backends.PinataBlobStore(pinata(), cfg["ipfs_gateway_url"])
+
+
+def override(name, value):
+    """Install a prebuilt client under `name` ("web3", "contract", "submitter", "pinata", "blobstore").
+
+    Used to run against local stand-ins (see stubs.py) instead of the real services.
+    """
+    with _lock:
+        _instances[name] = value
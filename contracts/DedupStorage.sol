@@ -2,52 +2,138 @@
 pragma solidity ^0.8.0;
 
 contract DedupStorage {
+    // Phash arguments, events and getFile carry the 64-bit perceptual hash in
+    // the low bits and set PHASH_PRESENT when there is one. 0 means no phash
+    // (non-image files), so an all-zero hash (a flat image) is still a phash.
+    uint72 constant PHASH_PRESENT = 1 << 64;
+
+    // uploader, timestamp and hasPhash share one storage slot; phash is only
+    // written for images, then the CID string follows
     struct FileData {
-        string sha256;     // SHA-256 hash
-        string phash;      // Perceptual hash
+        address uploader;  // Address who uploaded the file (never zero, so it doubles as the existence flag)
+        uint32 timestamp;  // Upload time in seconds (fits until 2106)
+        bool hasPhash;     // False for non-image files
+        uint64 phash;      // Perceptual hash, valid when hasPhash is set
         string ipfsCID;    // IPFS content identifier
-        address uploader;  // Address who uploaded the file
-        uint256 timestamp; // Upload time
     }
 
-    // Mapping of SHA-256 hash => FileData
-    mapping(string => FileData) private storedFiles;
-    mapping(string => bool) public sha256Exists;
-    mapping(string => bool) public phashExists;
+    // Mapping of SHA-256 digest => FileData
+    mapping(bytes32 => FileData) private storedFiles;
+    mapping(uint64 => bool) public phashExists;
+
+    // Merkle anchoring: one root commits a whole batch of file records (see anchoring.py)
+    struct Anchor {
+        uint32 timestamp;  // Anchor time in seconds
+        uint64 leafCount;  // Files committed by the root (never zero, so it doubles as the existence flag)
+    }
+
+    // Anchors are kept per anchorer, so a root only vouches for records in the
+    // eyes of someone who trusts the address that anchored it
+    mapping(address => mapping(bytes32 => Anchor)) public anchors;
 
-    event FileStored(string sha256Hash, string phash, string ipfsCID, address indexed uploader, uint256 timestamp);
+    event FileStored(bytes32 sha256Hash, uint72 phash, string ipfsCID, address indexed uploader, uint256 timestamp);
+    event RootAnchored(bytes32 root, uint64 leafCount, address indexed anchorer, uint256 timestamp);
 
     // Store a new file if it doesn’t exist
-    function storeFile(string memory sha256Hash, string memory phash, string memory ipfsCID) public {
-        require(!sha256Exists[sha256Hash], "Duplicate file: SHA-256 hash already exists");
-        require(!phashExists[phash], "Duplicate file: visually similar image exists");
-        storedFiles[sha256Hash] = FileData({
-            sha256: sha256Hash,
-            phash: phash,
-            ipfsCID: ipfsCID,
-            uploader: msg.sender,
-            timestamp: block.timestamp
-        });
-        sha256Exists[sha256Hash] = true;
-        phashExists[phash] = true;
+    function storeFile(bytes32 sha256Hash, uint72 phash, string calldata ipfsCID) external {
+        require(!sha256Exists(sha256Hash), "Duplicate file: SHA-256 hash already exists");
+        require(!_phashTaken(phash), "Duplicate file: visually similar image exists");
+        _store(sha256Hash, phash, ipfsCID);
+    }
+
+    // Store many files in one transaction. Entries that already exist (or repeat
+    // within the batch) are skipped instead of reverting the whole batch.
+    function storeFiles(bytes32[] calldata sha256Hashes, uint72[] calldata phashes, string[] calldata ipfsCIDs) external returns (uint256 stored) {
+        require(sha256Hashes.length == phashes.length && phashes.length == ipfsCIDs.length, "Array length mismatch");
+        for (uint256 i = 0; i < sha256Hashes.length; i++) {
+            if (sha256Exists(sha256Hashes[i]) || _phashTaken(phashes[i])) {
+                continue;
+            }
+            _store(sha256Hashes[i], phashes[i], ipfsCIDs[i]);
+            stored++;
+        }
+    }
+
+    function _store(bytes32 sha256Hash, uint72 phash, string calldata ipfsCID) internal {
+        require(phash >> 65 == 0, "Invalid phash");
+        FileData storage file = storedFiles[sha256Hash];
+        file.uploader = msg.sender;
+        file.timestamp = uint32(block.timestamp);
+        if (phash & PHASH_PRESENT != 0) {
+            file.hasPhash = true;
+            file.phash = uint64(phash);
+            phashExists[uint64(phash)] = true;
+        }
+        file.ipfsCID = ipfsCID;
         emit FileStored(sha256Hash, phash, ipfsCID, msg.sender, block.timestamp);
     }
 
+    // Commit the Merkle root of a batch of file records
+    function anchorRoot(bytes32 root, uint64 leafCount) external {
+        require(leafCount > 0, "Empty batch");
+        require(anchors[msg.sender][root].leafCount == 0, "Root already anchored");
+        anchors[msg.sender][root] = Anchor(uint32(block.timestamp), leafCount);
+        emit RootAnchored(root, leafCount, msg.sender, block.timestamp);
+    }
+
+    // Leaf hash of a file record; 0x00/0x01 prefixes keep leaves and inner nodes apart
+    function fileLeaf(bytes32 sha256Hash, uint72 phash, string calldata ipfsCID) public pure returns (bytes32) {
+        return sha256(abi.encodePacked(bytes1(0x00), sha256Hash, phash, ipfsCID));
+    }
+
+    // True if the record is in a root anchored by anchorer. Pairs are hashed in
+    // sorted order, so the proof is just the sibling hashes from leaf to root.
+    function verifyFile(address anchorer, bytes32 root, bytes32 sha256Hash, uint72 phash, string calldata ipfsCID, bytes32[] calldata proof) external view returns (bool) {
+        if (anchors[anchorer][root].leafCount == 0) {
+            return false;
+        }
+        bytes32 node = fileLeaf(sha256Hash, phash, ipfsCID);
+        for (uint256 i = 0; i < proof.length; i++) {
+            node = node < proof[i]
+                ? sha256(abi.encodePacked(bytes1(0x01), node, proof[i]))
+                : sha256(abi.encodePacked(bytes1(0x01), proof[i], node));
+        }
+        return node == root;
+    }
+
+    function _phashTaken(uint72 phash) internal view returns (bool) {
+        return phash & PHASH_PRESENT != 0 && phashExists[uint64(phash)];
+    }
+
+    function sha256Exists(bytes32 sha256Hash) public view returns (bool) {
+        return storedFiles[sha256Hash].uploader != address(0);
+    }
+
     // Check if file exists by SHA-256 or phash
-    function fileExists(string memory sha256Hash, string memory phash) public view returns (bool, string memory) {
-        if (sha256Exists[sha256Hash]) {
+    function fileExists(bytes32 sha256Hash, uint72 phash) external view returns (bool, string memory) {
+        if (sha256Exists(sha256Hash)) {
             return (true, "Exact match found (SHA-256)");
         }
-        if (phashExists[phash]) {
+        if (_phashTaken(phash)) {
             return (true, "Visually similar match found (phash)");
         }
         return (false, "No match found");
     }
 
-    // Get file data by SHA-256 hash
-    function getFile(string memory sha256Hash) public view returns (string memory, string memory, string memory, address, uint256) {
-        require(sha256Exists[sha256Hash], "File not found");
-        FileData memory file = storedFiles[sha256Hash];
-        return (file.sha256, file.phash, file.ipfsCID, file.uploader, file.timestamp);
+    // Check many (SHA-256, phash) pairs in one call.
+    // Each result is 0 = no match, 1 = SHA-256 match, 2 = phash match.
+    function fileExistsBatch(bytes32[] calldata sha256Hashes, uint72[] calldata phashes) external view returns (uint8[] memory matches) {
+        require(sha256Hashes.length == phashes.length, "Array length mismatch");
+        matches = new uint8[](sha256Hashes.length);
+        for (uint256 i = 0; i < sha256Hashes.length; i++) {
+            if (sha256Exists(sha256Hashes[i])) {
+                matches[i] = 1;
+            } else if (_phashTaken(phashes[i])) {
+                matches[i] = 2;
+            }
+        }
+    }
+
+    // Get file data by SHA-256 digest
+    function getFile(bytes32 sha256Hash) external view returns (bytes32, uint72, string memory, address, uint256) {
+        FileData storage file = storedFiles[sha256Hash];
+        require(file.uploader != address(0), "File not found");
+        uint72 phash = file.hasPhash ? PHASH_PRESENT | file.phash : 0;
+        return (sha256Hash, phash, file.ipfsCID, file.uploader, file.timestamp);
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,86 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+// The original string-keyed layout, kept only as the baseline for benchmarks/contract_gas.py.
+// Not deployed; DedupStorage.sol replaces it.
+contract DedupStorageLegacy {
+    struct FileData {
+        string sha256;     // SHA-256 hash
+        string phash;      // Perceptual hash
+        string ipfsCID;    // IPFS content identifier
+        address uploader;  // Address who uploaded the file
+        uint256 timestamp; // Upload time
+    }
+
+    // Mapping of SHA-256 hash => FileData
+    mapping(string => FileData) private storedFiles;
+    mapping(string => bool) public sha256Exists;
+    mapping(string => bool) public phashExists;
+
+    event FileStored(string sha256Hash, string phash, string ipfsCID, address indexed uploader, uint256 timestamp);
+
+    // Store a new file if it doesn’t exist
+    function storeFile(string memory sha256Hash, string memory phash, string memory ipfsCID) public {
+        require(!sha256Exists[sha256Hash], "Duplicate file: SHA-256 hash already exists");
+        require(!phashExists[phash], "Duplicate file: visually similar image exists");
+        _store(sha256Hash, phash, ipfsCID);
+    }
+
+    // Store many files in one transaction. Entries that already exist (or repeat
+    // within the batch) are skipped instead of reverting the whole batch.
+    function storeFiles(string[] calldata sha256Hashes, string[] calldata phashes, string[] calldata ipfsCIDs) public returns (uint256 stored) {
+        require(sha256Hashes.length == phashes.length && phashes.length == ipfsCIDs.length, "Array length mismatch");
+        for (uint256 i = 0; i < sha256Hashes.length; i++) {
+            if (sha256Exists[sha256Hashes[i]] || phashExists[phashes[i]]) {
+                continue;
+            }
+            _store(sha256Hashes[i], phashes[i], ipfsCIDs[i]);
+            stored++;
+        }
+    }
+
+    function _store(string memory sha256Hash, string memory phash, string memory ipfsCID) internal {
+        storedFiles[sha256Hash] = FileData({
+            sha256: sha256Hash,
+            phash: phash,
+            ipfsCID: ipfsCID,
+            uploader: msg.sender,
+            timestamp: block.timestamp
+        });
+        sha256Exists[sha256Hash] = true;
+        phashExists[phash] = true;
+        emit FileStored(sha256Hash, phash, ipfsCID, msg.sender, block.timestamp);
+    }
+
+    // Check if file exists by SHA-256 or phash
+    function fileExists(string memory sha256Hash, string memory phash) public view returns (bool, string memory) {
+        if (sha256Exists[sha256Hash]) {
+            return (true, "Exact match found (SHA-256)");
+        }
+        if (phashExists[phash]) {
+            return (true, "Visually similar match found (phash)");
+        }
+        return (false, "No match found");
+    }
+
+    // Check many (SHA-256, phash) pairs in one call.
+    // Each result is 0 = no match, 1 = SHA-256 match, 2 = phash match.
+    function fileExistsBatch(string[] calldata sha256Hashes, string[] calldata phashes) public view returns (uint8[] memory matches) {
+        require(sha256Hashes.length == phashes.length, "Array length mismatch");
+        matches = new uint8[](sha256Hashes.length);
+        for (uint256 i = 0; i < sha256Hashes.length; i++) {
+            if (sha256Exists[sha256Hashes[i]]) {
+                matches[i] = 1;
+            } else if (phashExists[phashes[i]]) {
+                matches[i] = 2;
+            }
+        }
+    }
+
+    // Get file data by SHA-256 hash
+    function getFile(string memory sha256Hash) public view returns (string memory, string memory, string memory, address, uint256) {
+        require(sha256Exists[sha256Hash], "File not found");
+        FileData memory file = storedFiles[sha256Hash];
+        return (file.sha256, file.phash, file.ipfsCID, file.uploader, file.timestamp);
+    }
+}
\ No newline at end of file
@@ -1,10 +1,39 @@
+"""Write transformed copies of one image for manual dedup testing.
+
+Usage:
+    python images.py [source] [--out-dir DIR] [--seed N]
+
+Writes <name>_<variant>.<ext> for every variant in benchmarks.corpus.VARIANTS
+(re-encode, resize, crop, watermark, colour shift, PNG/WebP). For a seeded
+multi-image corpus use `python -m benchmarks.corpus`.
+"""
+import argparse
+import os
+import random
+
 from PIL import Image
 
-# Open the base image
-img = Image.open("C:\\Users\\jhari\\Desktop\\data\\dedu\\test_image.jpeg")
-# Save as different formats
-img.save("test_image.jpg")
-img.save("test_image.webp")
+from benchmarks.corpus import VARIANTS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", nargs="?", default="test_image.jpeg")
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    img = Image.open(args.source).convert("RGB")
+    rng = random.Random(args.seed)
+    stem = os.path.splitext(os.path.basename(args.source))[0]
+    os.makedirs(args.out_dir, exist_ok=True)
+    for variant, make in VARIANTS.items():
+        data, ext = make(img, rng)
+        path = os.path.join(args.out_dir, f"{stem}_{variant}.{ext}")
+        with open(path, "wb") as f:
+            f.write(data)
+        print(path)
+
 
-# Save a resized version
-img.resize((img.width // 2, img.height // 2)).save("test_image_resized.png")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
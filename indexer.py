@@ -0,0 +1,128 @@
+"""Mirror FileStored events into the local DB so reads don't need the RPC.
+
+Usage:
+    python indexer.py            # sync once up to the confirmed head
+    python indexer.py --follow   # keep syncing every --interval seconds
+"""
+import argparse
+import threading
+import time
+
+from web3 import Web3
+
+import clients
+import storage
+from interact import phash_from_chain, sha256_from_chain
+
+CONFIRMATIONS = 2        # stay this many blocks behind the head
+BLOCK_SPAN = 2000        # blocks per eth_getLogs request, halved on provider errors
+SYNC_INTERVAL_S = 15
+
+
+def _block_hash(w3, number):
+    return Web3.to_hex(w3.eth.get_block(number)["hash"])
+
+
+def _fork_point(conn, w3, start_block):
+    """Return the newest synced block still on the canonical chain."""
+    for number, block_hash in storage.recent_chain_blocks(conn):
+        if _block_hash(w3, number) == block_hash:
+            return number
+    return start_block - 1
+
+
+def _get_logs(contract, from_block, to_block):
+    return contract.events.FileStored.get_logs(from_block=from_block, to_block=to_block)
+
+
+def _event_row(log):
+    args = log["args"]
+    return (
+        sha256_from_chain(args["sha256Hash"]),
+        phash_from_chain(args["phash"]),
+        args["ipfsCID"],
+        args["uploader"],
+        args["timestamp"],
+        log["blockNumber"],
+        Web3.to_hex(log["blockHash"]),
+        log["logIndex"],
+    )
+
+
+def sync_events(w3, contract, start_block=None, confirmations=CONFIRMATIONS, span=BLOCK_SPAN):
+    """Pull FileStored logs from the cursor up to head - confirmations; returns events stored.
+
+    start_block defaults to CONTRACT_START_BLOCK from the environment.
+    """
+    if start_block is None:
+        start_block = clients.config()["contract_start_block"]
+    head = w3.eth.block_number - confirmations
+    stored = 0
+    with storage.connection() as conn:
+        cursor = storage.chain_cursor(conn)
+        if cursor is None:
+            synced = start_block - 1
+        else:
+            synced, cursor_hash, _ = cursor
+            if _block_hash(w3, synced) != cursor_hash:
+                fork = _fork_point(conn, w3, start_block)
+                print(f"Reorg detected at block {synced}; rewinding to {fork}")
+                with conn:
+                    storage.rewind_chain(conn, fork)
+                synced = fork
+
+        while synced < head:
+            to_block = min(synced + span, head)
+            try:
+                logs = _get_logs(contract, synced + 1, to_block)
+            except Exception as e:
+                if span == 1:
+                    raise
+                span = max(1, span // 2)
+                print(f"get_logs failed for {synced + 1}-{to_block} ({e}); retrying with span {span}")
+                continue
+            with conn:
+                storage.apply_chain_events(
+                    conn, [_event_row(log) for log in logs], to_block, _block_hash(w3, to_block), time.time()
+                )
+            stored += len(logs)
+            synced = to_block
+
+        if cursor is not None and synced == cursor[0]:
+            # Nothing new, but record that the mirror was checked just now
+            with conn:
+                conn.execute("UPDATE chain_blocks SET synced_at = ? WHERE block_number = ?", (time.time(), synced))
+    return stored
+
+
+def start_background_sync(w3, contract, interval_s=SYNC_INTERVAL_S):
+    """Run sync_events on a daemon thread every interval_s seconds."""
+    def loop():
+        while True:
+            try:
+                sync_events(w3, contract)
+            except Exception as e:
+                print(f"Event sync failed: {e}")
+            time.sleep(interval_s)
+
+    thread = threading.Thread(target=loop, name="event-indexer", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mirror DedupStorage FileStored events into the local DB.")
+    parser.add_argument("--follow", action="store_true", help="Keep syncing instead of exiting")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL_S)
+    args = parser.parse_args(argv)
+
+    storage.init_db()
+    while True:
+        print(f"Stored {sync_events(clients.web3(), clients.contract())} event(s)")
+        if not args.follow:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
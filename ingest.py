@@ -0,0 +1,170 @@
+"""Headless bulk ingest of an image directory or manifest into the dedup DB.
+
+Usage:
+    python ingest.py path/to/catalogue --workers 8 --report report.json
+    python ingest.py manifest.txt --checkpoint data/ingest.checkpoint
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.fingerprint import generate_fingerprints
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+
+
+def iter_sources(source, extensions=IMAGE_EXTENSIONS):
+    """Yield file paths from a directory tree or a manifest (one path per line)."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in extensions:
+                    yield os.path.join(root, name)
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith("#"):
+                    yield path if os.path.isabs(path) else os.path.join(base, path)
+
+
+def load_checkpoint(path):
+    """Return the set of paths already committed by a previous run."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def hash_file(path):
+    """Worker: hash and fingerprint one file. Returns (path, sha256, fingerprints, error)."""
+    try:
+        sha256, fingerprints = generate_fingerprints(path)
+        return path, sha256, fingerprints, None
+    except OSError as e:
+        return path, None, None, str(e)
+
+
+def run(source, workers=None, batch_size=500, checkpoint=None, report=None, progress_every=1000, ship=False):
+    """Hash, deduplicate and insert every file under `source`; returns the summary dict."""
+    # Imported here so pool workers only pay for the hashing modules
+    import prefilter
+    import replication
+    import storage
+    from uploader import PHASH_MAX_DISTANCE, find_similar
+    from utils.fingerprint import CASCADE, cascade_match
+    from utils.hamming import phash_to_int
+    from utils.phash_index import PhashIndex
+
+    storage.init_db()
+    # Own log so offsets never interleave with a web app running on the same host
+    replication.get_log(f"{replication.NODE_ID}-ingest")
+    done = load_checkpoint(checkpoint)
+    paths = [p for p in iter_sources(source) if p not in done]
+
+    summary = {
+        "source": source,
+        "total": len(paths),
+        "skipped_checkpoint": len(done),
+        "new": 0,
+        "exact_duplicates": 0,
+        "near_duplicates": 0,
+        "errors": 0,
+    }
+    batch_seen = {}  # sha256 -> fingerprints of files this run found new
+    batch_index = PhashIndex()
+
+    def similar_in_batch(fingerprints):
+        # The same cascade find_similar applies to stored rows, so batching doesn't change the verdict
+        candidates = batch_index.query(phash_to_int(fingerprints["ahash"]), CASCADE[0][1])
+        return any(
+            cascade_match(fingerprints, batch_seen[sha256], CASCADE, PHASH_MAX_DISTANCE) for sha256, _ in candidates
+        )
+    pending, pending_paths, error_paths = [], [], []
+    checkpoint_file = open(checkpoint, "a") if checkpoint else None
+
+    def flush():
+        if not pending_paths:
+            return
+        with conn:
+            storage.insert_files(conn, pending)
+        for sha256, phash, file_name, fingerprints in pending:
+            replication.record_file(sha256, phash, file_name, fingerprints)
+        if checkpoint_file:
+            checkpoint_file.write("".join(p + "\n" for p in pending_paths))
+            checkpoint_file.flush()
+        pending.clear()
+        pending_paths.clear()
+
+    start = time.time()
+    processed = 0
+    try:
+        with storage.connection() as conn, ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, sha256, fingerprints, error in pool.map(hash_file, paths, chunksize=32):
+                phash = fingerprints.get("ahash") if fingerprints else None
+                processed += 1
+                if error:
+                    # Not checkpointed, so a resumed run tries the file again
+                    summary["errors"] += 1
+                    error_paths.append({"path": path, "error": error})
+                else:
+                    pending_paths.append(path)
+                    if sha256 in batch_seen or (
+                        prefilter.get(conn).might_have_sha256(sha256) and storage.sha256_exists(conn, sha256)
+                    ):
+                        summary["exact_duplicates"] += 1
+                    elif phash and (find_similar(conn, fingerprints) or similar_in_batch(fingerprints)):
+                        summary["near_duplicates"] += 1
+                    else:
+                        summary["new"] += 1
+                        batch_seen[sha256] = fingerprints
+                        if phash:
+                            batch_index.add(sha256, phash_to_int(phash))
+                        pending.append((sha256, phash, os.path.basename(path), fingerprints))
+
+                if len(pending_paths) >= batch_size:
+                    flush()
+                if processed % progress_every == 0:
+                    rate = processed / (time.time() - start)
+                    print(f"[{processed}/{len(paths)}] {rate:.1f} files/s, {summary['new']} new", file=sys.stderr)
+            flush()
+            prefilter.get(conn).refresh(conn, force=True)
+        prefilter.save()
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    if ship:
+        replication.flush()
+
+    elapsed = time.time() - start
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["files_per_s"] = round(processed / elapsed, 1) if elapsed else None
+    summary["error_files"] = error_paths
+    if report:
+        with open(report, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest images into the DeduVault dedup DB.")
+    parser.add_argument("source", help="Directory to walk or manifest file listing one path per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Hashing processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per insert transaction")
+    parser.add_argument("--checkpoint", help="Append-only file of committed paths, used to resume")
+    parser.add_argument("--report", help="Write the JSON summary report to this path")
+    parser.add_argument("--ship", action="store_true", help="Push the new replication log segment when done")
+    args = parser.parse_args(argv)
+
+    summary = run(args.source, args.workers, args.batch_size, args.checkpoint, args.report, ship=args.ship)
+    print(json.dumps({k: v for k, v in summary.items() if k != "error_files"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,132 @@
-from web3 import Web3
-import json
-import os
-from dotenv import load_dotenv
-
-# Load .env file
-load_dotenv()
-
-# Load secrets from .env
-INFURA_RPC_URL = os.getenv("INFURA_RPC_URL")
-WALLET_ADDRESS = os.getenv("WALLET_ADDRESS")
-PRIVATE_KEY = os.getenv("PRIVATE_KEY")
-CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
-
-# Validate secrets
-if not all([INFURA_RPC_URL, WALLET_ADDRESS, PRIVATE_KEY, CONTRACT_ADDRESS]):
-    raise ValueError("Missing required environment variables in .env")
-
-# Initialize Web3
-w3 = Web3(Web3.HTTPProvider(INFURA_RPC_URL))
-if not w3.is_connected():
-    raise ConnectionError("Failed to connect to Ethereum node")
-
-# Load ABI
-abi_path = os.path.join(os.getcwd(), "contracts", "DedupStorage_abi.json")
-with open(abi_path) as f:
-    abi = json.load(f)
-
-contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=abi)
-
-def check_file_exists(sha256, phash):
-    """Check if file exists by SHA-256 or phash."""
+import time
+import clients
+import storage
+from utils import metrics
+
+# The contract takes the SHA-256 as bytes32 and the phash as uint72 with a
+# presence flag, so an all-zero hash is not "no phash"; callers pass and
+# receive the hex strings used everywhere else.
+PHASH_PRESENT = 1 << 64  # DedupStorage phashes are uint72: the 64-bit hash plus this flag, 0 = no phash
+
+def sha256_arg(sha256):
+    """Hex SHA-256 -> bytes32 argument."""
+    return bytes.fromhex(sha256.removeprefix("0x"))
+
+def phash_arg(phash):
+    """Hex phash (None/"" for non-images) -> uint72 argument."""
+    return PHASH_PRESENT | int(phash, 16) if phash else 0
+
+def sha256_from_chain(value):
+    """bytes32 from a call or event -> hex SHA-256."""
+    return bytes(value).hex()
+
+def phash_from_chain(value):
+    """uint72 from a call or event -> hex phash, or None."""
+    return format(value & (PHASH_PRESENT - 1), "016x") if value & PHASH_PRESENT else None
+
+def encode_record(sha256, phash, ipfs_cid):
+    """(sha256, phash, cid) as storeFile/storeFiles arguments."""
+    return sha256_arg(sha256), phash_arg(phash), ipfs_cid
+
+def mirror_is_fresh(conn):
+    """True if the event mirror (indexer.py) has synced within MIRROR_MAX_AGE_S."""
+    cursor = storage.chain_cursor(conn)
+    return cursor is not None and time.time() - cursor[2] <= clients.config()["mirror_max_age_s"]
+
+def check_file_exists(sha256, phash, conn=None):
+    """Check if file exists by SHA-256 or phash, from the event mirror when it is fresh.
+
+    Pass conn when already holding a pooled connection.
+    """
+    with metrics.timed("mirror_lookup"), storage.connection(conn) as conn:
+        mirrored = storage.chain_file_exists(conn, sha256, phash)
+        fresh = mirror_is_fresh(conn)
+    if mirrored[0] or fresh:
+        metrics.count("mirror_hits")
+        return mirrored
     try:
-        return contract.functions.fileExists(sha256, phash).call()
+        with metrics.timed("rpc_call"):
+            return clients.contract().functions.fileExists(sha256_arg(sha256), phash_arg(phash)).call()
     except Exception as e:
         print(f"Error checking file: {e}")
-        return False, "Error checking file"
+        # Chain unreachable: a stale mirror is still better than nothing
+        return mirrored
+
+# fileExistsBatch result codes, mapped to fileExists' messages
+MATCH_MESSAGES = {
+    0: (False, "No match found"),
+    1: (True, "Exact match found (SHA-256)"),
+    2: (True, "Visually similar match found (phash)"),
+}
+EXISTS_BATCH_SIZE = 500  # pairs per eth_call; each is two fixed 32-byte words (~32 KB calldata)
+
+def _exists_chunks(indices):
+    for start in range(0, len(indices), EXISTS_BATCH_SIZE):
+        yield indices[start:start + EXISTS_BATCH_SIZE]
+
+def _exists_rpc_batch(pairs):
+    """One JSON-RPC batch of fileExists calls, for contracts without fileExistsBatch."""
+    contract = clients.contract()
+    with clients.web3().batch_requests() as batch:
+        for sha256, phash in pairs:
+            batch.add(contract.functions.fileExists(sha256_arg(sha256), phash_arg(phash)))
+        return [tuple(result) for result in batch.execute()]
+
+def check_files_exist(pairs):
+    """Check many (sha256, phash) pairs; returns (exists, message) per pair in input order.
+
+    Pairs the fresh event mirror can answer never reach the RPC. The rest go
+    to fileExistsBatch in chunks of EXISTS_BATCH_SIZE, falling back to
+    JSON-RPC batches of fileExists on contracts deployed before it existed.
+    """
+    pairs = list(pairs)
+    results = [None] * len(pairs)
+    with metrics.timed("mirror_lookup"), storage.connection() as conn:
+        fresh = mirror_is_fresh(conn)
+        mirrored = [storage.chain_file_exists(conn, sha256, phash) for sha256, phash in pairs]
+    for i, answer in enumerate(mirrored):
+        if answer[0] or fresh:
+            results[i] = answer
+            metrics.count("mirror_hits")
+
+    for chunk in _exists_chunks([i for i, r in enumerate(results) if r is None]):
+        sha256s = [pairs[i][0] for i in chunk]
+        phashes = [pairs[i][1] for i in chunk]
+        try:
+            with metrics.timed("rpc_call"):
+                codes = clients.contract().functions.fileExistsBatch(
+                    [sha256_arg(s) for s in sha256s], [phash_arg(p) for p in phashes]
+                ).call()
+            answers = [MATCH_MESSAGES[m] for m in codes]
+        except Exception as e:
+            print(f"fileExistsBatch failed ({e}); using a JSON-RPC batch")
+            try:
+                with metrics.timed("rpc_call"):
+                    answers = _exists_rpc_batch(list(zip(sha256s, phashes)))
+            except Exception as e:
+                print(f"Error checking files: {e}")
+                # Chain unreachable: fall back to the stale mirror
+                answers = [mirrored[i] for i in chunk]
+        for i, answer in zip(chunk, answers):
+            results[i] = answer
+    return results
 
 def get_file_data(sha256):
-    """Get file data by SHA-256 hash."""
+    """Get file data by SHA-256 hash, from the event mirror or the anchor log when they have the record.
+
+    Merkle-anchored records also carry `proof` (root, path, status; see anchoring.py).
+    """
+    with metrics.timed("mirror_lookup"), storage.connection() as conn:
+        data = storage.get_chain_file(conn, sha256) or storage.get_anchored_file(conn, sha256)
+    if data:
+        metrics.count("mirror_hits")
+        return data
     try:
-        data = contract.functions.getFile(sha256).call()
+        with metrics.timed("rpc_call"):
+            data = clients.contract().functions.getFile(sha256_arg(sha256)).call()
         return {
-            "sha256": data[0],
-            "phash": data[1],
+            "sha256": sha256_from_chain(data[0]),
+            "phash": phash_from_chain(data[1]),
             "cid": data[2],
             "uploader": data[3],
             "timestamp": str(data[4])
@@ -51,21 +135,40 @@ def get_file_data(sha256):
         print(f"Error fetching file data: {e}")
         return None
 
-def store_file_on_chain(sha256, phash, ipfs_cid):
-    """Store file metadata on blockchain."""
+def anchor_mode():
+    """True when records are Merkle-anchored (CHAIN_MODE=anchor) instead of sent to storeFiles."""
+    return clients.config()["chain_mode"] == "anchor"
+
+def store_files_on_chain(records):
+    """Register (sha256, phash, ipfs_cid) records in storeFiles batches without waiting.
+
+    Returns the in-flight transactions; each `.future` resolves to its receipt.
+    In anchor mode the records are queued for the next Merkle root instead,
+    and the list is empty.
+    """
+    if anchor_mode():
+        import anchoring
+
+        anchoring.get().add(records)
+        return []
+    return clients.submitter().submit([encode_record(*record) for record in records])
+
+def store_file_on_chain(sha256, phash, ipfs_cid, timeout=300):
+    """Store file metadata on blockchain; returns the tx hash, or None if nothing was stored.
+
+    Goes through storeFile, which reverts on a duplicate (say, a phash another
+    node registered since the local check), not storeFiles, which would skip it.
+    """
     try:
-        nonce = w3.eth.get_transaction_count(WALLET_ADDRESS)
-        tx = contract.functions.storeFile(sha256, phash, ipfs_cid).build_transaction({
-            'from': WALLET_ADDRESS,
-            'nonce': nonce,
-            'gas': 300000,
-            'gasPrice': w3.to_wei('20', 'gwei')
-        })
-        signed_tx = w3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-        print(f"Gas used for storeFile: {receipt.gasUsed}")
+        with metrics.timed("tx_submit"):
+            call = clients.contract().functions.storeFile(*encode_record(sha256, phash, ipfs_cid))
+            pending = clients.submitter().submit_call(call)
+        with metrics.timed("tx_confirmation"):
+            receipt = pending.future.result(timeout)
+        if receipt.status != 1:
+            print("Error storing file: transaction reverted")
+            return None
         return receipt.transactionHash.hex()
     except Exception as e:
         print(f"Error storing file: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,202 @@
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import metrics
+
+PINATA_API_URL = "https://api.pinata.cloud"
+PIN_FILE_PATH = "/pinning/pinFileToIPFS"
+PIN_LIST_PATH = "/data/pinList"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PinataError(Exception):
+    """Raised when Pinata rejects an upload or retries are exhausted."""
+
+
+class MultipartStream:
+    """A multipart/form-data body that reads the file part lazily.
+
+    requests sends file-like bodies with a known length chunk by chunk, so
+    the file is never concatenated into one in-memory payload.
+    """
+
+    def __init__(self, source, file_name, fields=None):
+        self.boundary = uuid.uuid4().hex
+        self._file, self._owned = self._open(source)
+        start = self._file.tell()
+        self._file.seek(0, io.SEEK_END)
+        self._file_size = self._file.tell() - start
+        self._file.seek(start)
+
+        head = b""
+        for name, value in (fields or {}).items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._parts = [io.BytesIO(head), self._file, io.BytesIO(tail)]
+        self._length = len(head) + self._file_size + len(tail)
+
+    @staticmethod
+    def _open(source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return io.BytesIO(source), True
+        if isinstance(source, (str, os.PathLike)):
+            return open(source, "rb"), True
+        return source, False
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        out = b""
+        while self._parts and (size < 0 or len(out) < size):
+            chunk = self._parts[0].read(-1 if size < 0 else size - len(out))
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            out += chunk
+        return out
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+
+
+class PinataClient:
+    """Pinata upload client with a pooled session, retries and bounded concurrency.
+
+    Retries 429/5xx responses and connection errors with exponential backoff
+    and full jitter. A 429's Retry-After pauses every worker, not just the one
+    that hit it, and `max_requests_per_s` spaces requests out up front.
+    """
+
+    def __init__(self, api_key, secret_api_key, base_url=PINATA_API_URL, max_workers=8,
+                 timeout=(10, 300), max_retries=5, backoff_s=0.5, max_backoff_s=30.0,
+                 max_requests_per_s=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self._min_interval = 1.0 / max_requests_per_s if max_requests_per_s else 0.0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "pinata_api_key": api_key,
+            "pinata_secret_api_key": secret_api_key,
+        })
+
+    def _wait_for_slot(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self._min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _backoff(self, attempt, retry_after=None):
+        metrics.count("ipfs_retries")
+        if retry_after is not None:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return
+        time.sleep(random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(res):
+        try:
+            return float(res.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+
+    def pin_file(self, source, file_name, options=None):
+        """Pin bytes, a path or a seekable file object and return its CID."""
+        fields = {"pinataOptions": json.dumps(options)} if options else None
+        start = source.tell() if hasattr(source, "tell") else None
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if start is not None:
+                source.seek(start)
+            body = MultipartStream(source, file_name, fields)
+            self._wait_for_slot()
+            try:
+                res = self.session.post(
+                    self.base_url + PIN_FILE_PATH,
+                    data=body,
+                    headers={"Content-Type": body.content_type},
+                    timeout=self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                self._backoff(attempt)
+                continue
+            finally:
+                body.close()
+
+            if res.status_code == 200:
+                return res.json()["IpfsHash"]
+            if res.status_code not in RETRY_STATUSES:
+                raise PinataError(f"Upload failed: {res.text}")
+            last_error = PinataError(f"Upload failed ({res.status_code}): {res.text}")
+            self._backoff(attempt, self._retry_after(res) if res.status_code == 429 else None)
+        raise PinataError(f"Upload failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def is_pinned(self, cid):
+        """True if this account already pins cid. Errors count as not pinned, so the caller just uploads."""
+        self._wait_for_slot()
+        try:
+            res = self.session.get(
+                self.base_url + PIN_LIST_PATH,
+                params={"hashContains": cid, "status": "pinned", "pageLimit": 1},
+                timeout=self.timeout,
+            )
+            return res.status_code == 200 and res.json().get("count", 0) > 0
+        except (requests.RequestException, ValueError):
+            return False
+
+    def pin_files(self, items, options=None):
+        """Pin many (source, file_name) pairs concurrently.
+
+        Returns results in input order; each is a CID or the exception raised
+        for that item.
+        """
+        def pin(item):
+            try:
+                return self.pin_file(*item, options=options)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(pin, items))
+
+    def close(self):
+        self.session.close()
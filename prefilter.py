@@ -0,0 +1,139 @@
+"""Bloom-filter prefilter over every known SHA-256 and on-chain phash.
+
+Most uploads are new, so a definite miss here lets check_duplicate skip the
+exact-match SQLite lookup, and (while the event mirror is fresh) the chain
+check too. Keys come from the local `files` table and the mirrored
+`chain_files` table; the filter is caught up by rowid on every lookup that
+finds a newer rowid than it has seen (rows other processes or nodes just
+wrote), fully rechecked every REFRESH_INTERVAL_S, and updated directly on
+local inserts. So a miss is never stale against committed rows. A snapshot
+next to the DB lets restarts skip the full scan.
+"""
+import os
+import threading
+import time
+
+import clients
+import storage
+from utils.bloom import BloomFilter
+
+MIN_CAPACITY = 1000000   # keys; ~1.2 MB at 1% false positives
+REFRESH_INTERVAL_S = 1.0
+TABLES = ("files", "chain_files")
+
+
+def _sha256_key(sha256):
+    try:
+        return bytes.fromhex(sha256)
+    except ValueError:
+        return sha256.encode()
+
+
+def _phash_key(phash):
+    return b"phash:" + phash.encode()
+
+
+class Prefilter:
+    """One Bloom filter holding SHA-256 keys (both tables) and chain phash keys."""
+
+    def __init__(self, capacity=MIN_CAPACITY, fp_rate=0.01):
+        self.bloom = BloomFilter(max(capacity, MIN_CAPACITY), fp_rate)
+        # table -> (last scanned rowid, its sha256) so a deleted/replaced row forces a rescan
+        self.cursors = {table: (0, None) for table in TABLES}
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self, conn, table):
+        rowid, sha256 = self.cursors[table]
+        if rowid and storage.sha256_at(conn, table, rowid) != sha256:
+            # A reorg rewind or a replaced DB can reuse rowids we already passed
+            rowid = 0
+        while True:
+            rows = storage.keys_after(conn, table, rowid)
+            if not rows:
+                break
+            keys = [_sha256_key(row[1]) for row in rows]
+            keys += [_phash_key(row[2]) for row in rows if row[2]]
+            self.bloom.add_many(keys)
+            rowid, sha256 = rows[-1][0], rows[-1][1]
+        self.cursors[table] = (rowid, sha256)
+
+    def refresh(self, conn, force=False):
+        """Catch up with rows written since the last refresh (by any process)."""
+        if not force and time.monotonic() - self._refreshed_at < REFRESH_INTERVAL_S:
+            # Between full refreshes, a newest-rowid probe per table still catches fresh rows
+            if all(storage.max_rowid(conn, table) <= self.cursors[table][0] for table in TABLES):
+                return
+        with self._lock:
+            for table in TABLES:
+                self._scan(conn, table)
+            if self.bloom.count > self.bloom.capacity:
+                # Past capacity the false-positive rate climbs; rebuild at twice the size
+                grown = Prefilter(2 * self.bloom.count, self.bloom.fp_rate)
+                for table in TABLES:
+                    grown._scan(conn, table)
+                self.bloom, self.cursors = grown.bloom, grown.cursors
+            self._refreshed_at = time.monotonic()
+
+    def might_have_sha256(self, sha256):
+        return _sha256_key(sha256) in self.bloom
+
+    def might_have_chain_phash(self, phash):
+        return bool(phash) and _phash_key(phash) in self.bloom
+
+    def add_sha256(self, sha256):
+        """Record a local insert right away instead of waiting for the next refresh."""
+        with self._lock:
+            self.bloom.add(_sha256_key(sha256))
+
+    def save(self, path):
+        with self._lock:
+            tmp = path + ".tmp"
+            self.bloom.save(tmp, {"cursors": self.cursors})
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, conn):
+        """Restore a snapshot; cursors that no longer match the DB are rescanned by refresh()."""
+        bloom, meta = BloomFilter.load(path)
+        prefilter = cls.__new__(cls)
+        prefilter.bloom = bloom
+        prefilter.cursors = {table: tuple(meta["cursors"].get(table, (0, None))) for table in TABLES}
+        prefilter._refreshed_at = 0.0
+        prefilter._lock = threading.Lock()
+        prefilter.refresh(conn, force=True)
+        return prefilter
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def snapshot_path():
+    return storage.DEDUP_DB_PATH + ".bloom"
+
+
+def get(conn):
+    """Return the process-wide prefilter, loading the snapshot or scanning the DB on first use."""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                prefilter = None
+                if os.path.exists(snapshot_path()):
+                    try:
+                        prefilter = Prefilter.load(snapshot_path(), conn)
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Ignoring prefilter snapshot: {e}")
+                if prefilter is None:
+                    prefilter = Prefilter(2 * storage.count_files(conn), clients.config()["bloom_fp_rate"])
+                    prefilter.refresh(conn, force=True)
+                _instance = prefilter
+    _instance.refresh(conn)
+    return _instance
+
+
+def save(path=None):
+    """Persist the current filter so the next start skips the full scan."""
+    if _instance is not None:
+        _instance.save(path or snapshot_path())
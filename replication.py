@@ -0,0 +1,314 @@
+"""Incremental replication of the dedup DB through an append-only change log.
+
+Each node appends compact records (new fingerprints, CIDs) to
+data/replication/<node>/pending.jsonl. A background shipper seals pending
+records into an immutable segment every SHIP_INTERVAL_S seconds or
+SHIP_MAX_RECORDS records and ships only the new files, so sync cost tracks
+the size of the change rather than the size of the DB. Old segments are
+periodically folded into a snapshot. Other nodes apply segments (or the
+snapshot, if they are far behind) from their last applied offset.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+
+import storage
+
+REPLICATION_DIR = os.path.join("data", "replication")
+NODE_ID = os.getenv("DEDUVAULT_NODE_ID", socket.gethostname())
+SHIP_INTERVAL_S = 30
+SHIP_MAX_RECORDS = 200
+COMPACT_EVERY_SEGMENTS = 50
+
+_SEGMENT_RE = re.compile(r"segment-(\d+)-(\d+)\.jsonl$")
+_SNAPSHOT_RE = re.compile(r"snapshot-(\d+)\.jsonl$")
+
+
+def _segments(node_dir):
+    """Return sorted (first, last, path) for a node's sealed segments."""
+    found = []
+    for path in glob.glob(os.path.join(node_dir, "segment-*.jsonl")):
+        m = _SEGMENT_RE.search(path)
+        if m:
+            found.append((int(m.group(1)), int(m.group(2)), path))
+    return sorted(found)
+
+
+def _latest_snapshot(node_dir):
+    """Return (offset, path) of a node's newest snapshot, or None."""
+    found = []
+    for path in glob.glob(os.path.join(node_dir, "snapshot-*.jsonl")):
+        m = _SNAPSHOT_RE.search(path)
+        if m:
+            found.append((int(m.group(1)), path))
+    return max(found) if found else None
+
+
+def _read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplicationLog:
+    """Append-only change log owned by one node."""
+
+    def __init__(self, node_id=NODE_ID, base_dir=REPLICATION_DIR):
+        self.node_id = node_id
+        self.dir = os.path.join(base_dir, node_id)
+        self.pending_path = os.path.join(self.dir, "pending.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+        self.pending = _read(self.pending_path) if os.path.exists(self.pending_path) else []
+        self.last_offset = self._recover_offset()
+
+    def _recover_offset(self):
+        if self.pending:
+            return self.pending[-1]["offset"]
+        segments = _segments(self.dir)
+        if segments:
+            return segments[-1][1]
+        snapshot = _latest_snapshot(self.dir)
+        return snapshot[0] if snapshot else 0
+
+    def append(self, record):
+        """Append one record and return its offset."""
+        with self._lock:
+            self.last_offset += 1
+            record = dict(record, offset=self.last_offset)
+            with open(self.pending_path, "a") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.pending.append(record)
+            return self.last_offset
+
+    def seal(self):
+        """Turn pending records into an immutable segment; returns its path or None."""
+        with self._lock:
+            if not self.pending:
+                return None
+            first, last = self.pending[0]["offset"], self.pending[-1]["offset"]
+            path = os.path.join(self.dir, f"segment-{first:012d}-{last:012d}.jsonl")
+            os.replace(self.pending_path, path)
+            self.pending = []
+            return path
+
+    def compact(self):
+        """Fold all sealed segments into one snapshot.
+
+        Returns (added, removed) paths. A file record absorbs any later CID
+        record for the same SHA-256, so the snapshot holds one line per file.
+        """
+        segments = _segments(self.dir)
+        if not segments:
+            return [], []
+        previous = _latest_snapshot(self.dir)
+        records = {}
+        sources = ([previous[1]] if previous else []) + [path for _, _, path in segments]
+        for path in sources:
+            for record in _read(path):
+                if record["op"] == "file":
+                    records.setdefault(record["sha256"], {}).update(record)
+                elif record["op"] == "cid":
+                    records.setdefault(record["sha256"], {"op": "file", "sha256": record["sha256"]})["cid"] = record["cid"]
+        offset = segments[-1][1]
+        path = os.path.join(self.dir, f"snapshot-{offset:012d}.jsonl")
+        with open(path + ".tmp", "w") as f:
+            for record in records.values():
+                f.write(json.dumps(dict(record, offset=offset), separators=(",", ":")) + "\n")
+        os.replace(path + ".tmp", path)
+        removed = [p for _, _, p in segments] + ([previous[1]] if previous else [])
+        for p in removed:
+            os.remove(p)
+        return [path], removed
+
+
+def _apply_record(conn, record):
+    if record["op"] == "file":
+        storage.insert_files(
+            conn, [(record["sha256"], record.get("phash"), record.get("file_name"), record.get("fingerprints"))]
+        )
+        if record.get("cid"):
+            storage.set_cid(conn, record["sha256"], record["cid"])
+    elif record["op"] == "cid":
+        storage.set_cid(conn, record["sha256"], record["cid"])
+
+
+def apply_remote_logs(base_dir=REPLICATION_DIR, node_id=NODE_ID):
+    """Apply other nodes' records past their last applied offsets; returns records applied."""
+    applied_total = 0
+    with storage.connection() as conn:
+        for node_dir in sorted(glob.glob(os.path.join(base_dir, "*"))):
+            node = os.path.basename(node_dir)
+            if node == node_id or not os.path.isdir(node_dir):
+                continue
+            key = f"applied:{node}"
+            applied = storage.get_state(conn, key)
+            snapshot = _latest_snapshot(node_dir)
+            if snapshot and snapshot[0] > applied:
+                # Segments up to the snapshot may be compacted away; start from it
+                with conn:
+                    for record in _read(snapshot[1]):
+                        _apply_record(conn, record)
+                        applied_total += 1
+                    applied = snapshot[0]
+                    storage.set_state(conn, key, applied)
+            for _, last, path in _segments(node_dir):
+                if last <= applied:
+                    continue
+                with conn:
+                    for record in _read(path):
+                        if record["offset"] > applied:
+                            _apply_record(conn, record)
+                            applied_total += 1
+                    applied = last
+                    storage.set_state(conn, key, applied)
+    return applied_total
+
+
+class GitTransport:
+    """Ships log files through the repo's git remote."""
+
+    def __init__(self, repo_dir="."):
+        import git
+
+        self.repo = git.Repo(repo_dir)
+        self.origin = self.repo.remotes.origin
+
+    def fetch(self):
+        # A rebase rewrites tracked files under the running app, so it only runs on a clean tree;
+        # the log is committed locally first and goes out with the next ship after a cleanup
+        if self.repo.is_dirty():
+            raise RuntimeError(
+                f"Not pulling replication logs: {self.repo.working_tree_dir} has uncommitted changes to tracked files"
+            )
+        self.origin.pull(rebase=True)
+
+    def _repo_path(self, path):
+        return os.path.relpath(os.path.abspath(path), self.repo.working_tree_dir).replace(os.sep, "/")
+
+    def ship(self, added, removed):
+        # A segment sealed and compacted away in one pass was never tracked; `git rm` would fail on it
+        tracked = {path for path, _ in self.repo.index.entries}
+        removed = [path for path in map(self._repo_path, removed) if path in tracked]
+        added = [self._repo_path(path) for path in added]
+        if removed:
+            self.repo.index.remove(removed, working_tree=False)
+        if added:
+            self.repo.index.add(added)
+        if not added and not removed:
+            self.fetch()
+            return
+        # Commit only the log paths, never whatever else happens to be staged
+        self.repo.git.commit("-m", f"Replication log update from {NODE_ID}", "--", *removed, *added)
+        self.fetch()
+        self.origin.push()
+
+
+class Shipper:
+    """Background thread that seals, compacts, ships and applies the log."""
+
+    def __init__(self, log, transport, interval_s=SHIP_INTERVAL_S, max_records=SHIP_MAX_RECORDS):
+        self.log = log
+        self.transport = transport
+        self.interval_s = interval_s
+        self.max_records = max_records
+        self._last_ship = time.monotonic()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replication-shipper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def nudge(self):
+        """Check the size threshold now rather than on the next tick."""
+        self._wake.set()
+
+    def ship_once(self):
+        added, removed = [], []
+        segment = self.log.seal()
+        if segment:
+            added.append(segment)
+        if len(_segments(self.log.dir)) >= COMPACT_EVERY_SEGMENTS:
+            added, removed = self.log.compact()
+        self.transport.ship(added, removed)
+        self._last_ship = time.monotonic()
+        apply_remote_logs(node_id=self.log.node_id)
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=1.0)
+            self._wake.clear()
+            due = time.monotonic() - self._last_ship >= self.interval_s
+            if len(self.log.pending) >= self.max_records or due:
+                try:
+                    self.ship_once()
+                except Exception as e:
+                    logging.error(f"Replication ship failed: {e}")
+                    self._last_ship = time.monotonic()
+
+
+_log = None
+_shipper = None
+_start_lock = threading.Lock()
+
+
+def get_log(node_id=None, base_dir=None):
+    """Return this process's log, created on first use (the arguments only apply then)."""
+    global _log
+    with _start_lock:
+        if _log is None:
+            _log = ReplicationLog(node_id or NODE_ID, base_dir or REPLICATION_DIR)
+        return _log
+
+
+def record_file(sha256, phash, file_name, fingerprints=None):
+    """Log a newly stored file."""
+    get_log().append({"op": "file", "sha256": sha256, "phash": phash, "file_name": file_name,
+                      "fingerprints": fingerprints or {}})
+    if _shipper:
+        _shipper.nudge()
+
+
+def record_cid(sha256, cid):
+    """Log the IPFS CID assigned to a stored file."""
+    get_log().append({"op": "cid", "sha256": sha256, "cid": cid})
+    if _shipper:
+        _shipper.nudge()
+
+
+def flush(repo_dir="."):
+    """Seal and ship this process's pending records now (for CLI runs without a shipper)."""
+    log = get_log()
+    try:
+        transport = _shipper.transport if _shipper else GitTransport(repo_dir)
+        segment = log.seal()
+        transport.ship([segment] if segment else [], [])
+    except Exception as e:
+        logging.error(f"Replication flush failed: {e}")
+
+
+def start(repo_dir="."):
+    """Catch up from the remote once, then ship in the background. Safe to call repeatedly."""
+    global _shipper
+    log = get_log()
+    with _start_lock:
+        if _shipper is not None:
+            return _shipper
+        try:
+            transport = GitTransport(repo_dir)
+            transport.fetch()
+            logging.info("Pulled latest replication log")
+        except Exception as e:
+            logging.error(f"Replication fetch failed: {e}")
+            return None
+        try:
+            apply_remote_logs(node_id=log.node_id)
+        except Exception as e:
+            logging.error(f"Replication catch-up failed: {e}")
+        _shipper = Shipper(log, transport)
+        _shipper.start()
+        return _shipper
@@ -0,0 +1,402 @@
+"""Sharded dedup store: `files` records partitioned by SHA-256 prefix.
+
+Each shard is its own SQLite file with the storage.py schema, served by a
+dedicated worker (a process by default), so shards write in parallel and
+stay independent of one another. A routing table (data/shards.json) maps
+the 256 first-byte buckets to shards:
+
+    {"version": 3,
+     "shards": {"s0": "shards/s0.sqlite", ...},      # paths relative to the routing file
+     "routes": ["s0", "s0", ..., "s3"],             # bucket -> owning shard
+     "migrating": {"17": ["s0", "s4"]}}              # bucket -> [source, destination]
+
+Exact lookups go to the owning shard. Near-duplicate queries fan out to
+every shard in parallel, and the matches are merged. add_shard() moves a
+fair share of buckets to the new shard while reads and writes continue:
+
+1. Mark the buckets as migrating. New writes go to the destination, and
+   reads check the destination and then the source.
+2. Copy the rows over.
+3. Flip the routes.
+4. Delete the rows from the source.
+
+Other processes notice routing changes within ROUTING_TTL_S.
+
+Usage:
+    python sharding.py init --shards 4
+    python sharding.py import --db data/dedup_db.sqlite
+    python sharding.py add-shard s4
+    python sharding.py rebalance        # finish migrations left by an interrupted add-shard
+    python sharding.py status
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import storage
+from utils.phash_index import PhashIndex
+
+ROUTING_PATH = os.path.join("data", "shards.json")
+NUM_BUCKETS = 256
+ROUTING_TTL_S = 2.0
+COPY_BATCH = 5000
+
+
+def bucket_of(sha256):
+    return int(sha256[:2], 16)
+
+
+def _bucket_range(bucket):
+    """(after, before) bounds of a bucket for storage.files_in_range; 'g' sorts after every hex digit."""
+    prefix = f"{bucket:02x}"
+    return prefix, prefix + "g"
+
+
+# --- Shard worker side: one state per shard path, owned by that shard's worker ---
+
+class _ShardState:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=storage.BUSY_TIMEOUT_S, check_same_thread=False, cached_statements=256)
+        for pragma in storage.PRAGMAS:
+            self.conn.execute(pragma)
+        with self.conn:
+            storage.create_schema(self.conn)
+        self.reset_index()
+
+    def reset_index(self):
+        self.index = PhashIndex()
+        self.rowid = 0
+
+    def refresh_index(self):
+        for rowid, sha256, phash_int in storage.phash_rows_after(self.conn, self.rowid):
+            self.rowid = rowid
+            if phash_int is not None:
+                self.index.add(sha256, phash_int)
+        return self.index
+
+
+_states = {}
+
+
+def _state(path):
+    state = _states.get(path)
+    if state is None:
+        state = _states[path] = _ShardState(path)
+    return state
+
+
+def _exists(path, sha256s):
+    conn = _state(path).conn
+    return [storage.sha256_exists(conn, sha256) for sha256 in sha256s]
+
+
+def _get(path, sha256):
+    return storage.get_file(_state(path).conn, sha256)
+
+
+def _insert(path, records):
+    """Insert (sha256, phash, file_name, fingerprints, cid) records; returns how many were new."""
+    conn = _state(path).conn
+    with conn:
+        before = conn.total_changes
+        storage.insert_files(conn, [record[:4] for record in records])
+        inserted = conn.total_changes - before
+        for record in records:
+            if record[4]:
+                storage.set_cid(conn, record[0], record[4])
+    return inserted
+
+
+def _similar(path, fingerprints_list):
+    from uploader import find_similar
+
+    state = _state(path)
+    index = state.refresh_index()
+    return [find_similar(state.conn, fingerprints, index=index) for fingerprints in fingerprints_list]
+
+
+def _bucket_rows(path, bucket, after=None):
+    low, high = _bucket_range(bucket)
+    return storage.files_in_range(_state(path).conn, after or low, high, COPY_BATCH)
+
+
+def _delete_bucket(path, bucket):
+    state = _state(path)
+    with state.conn:
+        deleted = storage.delete_files_in_range(state.conn, *_bucket_range(bucket))
+    state.reset_index()  # the index has no removal; rebuild it on the next query
+    return deleted
+
+
+def _count(path):
+    return storage.count_files(_state(path).conn)
+
+
+# --- Client side ---
+
+def init_routing(path=ROUTING_PATH, num_shards=4):
+    """Write a routing table splitting the buckets into num_shards contiguous ranges."""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    shards = [f"s{i}" for i in range(num_shards)]
+    routing = {
+        "version": 1,
+        "shards": {name: os.path.join("shards", f"{name}.sqlite") for name in shards},
+        "routes": [shards[bucket * num_shards // NUM_BUCKETS] for bucket in range(NUM_BUCKETS)],
+        "migrating": {},
+    }
+    _write_routing(path, routing)
+    return routing
+
+
+def _write_routing(path, routing):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(routing, f, indent=1)
+    os.replace(tmp, path)
+
+
+class ShardedStore:
+    """Route exact lookups and writes by SHA-256 prefix; fan near-duplicate queries out to all shards.
+
+    processes=False runs each shard's worker as a thread instead (same
+    routing and isolation, no extra processes).
+    """
+
+    def __init__(self, routing_path=ROUTING_PATH, processes=True):
+        self.routing_path = routing_path
+        self.processes = processes
+        self._executors = {}
+        self._lock = threading.RLock()
+        self._load_routing()
+
+    def _load_routing(self):
+        with open(self.routing_path) as f:
+            self.routing = json.load(f)
+        self._mtime = os.stat(self.routing_path).st_mtime_ns
+        self._checked_at = time.monotonic()
+
+    def _current(self):
+        """The routing table, re-read if another process changed it (checked every ROUTING_TTL_S)."""
+        with self._lock:
+            if time.monotonic() - self._checked_at > ROUTING_TTL_S:
+                self._checked_at = time.monotonic()
+                if os.stat(self.routing_path).st_mtime_ns != self._mtime:
+                    self._load_routing()
+            return self.routing
+
+    def _save_routing(self):
+        self.routing["version"] += 1
+        _write_routing(self.routing_path, self.routing)
+        self._mtime = os.stat(self.routing_path).st_mtime_ns
+
+    def _path(self, shard):
+        return os.path.join(os.path.dirname(os.path.abspath(self.routing_path)), self.routing["shards"][shard])
+
+    def _submit(self, shard, fn, *args):
+        with self._lock:
+            executor = self._executors.get(shard)
+            if executor is None:
+                if self.processes:
+                    # One worker per shard: it alone writes that file and owns its phash index
+                    executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("forkserver"))
+                else:
+                    executor = ThreadPoolExecutor(1, thread_name_prefix=f"shard-{shard}")
+                self._executors[shard] = executor
+            path = self._path(shard)
+        return executor.submit(fn, path, *args)
+
+    def readers(self, sha256):
+        """Shards that may hold sha256: its owner, or destination then source while its bucket moves."""
+        routing = self._current()
+        bucket = bucket_of(sha256)
+        moving = routing["migrating"].get(str(bucket))
+        return [moving[1], moving[0]] if moving else [routing["routes"][bucket]]
+
+    def writer(self, sha256):
+        return self.readers(sha256)[0]
+
+    def sha256_exists_many(self, sha256s):
+        """One bool per SHA-256; each shard answers its share in a single call."""
+        by_shard = {}
+        for i, sha256 in enumerate(sha256s):
+            for shard in self.readers(sha256):
+                by_shard.setdefault(shard, []).append(i)
+        futures = {shard: self._submit(shard, _exists, [sha256s[i] for i in idx]) for shard, idx in by_shard.items()}
+        found = [False] * len(sha256s)
+        for shard, idx in by_shard.items():
+            for i, exists in zip(idx, futures[shard].result()):
+                found[i] = found[i] or exists
+        return found
+
+    def sha256_exists(self, sha256):
+        return self.sha256_exists_many([sha256])[0]
+
+    def get_file(self, sha256):
+        for shard in self.readers(sha256):
+            record = self._submit(shard, _get, sha256).result()
+            if record is not None:
+                return record
+        return None
+
+    def insert_files(self, records):
+        """Insert (sha256, phash, file_name, fingerprints[, cid]) records, skipping known SHA-256s; returns the count."""
+        by_shard = {}
+        for record in records:
+            record = tuple(record) + (None,) * (5 - len(record))
+            by_shard.setdefault(self.writer(record[0]), []).append(record)
+        futures = [self._submit(shard, _insert, batch) for shard, batch in by_shard.items()]
+        return sum(future.result() for future in futures)
+
+    def find_similar_many(self, fingerprints_list, top_k=10):
+        """Per query, the top_k (sha256, distance) matches across all shards, closest first."""
+        futures = [self._submit(shard, _similar, fingerprints_list) for shard in self._current()["shards"]]
+        merged = [{} for _ in fingerprints_list]
+        for future in futures:
+            for best, matches in zip(merged, future.result()):
+                for sha256, distance in matches:
+                    best[sha256] = min(distance, best.get(sha256, distance))
+        return [sorted(best.items(), key=lambda match: (match[1], match[0]))[:top_k] for best in merged]
+
+    def find_similar(self, fingerprints, top_k=10):
+        return self.find_similar_many([fingerprints], top_k)[0]
+
+    def check(self, sha256, fingerprints):
+        """Same contract as uploader.find_local_duplicate: (True, message) or None."""
+        if self.sha256_exists(sha256):
+            return True, "Exact duplicate found (SHA-256)"
+        matches = self.find_similar(fingerprints)
+        if matches:
+            _, hamming_distance = matches[0]
+            return True, f"Visually similar image found (phash, hamming distance: {hamming_distance}, {len(matches)} match(es))"
+        return None
+
+    def status(self):
+        """{shard: {"buckets": n, "files": n, "path": ...}}"""
+        routing = self._current()
+        counts = {shard: self._submit(shard, _count) for shard in routing["shards"]}
+        return {
+            shard: {
+                "buckets": routing["routes"].count(shard),
+                "files": counts[shard].result(),
+                "path": self._path(shard),
+            }
+            for shard in routing["shards"]
+        }
+
+    def add_shard(self, name, path=None, settle_s=2 * ROUTING_TTL_S):
+        """Add a shard and move a fair share of buckets to it online; returns the moved buckets.
+
+        settle_s gives other processes time to pick up each routing change
+        before rows move.
+        """
+        with self._lock:
+            routing = self._current()
+            if name in routing["shards"]:
+                raise ValueError(f"Shard {name} already exists")
+            routing["shards"][name] = path or os.path.join("shards", f"{name}.sqlite")
+            moves = self._plan_moves(name)
+            for bucket, source in moves:
+                routing["migrating"][str(bucket)] = [source, name]
+            self._save_routing()
+        time.sleep(settle_s)
+        self.finish_migrations()
+        return [bucket for bucket, _ in moves]
+
+    def _plan_moves(self, new_shard):
+        """Take buckets from the most loaded shards until the new one holds its share."""
+        routes = self.routing["routes"]
+        owned = {shard: [b for b, owner in enumerate(routes) if owner == shard] for shard in self.routing["shards"]}
+        target = NUM_BUCKETS // len(owned)
+        moves = []
+        while len(moves) < target:
+            source = max((s for s in owned if s != new_shard), key=lambda s: (len(owned[s]), s))
+            moves.append((owned[source].pop(), source))
+        return moves
+
+    def finish_migrations(self):
+        """Copy, re-route and clean up every migrating bucket; safe to re-run after an interruption."""
+        for bucket, (source, destination) in sorted(self._current()["migrating"].items()):
+            bucket = int(bucket)
+            after = None
+            while True:
+                rows = self._submit(source, _bucket_rows, bucket, after).result()
+                if not rows:
+                    break
+                self._submit(destination, _insert, rows).result()
+                after = rows[-1][0]
+            with self._lock:
+                self.routing["routes"][bucket] = destination
+                del self.routing["migrating"][str(bucket)]
+                self._save_routing()
+            # Readers still holding the old table check the destination first, so this is safe
+            self._submit(source, _delete_bucket, bucket).result()
+
+    def close(self):
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown()
+            self._executors.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def import_db(store, db_path):
+    """Copy every record of a single-file dedup DB into the shards; returns the number inserted."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    inserted, batch = 0, []
+    try:
+        for record in storage.iter_files(conn):
+            batch.append(record)
+            if len(batch) >= COPY_BATCH:
+                inserted += store.insert_files(batch)
+                batch.clear()
+        inserted += store.insert_files(batch)
+    finally:
+        conn.close()
+    return inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the sharded dedup store.")
+    parser.add_argument("--routing", default=ROUTING_PATH, help="Routing table path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    init = sub.add_parser("init", help="Create a routing table")
+    init.add_argument("--shards", type=int, default=4)
+    imp = sub.add_parser("import", help="Copy a single-file dedup DB into the shards")
+    imp.add_argument("--db", default=storage.DEDUP_DB_PATH)
+    add = sub.add_parser("add-shard", help="Add a shard and rebalance onto it")
+    add.add_argument("name")
+    add.add_argument("--path", help="Shard file, relative to the routing table")
+    sub.add_parser("rebalance", help="Finish interrupted bucket migrations")
+    sub.add_parser("status", help="Buckets and files per shard")
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        init_routing(args.routing, args.shards)
+        print(f"Wrote {args.routing} with {args.shards} shards")
+        return
+    with ShardedStore(args.routing) as store:
+        if args.command == "import":
+            print(f"Imported {import_db(store, args.db)} records from {args.db}")
+        elif args.command == "add-shard":
+            moved = store.add_shard(args.name, args.path)
+            print(f"Moved {len(moved)} buckets to {args.name}")
+        elif args.command == "rebalance":
+            store.finish_migrations()
+        print(json.dumps(store.status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
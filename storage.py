@@ -0,0 +1,539 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.hamming import int_to_phash, phash_to_int
+
+DEDUP_DB_PATH = "data/dedup_db.sqlite"
+POOL_SIZE = 4
+POOL_TIMEOUT_S = 60  # longest wait for a free pooled connection before giving up
+BUSY_TIMEOUT_S = 30
+
+# Applied to every pooled connection. journal_mode=WAL is persistent in the
+# file and lets readers proceed while a writer holds the lock.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files (sha256 TEXT PRIMARY KEY, phash TEXT, file_name TEXT, phash_int INTEGER)",
+    # Local mirror of FileStored events, maintained by indexer.py
+    "CREATE TABLE IF NOT EXISTS chain_files (sha256 TEXT PRIMARY KEY, phash TEXT, cid TEXT, uploader TEXT, "
+    "timestamp INTEGER, block_number INTEGER, block_hash TEXT, log_index INTEGER)",
+    "CREATE INDEX IF NOT EXISTS idx_chain_files_phash ON chain_files (phash)",
+    "CREATE INDEX IF NOT EXISTS idx_chain_files_block ON chain_files (block_number)",
+    # Hashes of recently synced blocks, newest is the cursor; used to detect reorgs
+    "CREATE TABLE IF NOT EXISTS chain_blocks (block_number INTEGER PRIMARY KEY, block_hash TEXT, synced_at REAL)",
+    # Replication log offsets (written/shipped/applied per node), see replication.py
+    "CREATE TABLE IF NOT EXISTS replication_state (key TEXT PRIMARY KEY, value INTEGER)",
+    # Content-defined chunks of large/non-image files and each file's chunk list, see chunkstore.py
+    "CREATE TABLE IF NOT EXISTS chunks (sha256 TEXT PRIMARY KEY, size INTEGER, cid TEXT)",
+    # CIDs known to be stored per blob backend, see blobstore.py
+    "CREATE TABLE IF NOT EXISTS pins (cid TEXT, backend TEXT, size INTEGER, file_name TEXT, pinned_at REAL, "
+    "PRIMARY KEY (cid, backend))",
+    "CREATE TABLE IF NOT EXISTS manifests (sha256 TEXT PRIMARY KEY, file_name TEXT, size INTEGER, "
+    "chunk_count INTEGER, created REAL)",
+    "CREATE TABLE IF NOT EXISTS manifest_chunks (file_sha256 TEXT, seq INTEGER, chunk_sha256 TEXT, "
+    "PRIMARY KEY (file_sha256, seq)) WITHOUT ROWID",
+    # Merkle-anchored records (root NULL until batched) and the roots sent on-chain, see anchoring.py
+    "CREATE TABLE IF NOT EXISTS anchor_leaves (sha256 TEXT PRIMARY KEY, phash TEXT, cid TEXT, queued_at REAL, "
+    "root TEXT, leaf_index INTEGER, proof TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_anchor_leaves_root ON anchor_leaves (root)",
+    "CREATE TABLE IF NOT EXISTS anchor_roots (root TEXT PRIMARY KEY, leaf_count INTEGER, anchorer TEXT, "
+    "created_at REAL, status TEXT, tx_hash TEXT, nonce INTEGER)",
+)
+
+# Fingerprint algorithm -> integer column in files. The legacy phash/phash_int
+# pair holds the aHash that is also registered on-chain.
+FINGERPRINT_COLUMNS = {
+    "ahash": "phash_int",
+    "phash": "dct_phash",
+    "dhash": "dhash",
+    "whash": "whash",
+    "colorhash": "colorhash",
+}
+
+# Statement text is kept constant so sqlite3's per-connection statement
+# cache hands back the already-prepared statement on every call.
+SQL_SHA256_EXISTS = "SELECT 1 FROM files WHERE sha256 = ?"
+SQL_COUNT_FILES = "SELECT COUNT(*) FROM files"
+SQL_GET_FILE = "SELECT sha256, phash, file_name, phash_int FROM files WHERE sha256 = ?"
+SQL_PHASH_ROWS_AFTER = "SELECT rowid, sha256, phash_int FROM files WHERE rowid > ? ORDER BY rowid"
+_FILE_COLUMNS = "sha256, phash, file_name, " + ", ".join(FINGERPRINT_COLUMNS.values())
+_FILE_PARAMS = ", ".join("?" * (3 + len(FINGERPRINT_COLUMNS)))
+SQL_INSERT_FILE = f"INSERT INTO files ({_FILE_COLUMNS}) VALUES ({_FILE_PARAMS})"
+SQL_INSERT_FILE_IGNORE = f"INSERT OR IGNORE INTO files ({_FILE_COLUMNS}) VALUES ({_FILE_PARAMS})"
+# Returns the new rowid, or no row if the SHA-256 was already stored
+SQL_UPSERT_FILE = f"INSERT INTO files ({_FILE_COLUMNS}) VALUES ({_FILE_PARAMS}) ON CONFLICT(sha256) DO NOTHING RETURNING rowid"
+SQL_CHAIN_SHA256_EXISTS = "SELECT 1 FROM chain_files WHERE sha256 = ?"
+SQL_CHAIN_PHASH_EXISTS = "SELECT 1 FROM chain_files WHERE phash = ? LIMIT 1"
+SQL_GET_CHAIN_FILE = "SELECT sha256, phash, cid, uploader, timestamp FROM chain_files WHERE sha256 = ?"
+SQL_CHAIN_CURSOR = "SELECT block_number, block_hash, synced_at FROM chain_blocks ORDER BY block_number DESC LIMIT 1"
+# Per-table (rowid, sha256, phash) scans and rowid probes for the Bloom prefilter
+SQL_KEYS_AFTER = {
+    "files": "SELECT rowid, sha256, NULL FROM files WHERE rowid > ? ORDER BY rowid LIMIT ?",
+    "chain_files": "SELECT rowid, sha256, phash FROM chain_files WHERE rowid > ? ORDER BY rowid LIMIT ?",
+}
+SQL_SHA256_AT = {
+    "files": "SELECT sha256 FROM files WHERE rowid = ?",
+    "chain_files": "SELECT sha256 FROM chain_files WHERE rowid = ?",
+}
+SQL_MAX_ROWID = {
+    "files": "SELECT COALESCE(MAX(rowid), 0) FROM files",
+    "chain_files": "SELECT COALESCE(MAX(rowid), 0) FROM chain_files",
+}
+_RECORD_COLUMNS = "sha256, phash, file_name, cid, " + ", ".join(FINGERPRINT_COLUMNS.values())
+SQL_FILES_IN_RANGE = f"SELECT {_RECORD_COLUMNS} FROM files WHERE sha256 > ? AND sha256 < ? ORDER BY sha256 LIMIT ?"
+SQL_GET_FINGERPRINTS = "SELECT sha256, " + ", ".join(FINGERPRINT_COLUMNS.values()) + " FROM files WHERE sha256 IN ({})"
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_created = 0
+
+
+def connect():
+    """Open a new connection to DEDUP_DB_PATH with PRAGMAS applied (outside the pool)."""
+    os.makedirs(os.path.dirname(DEDUP_DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(
+        DEDUP_DB_PATH, timeout=BUSY_TIMEOUT_S, check_same_thread=False, cached_statements=256
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _get_pool():
+    """Return this process's connection pool, discarding one inherited across fork."""
+    global _pool, _pool_pid, _created
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = queue.LifoQueue()
+                _pool_pid = os.getpid()
+                _created = 0
+    return _pool
+
+
+@contextmanager
+def connection(conn=None):
+    """Borrow a pooled connection. Use `with conn:` inside for a transaction.
+
+    Pass the connection a caller already holds to reuse it instead: nested
+    borrows from one thread can otherwise exhaust the pool and wait forever.
+    """
+    global _created
+    if conn is not None:
+        yield conn
+        return
+    pool = _get_pool()
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        with _pool_lock:
+            grow = _created < POOL_SIZE
+            if grow:
+                _created += 1
+        if grow:
+            try:
+                conn = connect()
+            except Exception:
+                with _pool_lock:
+                    _created -= 1  # give the slot back, or a few failed opens would shrink the pool for good
+                raise
+        else:
+            try:
+                conn = pool.get(timeout=POOL_TIMEOUT_S)
+            except queue.Empty:
+                raise TimeoutError(f"No pooled DB connection free after {POOL_TIMEOUT_S}s") from None
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        pool.put(conn)
+
+
+def close_pool():
+    """Close idle pooled connections so the next connection() opens DEDUP_DB_PATH afresh."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    while pool is not None and not pool.empty():
+        pool.get_nowait().close()
+
+
+def init_db():
+    """Create tables and indexes and run pending migrations."""
+    with connection() as conn:
+        with conn:
+            create_schema(conn)
+
+
+def create_schema(conn):
+    """Create tables and run migrations on any connection; the caller owns the transaction."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    migrate_phash_int(conn)
+    migrate_fingerprint_columns(conn)
+    migrate_cid_column(conn)
+    migrate_anchor_nonce(conn)
+
+
+def migrate_phash_int(conn):
+    """Add the integer phash column to older databases and backfill it from hex."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+    if "phash_int" not in columns:
+        conn.execute("ALTER TABLE files ADD COLUMN phash_int INTEGER")
+    rows = conn.execute("SELECT sha256, phash FROM files WHERE phash_int IS NULL AND phash IS NOT NULL").fetchall()
+    for sha256, phash in rows:
+        try:
+            conn.execute("UPDATE files SET phash_int = ? WHERE sha256 = ?", (phash_to_int(phash), sha256))
+        except ValueError:
+            print(f"Skipping malformed phash for {sha256}: {phash}")
+
+
+def migrate_fingerprint_columns(conn):
+    """Add a nullable column for every fingerprint algorithm missing from files."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+    for column in FINGERPRINT_COLUMNS.values():
+        if column not in columns:
+            conn.execute(f"ALTER TABLE files ADD COLUMN {column} INTEGER")
+
+
+def migrate_cid_column(conn):
+    """Add the IPFS CID column to older databases."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+    if "cid" not in columns:
+        conn.execute("ALTER TABLE files ADD COLUMN cid TEXT")
+
+
+def migrate_anchor_nonce(conn):
+    """Add the transaction nonce column to anchor_roots."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(anchor_roots)")]
+    if "nonce" not in columns:
+        conn.execute("ALTER TABLE anchor_roots ADD COLUMN nonce INTEGER")
+
+
+def checkpoint():
+    """Fold the WAL back into the main DB file, e.g. before copying it."""
+    with connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def sha256_exists(conn, sha256):
+    """True if a record with this SHA-256 is stored (answered from the primary key index)."""
+    return conn.execute(SQL_SHA256_EXISTS, (sha256,)).fetchone() is not None
+
+
+def count_files(conn):
+    """Number of files in the local dedup DB."""
+    return conn.execute(SQL_COUNT_FILES).fetchone()[0]
+
+
+def get_file(conn, sha256):
+    """Return the stored record for sha256 as a dict, or None."""
+    row = conn.execute(SQL_GET_FILE, (sha256,)).fetchone()
+    if row is None:
+        return None
+    return {"sha256": row[0], "phash": row[1], "file_name": row[2], "phash_int": row[3]}
+
+
+def phash_rows_after(conn, rowid):
+    """Return (rowid, sha256, phash_int) for rows inserted after rowid."""
+    return conn.execute(SQL_PHASH_ROWS_AFTER, (rowid,)).fetchall()
+
+
+def keys_after(conn, table, rowid, limit=100000):
+    """Return up to `limit` (rowid, sha256, phash) rows of files/chain_files past rowid.
+
+    phash is only returned for chain_files (the contract's exact phash check).
+    """
+    return conn.execute(SQL_KEYS_AFTER[table], (rowid, limit)).fetchall()
+
+
+def sha256_at(conn, table, rowid):
+    """The sha256 stored at rowid in files/chain_files, or None if that row is gone."""
+    row = conn.execute(SQL_SHA256_AT[table], (rowid,)).fetchone()
+    return row[0] if row else None
+
+
+def max_rowid(conn, table):
+    """The newest rowid in files/chain_files, 0 if empty."""
+    return conn.execute(SQL_MAX_ROWID[table]).fetchone()[0]
+
+
+def _file_row(sha256, phash, file_name, fingerprints):
+    fingerprints = dict(fingerprints or {})
+    fingerprints.setdefault("ahash", phash)
+    return (sha256, phash, file_name) + tuple(phash_to_int(fingerprints.get(name)) for name in FINGERPRINT_COLUMNS)
+
+
+def insert_file(conn, sha256, phash, file_name, fingerprints=None):
+    """Insert one record; the caller owns the transaction."""
+    conn.execute(SQL_INSERT_FILE, _file_row(sha256, phash, file_name, fingerprints))
+
+
+def upsert_file(conn, sha256, phash, file_name, fingerprints=None):
+    """Insert one record unless its SHA-256 is stored; True if it was new. The caller owns the transaction."""
+    return conn.execute(SQL_UPSERT_FILE, _file_row(sha256, phash, file_name, fingerprints)).fetchone() is not None
+
+
+def insert_files(conn, records):
+    """Insert many (sha256, phash, file_name, fingerprints) records, skipping known SHA-256s."""
+    conn.executemany(SQL_INSERT_FILE_IGNORE, [_file_row(*record) for record in records])
+
+
+def set_cid(conn, sha256, cid):
+    """Record the IPFS CID for a stored file; the caller owns the transaction."""
+    conn.execute("UPDATE files SET cid = ? WHERE sha256 = ?", (cid, sha256))
+
+
+def _record(row):
+    fingerprints = {
+        name: int_to_phash(value) for name, value in zip(FINGERPRINT_COLUMNS, row[4:]) if value is not None
+    }
+    return row[0], row[1], row[2], fingerprints, row[3]
+
+
+def iter_files(conn):
+    """Yield every record as (sha256, phash, file_name, fingerprints, cid), in rowid order."""
+    for row in conn.execute(f"SELECT {_RECORD_COLUMNS} FROM files ORDER BY rowid"):
+        yield _record(row)
+
+
+def files_in_range(conn, after, before, limit=5000):
+    """Records (as iter_files) with after < sha256 < before, in sha256 order; used to move shard buckets."""
+    return [_record(row) for row in conn.execute(SQL_FILES_IN_RANGE, (after, before, limit))]
+
+
+def delete_files_in_range(conn, after, before):
+    """Delete records with after < sha256 < before; returns the count. The caller owns the transaction."""
+    return conn.execute("DELETE FROM files WHERE sha256 > ? AND sha256 < ?", (after, before)).rowcount
+
+
+def is_pinned(conn, cid, backend):
+    """True if the pin index says `backend` already stores cid."""
+    return conn.execute("SELECT 1 FROM pins WHERE cid = ? AND backend = ?", (cid, backend)).fetchone() is not None
+
+
+def record_pin(conn, cid, backend, size, file_name, pinned_at):
+    """Add cid to the pin index (first pin wins); the caller owns the transaction."""
+    conn.execute(
+        "INSERT OR IGNORE INTO pins (cid, backend, size, file_name, pinned_at) VALUES (?, ?, ?, ?, ?)",
+        (cid, backend, size, file_name, pinned_at),
+    )
+
+
+def chunk_cids(conn, sha256s):
+    """{chunk sha256: cid or None} for the given chunks that are already indexed."""
+    sha256s = list(sha256s)
+    known = {}
+    for start in range(0, len(sha256s), 500):
+        batch = sha256s[start:start + 500]
+        known.update(conn.execute(
+            f"SELECT sha256, cid FROM chunks WHERE sha256 IN ({', '.join('?' * len(batch))})", batch
+        ).fetchall())
+    return known
+
+
+def insert_manifest(conn, sha256, file_name, size, chunks, created):
+    """Record a file as its ordered (chunk_sha256, size, cid) chunks; the caller owns the transaction.
+
+    Chunks already indexed keep their CID, or gain one if they had none.
+    """
+    conn.executemany(
+        "INSERT INTO chunks (sha256, size, cid) VALUES (?, ?, ?) "
+        "ON CONFLICT(sha256) DO UPDATE SET cid = COALESCE(chunks.cid, excluded.cid)",
+        chunks,
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO manifests (sha256, file_name, size, chunk_count, created) VALUES (?, ?, ?, ?, ?)",
+        (sha256, file_name, size, len(chunks), created),
+    )
+    conn.execute("DELETE FROM manifest_chunks WHERE file_sha256 = ?", (sha256,))
+    conn.executemany(
+        "INSERT INTO manifest_chunks (file_sha256, seq, chunk_sha256) VALUES (?, ?, ?)",
+        [(sha256, seq, chunk[0]) for seq, chunk in enumerate(chunks)],
+    )
+
+
+def get_manifest(conn, sha256):
+    """Return {"sha256", "file_name", "size", "chunks": [(sha256, size, cid), ...]} or None."""
+    row = conn.execute("SELECT sha256, file_name, size FROM manifests WHERE sha256 = ?", (sha256,)).fetchone()
+    if row is None:
+        return None
+    chunks = conn.execute(
+        "SELECT c.sha256, c.size, c.cid FROM manifest_chunks m JOIN chunks c ON c.sha256 = m.chunk_sha256 "
+        "WHERE m.file_sha256 = ? ORDER BY m.seq",
+        (sha256,),
+    ).fetchall()
+    return {"sha256": row[0], "file_name": row[1], "size": row[2], "chunks": chunks}
+
+
+def chunk_totals(conn):
+    """(files, logical bytes across manifests, unique chunks, bytes actually stored as chunks)."""
+    files, logical = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM manifests").fetchone()
+    chunks, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM chunks").fetchone()
+    return files, logical, chunks, stored
+
+
+def get_state(conn, key, default=0):
+    row = conn.execute("SELECT value FROM replication_state WHERE key = ?", (key,)).fetchone()
+    return default if row is None else row[0]
+
+
+def set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO replication_state (key, value) VALUES (?, ?)", (key, value))
+
+
+def get_fingerprints(conn, sha256s):
+    """Return {sha256: {algorithm: hex}} for the given records, omitting missing hashes."""
+    sha256s = list(sha256s)
+    result = {}
+    for start in range(0, len(sha256s), 500):
+        batch = sha256s[start:start + 500]
+        for row in conn.execute(SQL_GET_FINGERPRINTS.format(", ".join("?" * len(batch))), batch):
+            result[row[0]] = {
+                name: int_to_phash(value) for name, value in zip(FINGERPRINT_COLUMNS, row[1:]) if value is not None
+            }
+    return result
+
+
+def chain_cursor(conn):
+    """Return (block_number, block_hash, synced_at) of the last synced block, or None."""
+    return conn.execute(SQL_CHAIN_CURSOR).fetchone()
+
+
+def recent_chain_blocks(conn):
+    """Return synced (block_number, block_hash) checkpoints, newest first."""
+    return conn.execute("SELECT block_number, block_hash FROM chain_blocks ORDER BY block_number DESC").fetchall()
+
+
+def chain_file_exists(conn, sha256, phash):
+    """Answer fileExists from the mirror, with the contract's messages."""
+    if conn.execute(SQL_CHAIN_SHA256_EXISTS, (sha256,)).fetchone():
+        return True, "Exact match found (SHA-256)"
+    if phash and conn.execute(SQL_CHAIN_PHASH_EXISTS, (phash,)).fetchone():
+        return True, "Visually similar match found (phash)"
+    return False, "No match found"
+
+
+def get_chain_file(conn, sha256):
+    """Return the mirrored on-chain record for sha256 in get_file_data's shape, or None."""
+    row = conn.execute(SQL_GET_CHAIN_FILE, (sha256,)).fetchone()
+    if row is None:
+        return None
+    return {"sha256": row[0], "phash": row[1], "cid": row[2], "uploader": row[3], "timestamp": str(row[4])}
+
+
+def apply_chain_events(conn, events, block_number, block_hash, synced_at, keep_blocks=128):
+    """Upsert mirrored events and advance the cursor; the caller owns the transaction."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO chain_files (sha256, phash, cid, uploader, timestamp, block_number, block_hash, log_index) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        events,
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO chain_blocks (block_number, block_hash, synced_at) VALUES (?, ?, ?)",
+        (block_number, block_hash, synced_at),
+    )
+    conn.execute(
+        "DELETE FROM chain_blocks WHERE block_number NOT IN "
+        "(SELECT block_number FROM chain_blocks ORDER BY block_number DESC LIMIT ?)",
+        (keep_blocks,),
+    )
+
+
+def rewind_chain(conn, block_number):
+    """Drop mirrored events and checkpoints above block_number (reorg recovery)."""
+    conn.execute("DELETE FROM chain_files WHERE block_number > ?", (block_number,))
+    conn.execute("DELETE FROM chain_blocks WHERE block_number > ?", (block_number,))
+
+
+def queue_anchor_leaves(conn, records, queued_at):
+    """Queue (sha256, phash, cid) records for the next root; returns how many were new."""
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO anchor_leaves (sha256, phash, cid, queued_at) VALUES (?, ?, ?, ?)",
+        [(sha256, phash, cid, queued_at) for sha256, phash, cid in records],
+    )
+    return conn.total_changes - before
+
+
+def pending_anchor_leaves(conn, limit):
+    """Oldest (sha256, phash, cid) records not yet in a root."""
+    return conn.execute(
+        "SELECT sha256, phash, cid FROM anchor_leaves WHERE root IS NULL ORDER BY rowid LIMIT ?", (limit,)
+    ).fetchall()
+
+
+def pending_anchor_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM anchor_leaves WHERE root IS NULL").fetchone()[0]
+
+
+def create_anchor_batch(conn, root, proofs, anchorer, created_at):
+    """Record a built root and each leaf's (sha256, leaf_index, proof JSON); the caller owns the transaction."""
+    conn.execute(
+        "INSERT OR REPLACE INTO anchor_roots (root, leaf_count, anchorer, created_at, status, tx_hash) "
+        "VALUES (?, ?, ?, ?, 'built', NULL)",
+        (root, len(proofs), anchorer, created_at),
+    )
+    conn.executemany(
+        "UPDATE anchor_leaves SET root = ?, leaf_index = ?, proof = ? WHERE sha256 = ?",
+        [(root, index, proof, sha256) for sha256, index, proof in proofs],
+    )
+
+
+def set_anchor_status(conn, root, status, tx_hash=None, nonce=None):
+    conn.execute(
+        "UPDATE anchor_roots SET status = ?, tx_hash = COALESCE(?, tx_hash), nonce = COALESCE(?, nonce) WHERE root = ?",
+        (status, tx_hash, nonce, root),
+    )
+
+
+def release_anchor_batch(conn, root):
+    """Return a root's leaves to the queue (the root never made it on-chain)."""
+    conn.execute("UPDATE anchor_leaves SET root = NULL, leaf_index = NULL, proof = NULL WHERE root = ?", (root,))
+    conn.execute("UPDATE anchor_roots SET status = 'failed' WHERE root = ?", (root,))
+
+
+def anchor_roots(conn, statuses=None):
+    """(root, leaf_count, anchorer, status, tx_hash, nonce, created_at) rows, optionally only those with one of statuses."""
+    sql = "SELECT root, leaf_count, anchorer, status, tx_hash, nonce, created_at FROM anchor_roots"
+    if statuses:
+        sql += f" WHERE status IN ({', '.join('?' * len(statuses))})"
+        return conn.execute(sql + " ORDER BY created_at", tuple(statuses)).fetchall()
+    return conn.execute(sql + " ORDER BY created_at").fetchall()
+
+
+def get_anchored_file(conn, sha256):
+    """Return an anchored record in get_file_data's shape plus its inclusion proof, or None.
+
+    proof is {"root", "anchorer", "leaf_index", "path", "status", "tx_hash"};
+    root and path are None while the record still waits for a batch.
+    """
+    row = conn.execute(
+        "SELECT l.sha256, l.phash, l.cid, r.anchorer, l.queued_at, l.root, l.leaf_index, l.proof, r.status, r.tx_hash "
+        "FROM anchor_leaves l LEFT JOIN anchor_roots r ON r.root = l.root WHERE l.sha256 = ?",
+        (sha256,),
+    ).fetchone()
+    if row is None:
+        return None
+    proof = {
+        "root": row[5],
+        "anchorer": row[3],
+        "leaf_index": row[6],
+        "path": json.loads(row[7]) if row[7] else None,
+        "status": row[8] or "pending",
+        "tx_hash": row[9],
+    }
+    return {"sha256": row[0], "phash": row[1], "cid": row[2], "uploader": row[3] or "", "timestamp": str(int(row[4])),
+            "proof": proof}
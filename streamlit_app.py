@@ -1,37 +1,73 @@
 import time
 import streamlit as st
-from uploader import upload_to_pinata, check_duplicate, init_db
-from interact import store_file_on_chain, check_file_exists, get_file_data
-from PIL import Image
-import io
-from utils.hasher import generate_hashes
+import clients
+import indexer
+import prefilter
+import replication
+import storage
+from uploader import upload_to_pinata, check_duplicate, init_db, save_cid
+from interact import anchor_mode, get_file_data, store_file_on_chain, store_files_on_chain
+import atexit
+from utils.thumbnails import CARD_SIZE, PREVIEW_SIZE, ThumbnailCache, decode_upload, thumbnail
+from utils import metrics
+from utils.lru import LRUCache
 from dotenv import load_dotenv
 import os
-import git
-import logging
 
 # Load .env file
 load_dotenv()
 
-# Initialize SQLite database
-init_db()
-
-# GitHub repository sync
-DB_PATH = "data/dedup_db.sqlite"
 REPO_DIR = "."
+CACHE_SIZE = 256  # uploads remembered per process
+
+@st.cache_resource(show_spinner=False)
+def bootstrap():
+    """Process-wide setup that must not repeat on reruns: schema, clients, replication catch-up, event mirror."""
+    init_db()
+    with storage.connection() as conn:
+        prefilter.get(conn)  # load the snapshot or scan once, before the first upload
+    atexit.register(prefilter.save)
+    clients.blobstore()  # fail fast on missing Pinata keys or a bad BLOB_BACKEND
+    replication.start(REPO_DIR)
+    indexer.start_background_sync(clients.web3(), clients.contract())
+    if anchor_mode():
+        import anchoring
+
+        anchoring.get().start()  # anchor leaves queued before a restart
+    if os.getenv("METRICS_PORT"):
+        metrics.serve(int(os.getenv("METRICS_PORT")))  # Prometheus scrape endpoint at /metrics
+    return True
+
+def fmt_duration(seconds):
+    """Short human form of a latency estimate, or "–" when nothing was measured yet."""
+    if seconds is None:
+        return "–"
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    if seconds < 120:
+        return f"{seconds:.1f} s"
+    return f"{seconds / 60:.0f} min" if seconds < 7200 else f"{seconds / 3600:.1f} h"
 
-# Initialize Git repository
-os.makedirs("data", exist_ok=True)
-try:
-    repo = git.Repo(REPO_DIR)
-    # Pull latest database
-    origin = repo.remotes.origin
-    origin.pull()
-    logging.info("Pulled latest database from GitHub")
-except git.exc.NoSuchPathError:
-    logging.error("Git repository not initialized. Initialize it in deployment.")
-except git.exc.GitCommandError as e:
-    logging.error(f"Git pull failed: {e}")
+def fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+@st.cache_resource(show_spinner=False)
+def result_caches():
+    """Process-wide LRUs: upload file_id -> (sha256, fingerprints) and sha256 -> dedup outcome."""
+    return LRUCache(CACHE_SIZE), LRUCache(CACHE_SIZE)
+
+@st.cache_resource(show_spinner=False)
+def thumbnail_cache():
+    """On-disk preview/card thumbnails keyed by SHA-256, shared by every session."""
+    return ThumbnailCache()
+
+bootstrap()
+hash_cache, outcome_cache = result_caches()
+thumbs = thumbnail_cache()
 
 # Trusted uploaders
 trusted_uploaders = ["0x66c720EaDEEc55048fFCb86A0300123D5fe0b1a7", "0x92643AEafaf65d9cA08347A9e8e09c7A927b1362"]
@@ -281,23 +317,37 @@ st.markdown("""
 # Sidebar
 with st.sidebar:
     st.markdown('<div class="sidebar-card"><h3 class="text-lg font-semibold">📊 Platform Analytics</h3></div>', unsafe_allow_html=True)
-    st.markdown("""
+    with storage.connection() as conn:
+        files_indexed = storage.count_files(conn)
+    counts = metrics.counters()
+    checks = counts.get("duplicates", 0) + counts.get("new_files", 0)
+    st.markdown(f"""
     <div class="metric-card">
-        <h4 class="text-2xl font-bold">12,847</h4>
-        <p class="text-sm">Files Processed</p>
-        <p class="text-xs text-green-300">↗️ 23%</p>
+        <h4 class="text-2xl font-bold">{files_indexed:,}</h4>
+        <p class="text-sm">Files Indexed</p>
+        <p class="text-xs text-green-300">{checks:,} checked since start</p>
     </div>
     <div class="metric-card">
-        <h4 class="text-2xl font-bold">2.3 TB</h4>
-        <p class="text-sm">Storage Saved</p>
-        <p class="text-xs text-green-300">↗️ 15%</p>
+        <h4 class="text-2xl font-bold">{counts.get("duplicates", 0):,}</h4>
+        <p class="text-sm">Duplicates Caught</p>
+        <p class="text-xs text-green-300">{fmt_bytes(counts.get("duplicate_bytes", 0))} not re-stored</p>
     </div>
     <div class="metric-card">
-        <h4 class="text-2xl font-bold">1,249</h4>
-        <p class="text-sm">Active Users</p>
-        <p class="text-xs text-green-300">↗️ 8%</p>
+        <h4 class="text-2xl font-bold">{counts.get("ipfs_upload_errors", 0) + counts.get("rpc_call_errors", 0):,}</h4>
+        <p class="text-sm">IPFS / RPC Errors</p>
+        <p class="text-xs text-green-300">{counts.get("ipfs_retries", 0):,} IPFS retries, {counts.get("mirror_hits", 0):,} mirror hits</p>
     </div>
     """, unsafe_allow_html=True)
+    with st.expander("⏱️ Stage Latency"):
+        stages = metrics.summary()
+        if stages:
+            st.table([
+                {"stage": stage, "count": s["count"], "p50": fmt_duration(s["p50_s"]), "p95": fmt_duration(s["p95_s"])}
+                for stage, s in stages.items()
+            ])
+        else:
+            st.markdown('<p class="text-sm opacity-80">No measurements yet.</p>', unsafe_allow_html=True)
+        st.download_button("Prometheus metrics", metrics.export_prometheus(), file_name="metrics.prom", mime="text/plain")
     st.markdown('<div class="sidebar-card"><h3 class="text-lg font-semibold">🔧 Workflow</h3></div>', unsafe_allow_html=True)
     workflow_steps = [
         "Upload image file",
@@ -335,18 +385,20 @@ with col1:
 
 with col2:
     st.markdown('<h3 class="text-xl font-semibold mb-4">📈 System Metrics</h3>', unsafe_allow_html=True)
-    st.markdown("""
+    stages = metrics.summary()
+    check, upload = stages.get("check_duplicate", {}), stages.get("ipfs_upload", {})
+    st.markdown(f"""
     <div class="metric-card">
-        <h3 class="text-2xl font-bold">99.9%</h3>
+        <h3 class="text-2xl font-bold">{fmt_duration(time.time() - metrics.START_TIME)}</h3>
         <p class="text-sm">Uptime</p>
     </div>
     <div class="metric-card">
-        <h3 class="text-2xl font-bold">< 2s</h3>
-        <p class="text-sm">Processing Time</p>
+        <h3 class="text-2xl font-bold">{fmt_duration(check.get("p50_s"))}</h3>
+        <p class="text-sm">Dedup Check p50 (p95 {fmt_duration(check.get("p95_s"))})</p>
     </div>
     <div class="metric-card">
-        <h3 class="text-2xl font-bold">256-bit</h3>
-        <p class="text-sm">Encryption</p>
+        <h3 class="text-2xl font-bold">{fmt_duration(upload.get("p50_s"))}</h3>
+        <p class="text-sm">IPFS Upload p50 (p95 {fmt_duration(upload.get("p95_s"))})</p>
     </div>
     """, unsafe_allow_html=True)
 
@@ -359,6 +411,7 @@ uploaded_file = st.file_uploader(
     help="Max size: 10MB"
 )
 
+outcome = None
 if uploaded_file is not None and uploaded_file.size > 0:
     if uploaded_file.size > 10 * 1024 * 1024:
         st.error("File size exceeds 10MB limit.")
@@ -366,18 +419,28 @@ if uploaded_file is not None and uploaded_file.size > 0:
     
     file_bytes = uploaded_file.read()
     file_name = uploaded_file.name
+    file_size = len(file_bytes)
+
+    # One decode gives the fingerprints and the cached preview/card thumbnails
+    start_time = time.time()
+    file_key = getattr(uploaded_file, "file_id", None) or f"{file_name}:{file_size}"
+    hashes = hash_cache.get(file_key)
+    if hashes is None:
+        sha256, fingerprints, _ = decode_upload(file_bytes, thumbs)
+        hashes = (sha256, fingerprints)
+        hash_cache.put(file_key, hashes)
+    sha256, fingerprints = hashes
 
     col1, col2 = st.columns([1, 1])
     with col1:
         st.markdown('<h4 class="text-lg font-semibold mb-3">🖼️ Image Preview</h4>', unsafe_allow_html=True)
-        if uploaded_file.type.startswith("image/"):
-            image = Image.open(io.BytesIO(file_bytes))
-            st.image(image, use_column_width=True, caption=f"{file_name}")
+        preview = thumbnail(file_bytes, sha256, PREVIEW_SIZE, thumbs) if uploaded_file.type.startswith("image/") else None
+        if preview:
+            st.image(preview, use_column_width=True, caption=f"{file_name}")
         else:
             st.markdown('<div class="status-warning text-sm">⚠️ Unsupported image type.</div>', unsafe_allow_html=True)
 
         st.markdown('<h4 class="text-lg font-semibold mb-3 mt-4">📋 File Details</h4>', unsafe_allow_html=True)
-        file_size = len(file_bytes)
         st.markdown(f"""
         <div class="product-specs">
             <div class="spec-item">
@@ -397,32 +460,64 @@ if uploaded_file is not None and uploaded_file.size > 0:
 
     with col2:
         st.markdown('<h4 class="text-lg font-semibold mb-3">🔐 Processing</h4>', unsafe_allow_html=True)
-        start_time = time.time()
-        sha256, phash = generate_hashes(file_bytes)
+        phash = fingerprints.get("ahash")
         st.markdown('<p class="text-sm font-medium">SHA-256 Hash:</p>', unsafe_allow_html=True)
         st.markdown(f'<div class="hash-display text-sm"><code>{sha256}</code></div>', unsafe_allow_html=True)
         if phash:
             st.markdown('<p class="text-sm font-medium">Perceptual Hash:</p>', unsafe_allow_html=True)
             st.markdown(f'<div class="hash-display text-sm"><code>{phash}</code></div>', unsafe_allow_html=True)
 
+        # A fresh upload's outcome only replays for the same upload; anyone
+        # else sending these bytes must be told it is now a duplicate.
+        outcome = outcome_cache.get(sha256)
+        if outcome is not None and outcome["file_key"] not in (None, file_key):
+            outcome = None
+
         with st.spinner("🔄 Processing..."):
             progress_bar = st.progress(0)
-            progress_bar.progress(25)
-            st.markdown(f'<p class="text-sm">✅ Hashes generated in {time.time() - start_time:.2f}s</p>', unsafe_allow_html=True)
-            time.sleep(0.5)
-            progress_bar.progress(50)
-            st.markdown('<p class="text-sm">🔍 Checking duplicates...</p>', unsafe_allow_html=True)
-
-            is_duplicate, message, sha256, phash = check_duplicate(file_bytes, file_name)
-            if is_duplicate:
+            if outcome is not None:
+                progress_bar.progress(100)
+                st.markdown('<p class="text-sm">✅ Loaded cached result</p>', unsafe_allow_html=True)
+            else:
+                progress_bar.progress(25)
+                st.markdown(f'<p class="text-sm">✅ Hashes generated in {time.time() - start_time:.2f}s</p>', unsafe_allow_html=True)
+                progress_bar.progress(50)
+                st.markdown('<p class="text-sm">🔍 Checking duplicates...</p>', unsafe_allow_html=True)
+
+                is_duplicate, message, sha256, phash = check_duplicate(file_bytes, file_name, sha256, fingerprints)
+                outcome = {"is_duplicate": is_duplicate, "message": message, "data": None,
+                           "cid": None, "tx_hash": None, "anchored": False, "file_key": None}
+                if is_duplicate:
+                    outcome["data"] = get_file_data(sha256)
+                else:
+                    progress_bar.progress(75)
+                    st.markdown('<p class="text-sm">✅ No duplicates. Uploading to IPFS...</p>', unsafe_allow_html=True)
+                    try:
+                        outcome["cid"] = upload_to_pinata(file_bytes, file_name)
+                        save_cid(sha256, outcome["cid"])
+                    except Exception as e:
+                        st.error(f"❌ IPFS upload failed: {e}")
+                        st.stop()
+
+                    progress_bar.progress(100)
+                    st.markdown('<p class="text-sm">🔗 Recording on blockchain...</p>', unsafe_allow_html=True)
+                    if anchor_mode():
+                        store_files_on_chain([(sha256, phash, outcome["cid"])])  # goes out with the next Merkle root
+                        outcome["anchored"] = True
+                    else:
+                        outcome["tx_hash"] = store_file_on_chain(sha256, phash, outcome["cid"])
+                    outcome["file_key"] = file_key
+                outcome_cache.put(sha256, outcome)
+
+            if outcome["is_duplicate"]:
                 st.markdown(f"""
                 <div class="status-warning">
                     <h4 class="text-base font-semibold">⚠️ Duplicate Detected!</h4>
-                    <p class="text-sm">{message}</p>
+                    <p class="text-sm">{outcome['message']}</p>
                 </div>
                 """, unsafe_allow_html=True)
 
-                data = get_file_data(sha256)
+                data = outcome["data"]
                 if data:
                     st.markdown('<h4 class="text-lg font-semibold mb-3">📊 Record Details</h4>', unsafe_allow_html=True)
                     st.markdown(f"""
@@ -449,34 +544,30 @@ if uploaded_file is not None and uploaded_file.size > 0:
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
-                # Commit and push database to GitHub
-                try:
-                    repo.index.add([DB_PATH])
-                    repo.index.commit(f"Update database for {file_name}")
-                    origin.push()
-                    logging.info("Pushed database to GitHub")
-                except Exception as e:
-                    logging.error(f"Git push failed: {e}")
-                    st.warning("⚠️ Database sync to GitHub failed. Duplicate detection may not persist.")
+                    proof = data.get("proof")
+                    if proof:
+                        st.markdown(f"""
+                        <div class="product-specs">
+                            <div class="spec-item">
+                                <span class="text-sm font-medium">Merkle Root ({proof['status']}):</span>
+                                <span class="text-sm"><code>{proof['root'] or 'next batch'}</code></span>
+                            </div>
+                            <div class="spec-item">
+                                <span class="text-sm font-medium">Inclusion Proof:</span>
+                                <span class="text-sm">{len(proof['path'] or [])} hashes</span>
+                            </div>
+                        </div>
+                        """, unsafe_allow_html=True)
             else:
-                progress_bar.progress(75)
-                st.markdown('<p class="text-sm">✅ No duplicates. Uploading to IPFS...</p>', unsafe_allow_html=True)
-                try:
-                    cid = upload_to_pinata(file_bytes, file_name)
-                    st.markdown(f"""
-                    <div class="status-success">
-                        <h4 class="text-base font-semibold">✅ IPFS Upload Successful!</h4>
-                        <p class="text-sm"><strong>CID:</strong> <code>{cid}</code></p>
-                        <p class="text-sm"><a href="https://gateway.pinata.cloud/ipfs/{cid}" target="_blank" class="text-blue-400 hover:underline">View on IPFS</a></p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                except Exception as e:
-                    st.error(f"❌ IPFS upload failed: {e}")
-                    st.stop()
-
-                progress_bar.progress(100)
-                st.markdown('<p class="text-sm">🔗 Recording on blockchain...</p>', unsafe_allow_html=True)
-                tx_hash = store_file_on_chain(sha256, phash, cid)
+                cid = outcome["cid"]
+                st.markdown(f"""
+                <div class="status-success">
+                    <h4 class="text-base font-semibold">✅ IPFS Upload Successful!</h4>
+                    <p class="text-sm"><strong>CID:</strong> <code>{cid}</code></p>
+                    <p class="text-sm"><a href="{clients.config()['ipfs_gateway_url'].rstrip('/')}/{cid}" target="_blank" class="text-blue-400 hover:underline">View on IPFS</a></p>
+                </div>
+                """, unsafe_allow_html=True)
+                tx_hash = outcome["tx_hash"]
                 if tx_hash:
                     st.markdown(f"""
                     <div class="status-success">
@@ -485,17 +576,15 @@ if uploaded_file is not None and uploaded_file.size > 0:
                         <p class="text-sm">File permanently recorded.</p>
                     </div>
                     """, unsafe_allow_html=True)
+                elif outcome["anchored"]:
+                    st.markdown("""
+                    <div class="status-success">
+                        <h4 class="text-base font-semibold">🌳 Queued for Anchoring</h4>
+                        <p class="text-sm">The record goes on-chain in the next Merkle root; its inclusion proof appears in the record details.</p>
+                    </div>
+                    """, unsafe_allow_html=True)
                 else:
                     st.error("❌ Blockchain transaction failed.")
-                # Commit and push database to GitHub
-                try:
-                    repo.index.add([DB_PATH])
-                    repo.index.commit(f"Update database for {file_name}")
-                    origin.push()
-                    logging.info("Pushed database to GitHub")
-                except Exception as e:
-                    logging.error(f"Git push failed: {e}")
-                    st.warning("⚠️ Database sync to GitHub failed. Duplicate detection may not persist.")
 
 # E-Commerce Preview
 st.markdown('<hr class="border-t border-gray-700 my-6">', unsafe_allow_html=True)
@@ -503,10 +592,10 @@ st.markdown('<h3 class="text-xl font-semibold mb-4">🛒 E-Commerce Preview</h3>
 st.markdown('<p class="text-sm opacity-80 mb-4">Preview your image on e-commerce platforms</p>', unsafe_allow_html=True)
 
 if st.button("🚀 Generate Previews", type="primary", key="generate_previews"):
-    if uploaded_file:
+    if uploaded_file and uploaded_file.size > 0:
         st.markdown('<h4 class="text-lg font-semibold mb-4">📱 Platform Listings</h4>', unsafe_allow_html=True)
-        is_duplicate, message, sha256, phash = check_duplicate(file_bytes, file_name)
-        data = get_file_data(sha256) if is_duplicate else None
+        card_image = thumbnail(file_bytes, sha256, CARD_SIZE, thumbs)  # one small JPEG for all cards
+        data = outcome["data"] if outcome and outcome["is_duplicate"] else None
         uploader_status = 'Trusted' if data and data.get('uploader', '').lower() in trusted_uploaders else 'Untrusted'
 
         platforms = [
@@ -588,7 +677,8 @@ if st.button("🚀 Generate Previews", type="primary", key="generate_previews"):
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
-                st.image(uploaded_file, use_column_width=True)
+                if card_image:
+                    st.image(card_image, use_column_width=True)
                 st.markdown(f'<p class="text-sm font-semibold">{platform['brand']} - Premium Collection</p>', unsafe_allow_html=True)
                 st.markdown(f'<p class="text-sm">Status: {uploader_status}</p>', unsafe_allow_html=True)
                 col_price, col_rating = st.columns([1, 1])
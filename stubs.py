@@ -0,0 +1,343 @@
+"""In-memory stand-ins for Pinata and the DedupStorage contract.
+
+`install()` puts them behind the clients factory, so uploader/interact (and
+the HTTP API via `python api.py --stub`) run locally with no keys, node or
+network. The contract stub follows DedupStorage.sol: exact and phash
+registrations, skip-on-duplicate batch stores, the same messages and codes.
+
+StubPinataServer is a local HTTP stand-in for Pinata's pinFileToIPFS and
+pinList endpoints (plus a /ipfs/<cid> gateway), for running the real
+PinataClient end to end: pooling, multipart streaming, and retries on
+injected 429/5xx responses. `install(pinata_http=True)` uses it, or run it
+on its own and point PINATA_API_URL at it:
+
+    python stubs.py --port 8787 --fail 429,503
+"""
+import argparse
+import email.parser
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import blobstore
+import clients
+from interact import PHASH_PRESENT
+from pinata import PIN_FILE_PATH, PIN_LIST_PATH, PinataClient
+from utils.cid import compute_cid
+
+STUB_UPLOADER = "0x000000000000000000000000000000000000dEaD"
+
+
+class StubPinata:
+    """Pins into a dict under the real CIDv1, as Pinata does with cidVersion 1."""
+
+    def __init__(self, latency_s=0.0):
+        self.latency_s = latency_s
+        self.pins = {}
+        self._lock = threading.Lock()
+
+    def pin_file(self, source, file_name, options=None):
+        if hasattr(source, "read"):
+            source = source.read()
+        elif not isinstance(source, (bytes, bytearray)):
+            with open(source, "rb") as f:
+                source = f.read()
+        time.sleep(self.latency_s)
+        cid = compute_cid(source)
+        with self._lock:
+            self.pins[cid] = (file_name, len(source))
+        return cid
+
+    def pin_files(self, items, options=None):
+        return [self.pin_file(*item, options=options) for item in items]
+
+    def is_pinned(self, cid):
+        with self._lock:
+            return cid in self.pins
+
+    def close(self):
+        pass
+
+
+class StubPinataServer:
+    """Pinata's pin endpoints over local HTTP, pinning into a dict under the real CIDv1.
+
+    fail() queues status codes that the next requests get instead of an
+    answer; a 429 carries Retry-After: retry_after_s. `requests` counts
+    every request served, failed ones included.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, retry_after_s=0):
+        self.retry_after_s = retry_after_s
+        self.pins = {}  # cid -> (file name, size, content)
+        self.requests = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-pinata", daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail(self, *statuses):
+        with self._lock:
+            self._failures.extend(statuses)
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _next_failure(self):
+        with self._lock:
+            self.requests += 1
+            return self._failures.pop(0) if self._failures else None
+
+    def _pin(self, content_type, body):
+        message = email.parser.BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+        for part in message.get_payload():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True)
+                cid = compute_cid(content)
+                with self._lock:
+                    self.pins[cid] = (part.get_filename(), len(content), content)
+                return {"IpfsHash": cid, "PinSize": len(content), "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")}
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload=None, headers=None, raw=None):
+                body = raw if raw is not None else json.dumps(payload or {}).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _failed(self):
+                status = server._next_failure()
+                if status is None:
+                    return False
+                headers = {"Retry-After": str(server.retry_after_s)} if status == 429 else None
+                self._reply(status, {"error": f"injected {status}"}, headers)
+                return True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self._failed():
+                    return
+                if urlparse(self.path).path != PIN_FILE_PATH:
+                    return self._reply(404, {"error": "Not found"})
+                if not self.headers.get("pinata_api_key"):
+                    return self._reply(401, {"error": "Missing API key"})
+                result = server._pin(self.headers.get("Content-Type", ""), body)
+                if result is None:
+                    return self._reply(400, {"error": "No file part"})
+                self._reply(200, result)
+
+            def do_GET(self):
+                if self._failed():
+                    return
+                url = urlparse(self.path)
+                if url.path == PIN_LIST_PATH:
+                    cid = parse_qs(url.query).get("hashContains", [""])[0]
+                    with server._lock:
+                        rows = [{"ipfs_pin_hash": key, "size": pin[1]} for key, pin in server.pins.items() if cid in key]
+                    return self._reply(200, {"count": len(rows), "rows": rows})
+                if url.path.startswith("/ipfs/"):
+                    with server._lock:
+                        pin = server.pins.get(url.path[len("/ipfs/"):])
+                    if pin is None:
+                        return self._reply(404, {"error": "Not pinned"})
+                    return self._reply(200, raw=pin[2])
+                self._reply(404, {"error": "Not found"})
+
+        return Handler
+
+
+class _Call:
+    def __init__(self, fn, *args):
+        self._fn = fn
+        self._args = args
+
+    def call(self):
+        return self._fn(*self._args)
+
+
+class StubContract:
+    """The view and store functions of DedupStorage over in-memory maps, with its bytes32/uint72 arguments."""
+
+    def __init__(self):
+        self.files = {}
+        self.phashes = set()
+        self.roots = {}
+        self._lock = threading.Lock()
+
+    @property
+    def functions(self):
+        return self
+
+    def _phash_taken(self, phash):
+        return bool(phash & PHASH_PRESENT) and phash in self.phashes
+
+    def _exists(self, sha256, phash):
+        if sha256 in self.files:
+            return True, "Exact match found (SHA-256)"
+        if self._phash_taken(phash):
+            return True, "Visually similar match found (phash)"
+        return False, "No match found"
+
+    def fileExists(self, sha256, phash):
+        return _Call(self._exists, sha256, phash)
+
+    def fileExistsBatch(self, sha256s, phashes):
+        codes = lambda: [1 if s in self.files else 2 if self._phash_taken(p) else 0 for s, p in zip(sha256s, phashes)]
+        return _Call(codes)
+
+    def _get(self, sha256):
+        if sha256 not in self.files:
+            raise ValueError("File not found")
+        return self.files[sha256]
+
+    def getFile(self, sha256):
+        return _Call(self._get, sha256)
+
+    def _anchor_root(self, root, leaf_count):
+        with self._lock:
+            if leaf_count == 0 or (STUB_UPLOADER, root) in self.roots:
+                raise ValueError("Root already anchored" if leaf_count else "Empty batch")
+            self.roots[STUB_UPLOADER, root] = (int(time.time()), leaf_count)
+
+    def anchorRoot(self, root, leaf_count):
+        return _Call(self._anchor_root, root, leaf_count)
+
+    def anchors(self, anchorer, root):
+        return _Call(lambda: self.roots.get((anchorer, root), (0, 0)))
+
+    def _verify(self, anchorer, root, sha256, phash, cid, proof):
+        import anchoring
+
+        if (anchorer, root) not in self.roots:
+            return False
+        node = anchoring.file_leaf(sha256, phash, cid)
+        for sibling in proof:
+            node = anchoring.node_hash(node, sibling)
+        return node == root
+
+    def verifyFile(self, anchorer, root, sha256, phash, cid, proof):
+        return _Call(self._verify, anchorer, root, sha256, phash, cid, proof)
+
+    def _store_file(self, sha256, phash, cid):
+        if sha256 in self.files:
+            raise ValueError("Duplicate file: SHA-256 hash already exists")
+        if self._phash_taken(phash):
+            raise ValueError("Duplicate file: visually similar image exists")
+        self.store([(sha256, phash, cid)])
+
+    def storeFile(self, sha256, phash, cid):
+        return _Call(self._store_file, sha256, phash, cid)
+
+    def store(self, records):
+        """storeFiles: register (bytes32 sha256, uint72 phash, cid) records, skipping duplicates; returns the count."""
+        stored = 0
+        with self._lock:
+            for sha256, phash, cid in records:
+                if sha256 in self.files or self._phash_taken(phash):
+                    continue
+                self.files[sha256] = (sha256, phash, cid, STUB_UPLOADER, int(time.time()))
+                if phash & PHASH_PRESENT:
+                    self.phashes.add(phash)
+                stored += 1
+        return stored
+
+
+class StubSubmitter:
+    """BatchSubmitter look-alike that 'mines' each batch immediately."""
+
+    address = STUB_UPLOADER
+
+    def __init__(self, contract):
+        self.contract = contract
+        self._nonce = 0
+        self._lock = threading.Lock()
+
+    def _mined(self, records, status):
+        with self._lock:
+            nonce, self._nonce = self._nonce, self._nonce + 1
+        tx_hash = hashlib.sha256(f"stub-tx-{nonce}".encode()).digest()
+        pending = SimpleNamespace(nonce=nonce, records=list(records), tx_hashes=[tx_hash], future=Future())
+        pending.future.set_result(SimpleNamespace(status=status, transactionHash=tx_hash, gasUsed=0))
+        return pending
+
+    def submit(self, records):
+        self.contract.store(records)
+        return [self._mined(records, 1)]
+
+    def submit_call(self, call):
+        """Run a stub contract call as a mined transaction; one that raises comes back reverted."""
+        try:
+            call.call()
+        except ValueError:
+            return self._mined([], 0)
+        return self._mined([], 1)
+
+    def nonce_mined(self, nonce, address=None):
+        with self._lock:
+            return nonce < self._nonce
+
+    def wait(self, timeout=None):
+        return {}
+
+
+def install(pinata_latency_s=0.0, pinata_http=False):
+    """Route the clients factory to fresh stubs; returns (pinata, contract).
+
+    With pinata_http, pinata is a StubPinataServer behind a real PinataClient.
+    """
+    if pinata_http:
+        pinata = StubPinataServer()
+        client = PinataClient("stub-key", "stub-secret", base_url=pinata.url, backoff_s=0.01)
+        gateway = pinata.url + "/ipfs"
+    else:
+        pinata = client = StubPinata(pinata_latency_s)
+        gateway = "https://gateway.pinata.cloud/ipfs"
+    contract = StubContract()
+    clients.override("pinata", client)
+    clients.override("blobstore", blobstore.PinataBlobStore(client, gateway))
+    clients.override("contract", contract)
+    clients.override("submitter", StubSubmitter(contract))
+    return pinata, contract
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Pinata stand-in; point PINATA_API_URL at it.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--fail", default="", help="Comma-separated statuses for the first requests, e.g. 429,503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    args = parser.parse_args(argv)
+
+    server = StubPinataServer(args.host, args.port, args.retry_after)
+    server.fail(*(int(status) for status in args.fail.split(",") if status))
+    print(f"Stub Pinata on {server.url} (gateway {server.url}/ipfs)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
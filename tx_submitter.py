@@ -0,0 +1,197 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from web3.exceptions import TransactionNotFound
+
+from utils import metrics
+
+BATCH_SIZE = 100          # files per storeFiles transaction
+GAS_MARGIN = 1.2          # headroom over estimate_gas
+STUCK_AFTER_S = 180       # resend with a higher fee after this long unmined
+FEE_BUMP = 1.125          # nodes require >= 10% higher price to replace
+MAX_REPLACEMENTS = 3
+POLL_INTERVAL_S = 2
+
+
+class StuckTransactionError(Exception):
+    """Raised through a PendingTx's future when its last fee bump also went unmined."""
+
+
+class NonceManager:
+    """Hands out consecutive nonces locally instead of asking the node per transaction."""
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._next = None
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self):
+        """Forget the local counter; the next call re-reads the pending count."""
+        with self._lock:
+            self._next = None
+
+
+class PendingTx:
+    """One in-flight transaction (storeFiles, or a submit_call) and every hash sent for its nonce."""
+
+    def __init__(self, nonce, tx, tx_hash, records):
+        self.nonce = nonce
+        self.tx = tx
+        self.tx_hashes = [tx_hash]
+        self.records = records
+        self.sent_at = time.monotonic()
+        self.replacements = 0
+        self.future = Future()
+
+
+class BatchSubmitter:
+    """Registers files with storeFiles, back to back, tracking receipts in the background.
+
+    Each batch gets its own gas estimate and a locally managed nonce, so
+    transactions go out without waiting on each other. A daemon thread polls
+    receipts and, if a transaction sits unmined for STUCK_AFTER_S, re-signs
+    the same nonce with a bumped gas price. Once MAX_REPLACEMENTS bumps have
+    each sat that long too, the future fails with StuckTransactionError and
+    the nonce counter is re-read from the node.
+    """
+
+    def __init__(self, w3, contract, address, private_key, batch_size=BATCH_SIZE,
+                 stuck_after_s=STUCK_AFTER_S, poll_interval_s=POLL_INTERVAL_S):
+        self.w3 = w3
+        self.contract = contract
+        self.address = address
+        self.private_key = private_key
+        self.batch_size = batch_size
+        self.stuck_after_s = stuck_after_s
+        self.poll_interval_s = poll_interval_s
+        self.nonces = NonceManager(w3, address)
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._tracker = None
+
+    def _build(self, call, nonce):
+        gas = int(call.estimate_gas({"from": self.address}) * GAS_MARGIN)
+        return call.build_transaction({
+            "from": self.address,
+            "nonce": nonce,
+            "gas": gas,
+            "gasPrice": self.w3.eth.gas_price,
+        })
+
+    def _send(self, tx):
+        signed = self.w3.eth.account.sign_transaction(tx, self.private_key)
+        return self.w3.eth.send_raw_transaction(signed.raw_transaction)
+
+    def submit(self, records):
+        """Send (bytes32 sha256, uint72 phash, cid) records (interact.encode_record) in batches without waiting.
+
+        Returns one PendingTx per batch; `.future` resolves to the receipt.
+        """
+        submitted = []
+        for start in range(0, len(records), self.batch_size):
+            batch = list(records[start:start + self.batch_size])
+            sha256s, phashes, cids = (list(column) for column in zip(*batch))
+            submitted.append(self._submit(self.contract.functions.storeFiles(sha256s, phashes, cids), batch))
+        return submitted
+
+    def submit_call(self, call):
+        """Send any other contract call (e.g. anchorRoot) with the same nonces, fee bumps and receipt tracking."""
+        return self._submit(call, [])
+
+    def _submit(self, call, records):
+        # Sends are serialised so a failed send can give its nonce back
+        with self._send_lock:
+            nonce = self.nonces.next()
+            try:
+                tx = self._build(call, nonce)
+                tx_hash = self._send(tx)
+            except Exception:
+                self.nonces.resync()
+                raise
+        pending = PendingTx(nonce, tx, tx_hash, records)
+        with self._pending_lock:
+            self._pending[nonce] = pending
+            self._ensure_tracker()
+        return pending
+
+    def nonce_mined(self, nonce, address=None):
+        """True once some transaction with this nonce (the original, a fee bump or another) is in a block."""
+        return self.w3.eth.get_transaction_count(address or self.address, "latest") > nonce
+
+    def _ensure_tracker(self):
+        # Called with _pending_lock held; the tracker clears itself under the same lock
+        if self._tracker is None:
+            self._tracker = threading.Thread(target=self._track, name="receipt-tracker", daemon=True)
+            self._tracker.start()
+
+    def _receipt(self, pending):
+        for tx_hash in pending.tx_hashes:
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def _replace(self, pending):
+        tx = dict(pending.tx)
+        tx["gasPrice"] = max(int(tx["gasPrice"] * FEE_BUMP) + 1, self.w3.eth.gas_price)
+        pending.tx_hashes.append(self._send(tx))
+        pending.tx = tx
+        pending.sent_at = time.monotonic()
+        pending.replacements += 1
+        metrics.count("tx_replacements")
+
+    def _give_up(self, pending):
+        metrics.count("tx_stuck")
+        # The node's pending count, not our counter, says whether the nonce is still taken
+        with self._send_lock:
+            self.nonces.resync()
+        pending.future.set_exception(StuckTransactionError(
+            f"Transaction with nonce {pending.nonce} unmined after {MAX_REPLACEMENTS} fee bumps: "
+            + ", ".join("0x" + bytes(tx_hash).hex() for tx_hash in pending.tx_hashes)
+        ))
+
+    def _track(self):
+        while True:
+            with self._pending_lock:
+                in_flight = list(self._pending.values())
+                if not in_flight:
+                    self._tracker = None
+                    return
+            for pending in in_flight:
+                try:
+                    receipt = self._receipt(pending)
+                    if receipt is None:
+                        if time.monotonic() - pending.sent_at <= self.stuck_after_s:
+                            continue
+                        if pending.replacements < MAX_REPLACEMENTS:
+                            self._replace(pending)
+                            continue
+                        self._give_up(pending)
+                    else:
+                        pending.future.set_result(receipt)
+                except Exception as e:
+                    # A replacement can fail if the original was mined meanwhile;
+                    # the next poll picks the receipt up.
+                    print(f"Error tracking tx nonce {pending.nonce}: {e}")
+                    continue
+                with self._pending_lock:
+                    self._pending.pop(pending.nonce, None)
+            time.sleep(self.poll_interval_s)
+
+    def wait(self, timeout=None):
+        """Block until every submitted transaction has a receipt; returns them by nonce."""
+        with self._pending_lock:
+            in_flight = list(self._pending.values())
+        return {p.nonce: p.future.result(timeout) for p in in_flight}
@@ -1,74 +1,167 @@
-import requests
-import sqlite3
-from utils.hasher import generate_hashes
-from interact import check_file_exists
-from dotenv import load_dotenv
-import os
-
-# Load .env file
-load_dotenv()
-
-# Load secrets from .env
-PINATA_API_KEY = os.getenv("PINATA_API_KEY")
-PINATA_SECRET_API_KEY = os.getenv("PINATA_SECRET_API_KEY")
-DEDUP_DB_PATH = "data/dedup_db.sqlite"
-
-# Validate secrets
-if not all([PINATA_API_KEY, PINATA_SECRET_API_KEY]):
-    raise ValueError("Missing Pinata API keys in .env")
-
-def init_db():
-    """Initialize SQLite database for deduplication."""
-    conn = sqlite3.connect(DEDUP_DB_PATH)
-    c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS files (sha256 TEXT PRIMARY KEY, phash TEXT, file_name TEXT)")
-    conn.commit()
-    conn.close()
-
-def check_duplicate(file_bytes, file_name):
-    """Check for duplicates using SHA-256 and phash."""
-    sha256, phash = generate_hashes(file_bytes)
-    conn = sqlite3.connect(DEDUP_DB_PATH)
-    c = conn.cursor()
-
-    # Check for SHA-256 match
-    c.execute("SELECT * FROM files WHERE sha256 = ?", (sha256,))
-    if c.fetchone():
-        conn.close()
-        return True, "Exact duplicate found (SHA-256)", sha256, phash
+import threading
+import blobstore
+import prefilter
+import replication
+import storage
+import writer
+from storage import init_db
+from utils import metrics
+from utils.fingerprint import CASCADE, cascade_match, generate_fingerprints
+from utils.hamming import phash_to_int
+from utils.phash_index import PhashIndex
+from interact import check_file_exists, check_files_exist, mirror_is_fresh
+
+PHASH_MAX_DISTANCE = 9  # Adjust threshold (5-15 bits); aHash-only records
+
+# Near-duplicate index, built from the files table and caught up by rowid
+_phash_index = PhashIndex()
+_phash_index_rowid = 0
+_phash_index_lock = threading.Lock()
+
+def refresh_phash_index(conn):
+    """Add rows inserted since the last refresh to the phash index."""
+    global _phash_index_rowid
+    with _phash_index_lock:
+        for rowid, sha256, phash_int in storage.phash_rows_after(conn, _phash_index_rowid):
+            _phash_index_rowid = rowid
+            if phash_int is not None:
+                _phash_index.add(sha256, phash_int)
+    return _phash_index
+
+def find_similar(conn, fingerprints, cascade=CASCADE, index=None):
+    """Return all (sha256, aHash distance) pairs that pass the fingerprint cascade.
+
+    The aHash index prunes candidates at the first stage's radius; stored
+    stronger hashes then confirm them. Records with only an aHash must be
+    within PHASH_MAX_DISTANCE. `index` defaults to this process's index of
+    the main DB (sharding.py passes each shard's own).
+    """
+    ahash = fingerprints.get("ahash")
+    if not ahash:
+        return []
+    if index is None:
+        index = refresh_phash_index(conn)
+    candidates = index.query(phash_to_int(ahash), cascade[0][1])
+    if not candidates:
+        return []
+    stored = storage.get_fingerprints(conn, [sha256 for sha256, _ in candidates])
+    return [
+        (sha256, distance) for sha256, distance in candidates
+        if cascade_match(fingerprints, stored.get(sha256, {}), cascade, PHASH_MAX_DISTANCE)
+    ]
+
+def find_local_duplicate(conn, sha256, fingerprints):
+    """Return (True, message) if the local DB holds an exact or near match, else None."""
+    with metrics.timed("db_lookup"):
+        # Check for SHA-256 match; a prefilter miss means the row can't exist
+        if not prefilter.get(conn).might_have_sha256(sha256):
+            metrics.count("prefilter_skips")
+        elif storage.sha256_exists(conn, sha256):
+            return True, "Exact duplicate found (SHA-256)"
+        # Check for phash match
+        matches = find_similar(conn, fingerprints)
+    if matches:
+        _, hamming_distance = matches[0]
+        return True, f"Visually similar image found (phash, hamming distance: {hamming_distance}, {len(matches)} match(es))"
+    return None
+
+def chain_might_have(conn, sha256, phash):
+    """False only if the chain definitely has neither hash.
+
+    The prefilter covers the event mirror, so it can only rule the chain
+    out while the mirror is fresh; otherwise the chain has to be asked.
+    """
+    pre = prefilter.get(conn)
+    if pre.might_have_sha256(sha256) or pre.might_have_chain_phash(phash) or not mirror_is_fresh(conn):
+        return True
+    metrics.count("prefilter_chain_skips")
+    return False
+
+def check_duplicate(file_bytes, file_name, sha256=None, fingerprints=None, store=True):
+    """Check for duplicates using SHA-256 and phash. file_bytes may also be a path or file-like object.
 
-    # Check for phash match
-    if phash:
-        c.execute("SELECT phash FROM files")
-        for row in c.fetchall():
-            stored_phash = row[0]
-            if stored_phash:
-                hamming_distance = sum(c1 != c2 for c1, c2 in zip(phash, stored_phash))
-                if hamming_distance < 10:  # Adjust threshold (5-15)
-                    conn.close()
-                    return True, f"Visually similar image found (phash, hamming distance: {hamming_distance})", sha256, phash
-
-    # Check smart contract
-    exists, message = check_file_exists(sha256, phash)
-    if exists:
-        conn.close()
-        return True, message, sha256, phash
-
-    # Store in local DB
-    c.execute("INSERT INTO files (sha256, phash, file_name) VALUES (?, ?, ?)", (sha256, phash, file_name))
-    conn.commit()
-    conn.close()
+    Pass sha256 and fingerprints if they are already known to skip hashing.
+    New files are recorded in the local DB unless store is False.
+    """
+    with metrics.timed("check_duplicate"):
+        result = _check_duplicate(file_bytes, file_name, sha256, fingerprints, store)
+    is_duplicate = result[0]
+    metrics.count("duplicates" if is_duplicate else "new_files")
+    if is_duplicate and isinstance(file_bytes, (bytes, bytearray)):
+        metrics.count("duplicate_bytes", len(file_bytes))
+    return result
+
+def _check_duplicate(file_bytes, file_name, sha256, fingerprints, store):
+    if sha256 is None or fingerprints is None:
+        sha256, fingerprints = generate_fingerprints(file_bytes)
+    phash = fingerprints.get("ahash")
+    with storage.connection() as conn:
+        local = find_local_duplicate(conn, sha256, fingerprints)
+        if local:
+            return local[0], local[1], sha256, phash
+        ask_chain = chain_might_have(conn, sha256, phash)
+
+    # The RPC and the writer wait hold no pooled connection, so slow ones don't starve other checks
+    # Check smart contract, unless the prefilter rules out both hashes on a fresh mirror
+    if ask_chain:
+        exists, message = check_file_exists(sha256, phash)
+        if exists:
+            return True, message, sha256, phash
+    if not store:
+        return False, "No duplicates found", sha256, phash
+
+    # Store in local DB through the group-commit writer; the upsert says if we were first
+    with metrics.timed("db_write"):
+        is_new = writer.get().insert(sha256, phash, file_name, fingerprints)
+    if not is_new:
+        # A concurrent request stored the same file first
+        return True, "Exact duplicate found (SHA-256)", sha256, phash
+    replication.record_file(sha256, phash, file_name, fingerprints)
+    with storage.connection() as conn:
+        prefilter.get(conn).add_sha256(sha256)
+        refresh_phash_index(conn)
     return False, "No duplicates found", sha256, phash
 
-def upload_to_pinata(file_bytes, file_name):
-    """Upload file to IPFS via Pinata."""
-    files = {'file': (file_name, file_bytes)}
-    headers = {
-        'pinata_api_key': PINATA_API_KEY,
-        'pinata_secret_api_key': PINATA_SECRET_API_KEY
-    }
-    res = requests.post("https://api.pinata.cloud/pinning/pinFileToIPFS", files=files, headers=headers)
-    if res.status_code == 200:
-        return res.json()['IpfsHash']
-    else:
-        raise Exception(f"Upload failed: {res.text}")
\ No newline at end of file
+def check_duplicates(items):
+    """Check many (sha256, fingerprints) pairs without storing anything.
+
+    Returns (is_duplicate, message) per item in input order. The local DB
+    answers first; everything it doesn't match goes to the chain in one
+    batched check_files_exist call.
+    """
+    results = [None] * len(items)
+    with storage.connection() as conn:
+        for i, (sha256, fingerprints) in enumerate(items):
+            results[i] = find_local_duplicate(conn, sha256, fingerprints)
+        rest = []
+        for i, result in enumerate(results):
+            if result is not None:
+                continue
+            if chain_might_have(conn, items[i][0], items[i][1].get("ahash")):
+                rest.append(i)
+            else:
+                results[i] = (False, "No match found")
+    if rest:
+        answers = check_files_exist([(items[i][0], items[i][1].get("ahash")) for i in rest])
+        for i, answer in zip(rest, answers):
+            results[i] = tuple(answer)
+    return results
+
+def save_cid(sha256, cid):
+    """Record the IPFS CID for a stored file locally and in the replication log."""
+    with storage.connection() as conn, conn:
+        storage.set_cid(conn, sha256, cid)
+    replication.record_cid(sha256, cid)
+
+def upload_to_pinata(file_bytes, file_name, cid=None):
+    """Store file (bytes, path or file-like object) in the blob backend (Pinata by default); returns the CID.
+
+    Content whose locally computed CID is already pinned is not uploaded again.
+    Pass cid from generate_fingerprints_and_cid to skip computing it here.
+    """
+    with metrics.timed("ipfs_upload"):
+        return blobstore.pin(file_bytes, file_name, cid=cid)
+
+def upload_many_to_pinata(items, conn=None):
+    """Upload (file, file_name) pairs concurrently; returns CIDs or exceptions in input order."""
+    return blobstore.pin_many(items, conn=conn)
@@ -0,0 +1,101 @@
+# utils/chunking.py
+"""FastCDC content-defined chunking with a vectorised gear hash.
+
+Boundaries depend only on the bytes around them, so an insert or edit
+changes the chunks it touches and leaves the rest of the file's chunks
+(and their SHA-256s) as they were. The rolling hash is the 32-bit gear
+hash h = (h << 1) + GEAR[byte]. Every byte's term is shifted out after
+32 steps, so h at each position is a sum over the last 32 bytes, and
+NumPy computes it for a whole segment in five shift-and-add passes.
+Normalised chunking uses a stricter mask before the average size and a
+looser one after it, which keeps chunk sizes close to the average.
+"""
+import hashlib
+import math
+
+from utils.hasher import iter_chunks
+
+MIN_SIZE = 64 * 1024
+AVG_SIZE = 256 * 1024
+MAX_SIZE = 1024 * 1024
+SEGMENT_SIZE = 16 * 1024 * 1024  # bytes read and cut at a time
+HASH_BLOCK = 512 * 1024  # bytes per vectorised hash pass, sized to stay in cache
+NORMALIZATION = 2  # mask bits added before / removed after the average size
+
+_gear = None
+
+
+def _gear_table():
+    """256 fixed pseudo-random 32-bit values; changing them moves every boundary."""
+    global _gear
+    if _gear is None:
+        import numpy as np
+
+        _gear = np.array(
+            [int.from_bytes(hashlib.sha256(b"deduvault-gear-%d" % i).digest()[:4], "little") for i in range(256)],
+            dtype=np.uint32,
+        )
+    return _gear
+
+
+def _mask(bits):
+    # High bits see the most bytes of the 32-byte window
+    return ((1 << bits) - 1) << (32 - bits)
+
+
+def gear_hashes(data, block=HASH_BLOCK):
+    """The rolling gear hash after every byte of data, as a uint32 array."""
+    import numpy as np
+
+    table = _gear_table()
+    values = np.frombuffer(data, dtype=np.uint8)
+    out = np.empty(len(values), dtype=np.uint32)
+    for start in range(0, len(values), block):
+        lead = min(start, 31)  # the previous 31 bytes complete the window at `start`
+        h = table[values[start - lead:start + block]]
+        span = 1
+        while span < 32:
+            # h now sums `span` terms; add the same sum from `span` bytes earlier, shifted past it
+            h[span:] += h[:-span] << np.uint32(span)
+            span *= 2
+        out[start:start + block] = h[lead:]
+    return out
+
+
+def iter_cdc_chunks(source, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE, segment_size=SEGMENT_SIZE):
+    """Yield the content-defined chunks (bytes) of anything iter_chunks accepts."""
+    import numpy as np
+
+    if not 64 <= min_size <= avg_size <= max_size:
+        raise ValueError("Chunk sizes must satisfy 64 <= min_size <= avg_size <= max_size")
+    bits = round(math.log2(avg_size))
+    mask_s = np.uint32(_mask(bits + NORMALIZATION))
+    mask_l = np.uint32(_mask(bits - NORMALIZATION))
+
+    def cut(buf, final):
+        """Yield chunks from buf; return the unchunked tail (shorter than max_size unless final)."""
+        hashes = gear_hashes(buf)
+        loose = np.flatnonzero((hashes & mask_l) == 0)
+        strict = loose[(hashes[loose] & mask_s) == 0]  # mask_s's bits include mask_l's
+        start, n = 0, len(buf)
+        while start < n and (final or n - start >= max_size):
+            if n - start <= min_size:
+                end = n
+            else:
+                # A chunk may end after byte i for start + min_size - 1 <= i
+                i = np.searchsorted(strict, start + min_size - 1)
+                if i < len(strict) and strict[i] < start + avg_size - 1:
+                    end = int(strict[i]) + 1
+                else:
+                    last = min(start + max_size, n) - 1
+                    i = np.searchsorted(loose, max(start + avg_size - 1, start + min_size - 1))
+                    end = int(loose[i]) + 1 if i < len(loose) and loose[i] <= last else last + 1
+            yield bytes(buf[start:end])
+            start = end
+        return buf[start:]
+
+    tail = b""
+    for segment in iter_chunks(source, segment_size):
+        tail = yield from cut(tail + bytes(segment), final=False)
+    if tail:
+        yield from cut(tail, final=True)
@@ -0,0 +1,98 @@
+# utils/cid.py
+"""Local IPFS CIDv1 computation, matching `ipfs add --cid-version=1` and Pinata's cidVersion 1.
+
+The file is split into 256 KiB raw leaves (codec raw). When there is
+more than one leaf, they are linked by a balanced DAG of dag-pb/UnixFS
+File nodes with up to 174 links each. Every CID is sha2-256, written as
+base32 with the "b" multibase prefix. Only leaf digests and sizes are
+kept, so memory stays flat for any file size.
+"""
+import base64
+import hashlib
+
+from utils.hasher import iter_chunks
+
+CHUNK_SIZE = 256 * 1024  # go-ipfs / Pinata default size-262144 chunker
+MAX_LINKS = 174  # go-unixfs balanced layout default
+RAW = 0x55
+DAG_PB = 0x70
+SHA2_256 = 0x12
+UNIXFS_FILE = 2
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, payload):
+    """Length-delimited protobuf field."""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _cid_bytes(codec, digest):
+    return _varint(1) + _varint(codec) + bytes([SHA2_256, len(digest)]) + digest
+
+
+def cid_to_str(cid):
+    return "b" + base64.b32encode(cid).decode().lower().rstrip("=")
+
+
+class CIDBuilder:
+    """Feed bytes with update() in any chunking; cid() returns the CIDv1 string."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._leaves = []  # (cid bytes, tsize, file size)
+        self.size = 0
+
+    def update(self, data):
+        self.size += len(data)
+        self._buffer += data
+        if len(self._buffer) >= CHUNK_SIZE:
+            view = memoryview(self._buffer)
+            full = len(self._buffer) - len(self._buffer) % CHUNK_SIZE
+            for start in range(0, full, CHUNK_SIZE):
+                self._add_leaf(view[start:start + CHUNK_SIZE])
+            view.release()
+            del self._buffer[:full]
+
+    def _add_leaf(self, data):
+        self._leaves.append((_cid_bytes(RAW, hashlib.sha256(data).digest()), len(data), len(data)))
+
+    def cid(self):
+        leaves = list(self._leaves)
+        if self._buffer or not leaves:
+            leaves.append((_cid_bytes(RAW, hashlib.sha256(self._buffer).digest()), len(self._buffer), len(self._buffer)))
+        level = leaves
+        while len(level) > 1:
+            level = [_file_node(level[i:i + MAX_LINKS]) for i in range(0, len(level), MAX_LINKS)]
+        return cid_to_str(level[0][0])
+
+
+def _file_node(children):
+    """dag-pb node linking children [(cid, tsize, file size)]; returns the same triple for itself."""
+    filesize = sum(child[2] for child in children)
+    unixfs = _varint(1 << 3) + _varint(UNIXFS_FILE) + _varint(3 << 3) + _varint(filesize)
+    unixfs += b"".join(_varint(4 << 3) + _varint(child[2]) for child in children)
+    # dag-pb puts Links (field 2) before Data (field 1); each link has an empty Name
+    links = b"".join(
+        _field(2, _field(1, cid) + _field(2, b"") + _varint(3 << 3) + _varint(tsize)) for cid, tsize, _ in children
+    )
+    block = links + _field(1, unixfs)
+    return _cid_bytes(DAG_PB, hashlib.sha256(block).digest()), len(block) + sum(child[1] for child in children), filesize
+
+
+def compute_cid(source):
+    """CIDv1 of bytes, a path, a file-like object or an iterable of chunks (see iter_chunks)."""
+    builder = CIDBuilder()
+    for chunk in iter_chunks(source):
+        builder.update(chunk)
+    return builder.cid()
@@ -0,0 +1,94 @@
+# utils/fingerprint.py
+import io
+
+import imagehash
+
+from utils import metrics
+from utils.cid import CIDBuilder
+from utils.hasher import generate_sha256, generate_sha256_stream, open_reduced
+
+# Every algorithm the engine knows, keyed by the name used in records
+ALGORITHMS = {
+    "ahash": lambda gray, rgb: imagehash.average_hash(gray),
+    "phash": lambda gray, rgb: imagehash.phash(gray),
+    "dhash": lambda gray, rgb: imagehash.dhash(gray),
+    "whash": lambda gray, rgb: imagehash.whash(gray, image_scale=64),
+    "colorhash": lambda gray, rgb: imagehash.colorhash(rgb),
+}
+DEFAULT_ALGORITHMS = tuple(ALGORITHMS)
+
+# Matching cascade: (algorithm, max bit distance). The first stage prunes
+# candidates through the aHash index; later stages confirm them and are
+# skipped for records that don't carry that hash (e.g. legacy rows).
+CASCADE = (
+    ("ahash", 12),
+    ("dhash", 10),
+    ("phash", 10),
+)
+
+
+def compute_fingerprints(file_bytes, algorithms=DEFAULT_ALGORITHMS):
+    """Decode an image once and return {algorithm: hex hash} for each algorithm.
+
+    The image is decoded at reduced scale in RGB (needed by colorhash) and
+    converted to grayscale once; every other hash resizes from that shared
+    small buffer instead of decoding the file again.
+    """
+    try:
+        source = io.BytesIO(file_bytes) if isinstance(file_bytes, (bytes, bytearray)) else file_bytes
+        return fingerprints_from_image(open_reduced(source, mode="RGB"), algorithms)
+    except Exception as e:
+        print(f"Error computing fingerprints: {e}")
+        return {}
+
+
+def fingerprints_from_image(rgb, algorithms=DEFAULT_ALGORITHMS):
+    """Fingerprints of an already decoded RGB image reduced as open_reduced does."""
+    with metrics.timed("fingerprint"):
+        gray = rgb.convert("L")
+        return {name: str(ALGORITHMS[name](gray, rgb)) for name in algorithms}
+
+
+def generate_fingerprints(file_bytes, algorithms=DEFAULT_ALGORITHMS):
+    """Compute SHA-256 and the fingerprint dict from bytes, a path or a file-like object."""
+    if isinstance(file_bytes, (bytes, bytearray)):
+        sha256 = generate_sha256(file_bytes)
+    else:
+        sha256 = generate_sha256_stream(file_bytes)
+        if hasattr(file_bytes, "seek"):
+            file_bytes.seek(0)
+    return sha256, compute_fingerprints(file_bytes, algorithms)
+
+
+def generate_fingerprints_and_cid(file_bytes, algorithms=DEFAULT_ALGORITHMS):
+    """generate_fingerprints plus the content's CIDv1, built from the same SHA-256 pass; for files about to be pinned."""
+    builder = CIDBuilder()
+    sha256 = generate_sha256_stream(file_bytes, consumers=(builder.update,))
+    if hasattr(file_bytes, "seek"):
+        file_bytes.seek(0)
+    return sha256, compute_fingerprints(file_bytes, algorithms), builder.cid()
+
+
+def _distance(a, b):
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def cascade_match(query, candidate, cascade=CASCADE, fallback_distance=None):
+    """Return True if every stage both records carry is within its threshold.
+
+    If no confirming stage (after the first) could be evaluated, the first
+    stage's hash must also be within `fallback_distance` when one is given.
+    """
+    confirmed = False
+    for i, (name, max_distance) in enumerate(cascade):
+        a, b = query.get(name), candidate.get(name)
+        if a is None or b is None:
+            continue
+        if _distance(a, b) > max_distance:
+            return False
+        confirmed = confirmed or i > 0
+    if not confirmed and fallback_distance is not None:
+        name = cascade[0][0]
+        a, b = query.get(name), candidate.get(name)
+        return a is not None and b is not None and _distance(a, b) <= fallback_distance
+    return True
@@ -0,0 +1,57 @@
+# utils/hamming.py
+# NumPy is imported inside the array helpers so storage, which only needs the
+# int conversions, stays cheap to import.
+
+_INT64_SIGN = 1 << 63
+_UINT64_RANGE = 1 << 64
+
+# Per-byte popcount table for NumPy builds without np.bitwise_count, built on first use
+_POPCOUNT8 = None
+
+
+def phash_to_int(phash):
+    """Convert a hex hash to the signed 64-bit int SQLite can store."""
+    if not phash:
+        return None
+    value = int(phash, 16)
+    return value - _UINT64_RANGE if value >= _INT64_SIGN else value
+
+
+def int_to_phash(value, bits=64):
+    """Convert a stored signed int back to its hex hash."""
+    if value is None:
+        return None
+    return format(value % _UINT64_RANGE, f"0{bits // 4}x")
+
+
+def to_uint64(value):
+    """Map a stored signed int onto the unsigned 64-bit hash it encodes."""
+    return value % _UINT64_RANGE
+
+
+def popcount64(arr):
+    """Element-wise popcount of a uint64 array."""
+    global _POPCOUNT8
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(arr).astype(np.uint8)
+    if _POPCOUNT8 is None:
+        _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    arr = np.ascontiguousarray(arr, dtype=np.uint64)
+    return _POPCOUNT8[arr.view(np.uint8)].reshape(arr.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(queries, hashes):
+    """Bit distances between query hash(es) and a uint64 array in one pass.
+
+    A scalar query returns shape (len(hashes),); an array of queries returns
+    shape (len(queries), len(hashes)).
+    """
+    import numpy as np
+
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    queries = np.asarray(queries, dtype=np.uint64)
+    if queries.ndim == 0:
+        return popcount64(hashes ^ queries)
+    return popcount64(queries[:, None] ^ hashes[None, :])
@@ -1,19 +1,100 @@
 # utils/hasher.py
 import hashlib
 import io
+import mmap
+import os
 from PIL import Image
 import imagehash
 
+from utils import metrics
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB read buffer for streaming hashes
+HASH_DECODE_SIZE = 64  # shortest edge decoded for perceptual hashing (aHash needs 8x8)
+
 def generate_sha256(file_bytes):
     """Compute SHA-256 hash from file bytes."""
-    sha256_hash = hashlib.sha256()
-    sha256_hash.update(file_bytes)
-    return sha256_hash.hexdigest()
+    with metrics.timed("sha256"):
+        sha256_hash = hashlib.sha256()
+        sha256_hash.update(file_bytes)
+        return sha256_hash.hexdigest()
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield memoryview chunks from a path, file-like object, bytes or iterable of chunks.
+
+    Paths are mmapped and file-like objects are read into one reusable buffer,
+    so a chunk is only valid until the next one is produced. Consumers that
+    keep data must copy it.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    for start in range(0, len(view), chunk_size):
+                        # Released eagerly so the mmap can close once we're done
+                        with view[start:start + chunk_size] as chunk:
+                            yield chunk
+    elif hasattr(source, "readinto"):
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            n = source.readinto(buffer)
+            if not n:
+                break
+            yield view[:n]
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield memoryview(chunk)
+    else:
+        for chunk in source:
+            yield memoryview(chunk)
+
+def generate_sha256_stream(source, consumers=(), chunk_size=CHUNK_SIZE):
+    """Compute SHA-256 over a stream in constant memory.
+
+    `source` is anything iter_chunks accepts. Each chunk is also passed to
+    every callable in `consumers` (e.g. an upload body writer), so the data
+    is read once for all of them.
+    """
+    with metrics.timed("sha256"):
+        sha256_hash = hashlib.sha256()
+        for chunk in iter_chunks(source, chunk_size):
+            sha256_hash.update(chunk)
+            for consume in consumers:
+                consume(chunk)
+        return sha256_hash.hexdigest()
+
+def open_reduced(source, min_size=HASH_DECODE_SIZE, mode="L"):
+    """Decode an image at the smallest scale whose short edge is >= min_size.
+
+    JPEGs use draft mode, so libjpeg scales by 1/2..1/8 during the DCT and
+    never produces the full-resolution bitmap. Other formats are decoded in
+    full and box-reduced by an integer factor, which is much cheaper than
+    the Lanczos resize the hash would otherwise run on the whole image.
+    """
+    with metrics.timed("decode"):
+        img = Image.open(source)
+        img.draft(mode, (min_size, min_size))
+        return reduce_to(img.convert(mode), min_size)
+
+def reduce_to(img, min_size=HASH_DECODE_SIZE):
+    """Box-reduce a decoded image by the largest integer factor keeping its short edge >= min_size."""
+    factor = min(img.size) // min_size
+    return img.reduce(factor) if factor >= 2 else img
 
 def generate_phash(file_bytes):
-    """Compute perceptual hash from image bytes."""
+    """Compute perceptual hash from image bytes, a path or a file-like object."""
     try:
-        img = Image.open(io.BytesIO(file_bytes))
+        source = io.BytesIO(file_bytes) if isinstance(file_bytes, (bytes, bytearray)) else file_bytes
+        img = open_reduced(source)
         phash = str(imagehash.average_hash(img))  # or imagehash.phash for difference hash
         return phash
     except Exception as e:
@@ -21,7 +102,12 @@ def generate_phash(file_bytes):
         return None
 
 def generate_hashes(file_bytes):
-    """Compute both SHA-256 and perceptual hash."""
-    sha256 = generate_sha256(file_bytes)
+    """Compute both SHA-256 and perceptual hash from bytes, a path or a file-like object."""
+    if isinstance(file_bytes, (bytes, bytearray)):
+        sha256 = generate_sha256(file_bytes)
+    else:
+        sha256 = generate_sha256_stream(file_bytes)
+        if hasattr(file_bytes, "seek"):
+            file_bytes.seek(0)
     phash = generate_phash(file_bytes)
-    return sha256, phash
\ No newline at end of file
+    return sha256, phash
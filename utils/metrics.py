@@ -0,0 +1,168 @@
+# utils/metrics.py
+"""In-process latency histograms and counters with Prometheus text export.
+
+Hot paths wrap a stage in `timed("decode")` or call `count("new_files")`;
+the dashboard reads `summary()` and a scraper reads `export_prometheus()`
+(optionally served over HTTP by `serve(port)`).
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, spanning sub-millisecond hashing to minute-long confirmations
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+STAGE_METRIC = "deduvault_stage_duration_seconds"
+EVENT_METRIC = "deduvault_events_total"
+
+START_TIME = time.time()
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation within its bucket (like histogram_quantile)."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+_lock = threading.Lock()
+_stages = {}
+_events = {}
+
+
+def observe(stage, seconds):
+    """Record one duration for `stage`."""
+    hist = _stages.get(stage)
+    if hist is None:
+        with _lock:
+            hist = _stages.setdefault(stage, Histogram())
+    hist.observe(seconds)
+
+
+def count(event, n=1):
+    """Add n to the `event` counter."""
+    with _lock:
+        _events[event] = _events.get(event, 0) + n
+
+
+@contextmanager
+def timed(stage):
+    """Time the block as `stage`; exceptions are also counted as `<stage>_errors`."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        count(f"{stage}_errors")
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def counters():
+    with _lock:
+        return dict(_events)
+
+
+def summary():
+    """{stage: {"count", "p50_s", "p95_s", "mean_s"}} for every stage seen so far."""
+    with _lock:
+        stages = dict(_stages)
+    return {
+        stage: {
+            "count": hist.count,
+            "p50_s": hist.quantile(0.50),
+            "p95_s": hist.quantile(0.95),
+            "mean_s": hist.sum / hist.count if hist.count else None,
+        }
+        for stage, hist in sorted(stages.items())
+    }
+
+
+def _format(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def export_prometheus():
+    """Render every histogram and counter in the Prometheus text exposition format."""
+    with _lock:
+        stages, events = dict(_stages), dict(_events)
+    lines = [
+        f"# HELP {STAGE_METRIC} Time spent in each pipeline stage.",
+        f"# TYPE {STAGE_METRIC} histogram",
+    ]
+    for stage, hist in sorted(stages.items()):
+        with hist._lock:
+            counts, total, sum_ = list(hist.counts), hist.count, hist.sum
+        cumulative = 0
+        for bound, n in zip(hist.buckets + (float("inf"),), counts):
+            cumulative += n
+            lines.append(f'{STAGE_METRIC}_bucket{{stage="{stage}",le="{_format(bound)}"}} {cumulative}')
+        lines.append(f'{STAGE_METRIC}_sum{{stage="{stage}"}} {sum_!r}')
+        lines.append(f'{STAGE_METRIC}_count{{stage="{stage}"}} {total}')
+    lines += [
+        f"# HELP {EVENT_METRIC} Pipeline events (uploads, duplicates, errors, retries).",
+        f"# TYPE {EVENT_METRIC} counter",
+    ]
+    for event, n in sorted(events.items()):
+        lines.append(f'{EVENT_METRIC}{{event="{event}"}} {n}')
+    lines += [
+        "# HELP deduvault_process_start_time_seconds Unix time the process started.",
+        "# TYPE deduvault_process_start_time_seconds gauge",
+        f"deduvault_process_start_time_seconds {START_TIME!r}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve /metrics on a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = export_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
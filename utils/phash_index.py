@@ -0,0 +1,121 @@
+# utils/phash_index.py
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+
+import numpy as np
+
+from utils.hamming import hamming_distances, to_uint64
+
+# Rows of the query x hashes distance matrix computed per batch step
+_BATCH_CELLS = 1 << 22
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes."""
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits, radius):
+    """All masks of `bits` width with at most `radius` bits set."""
+    masks = []
+    for r in range(radius + 1):
+        for positions in combinations(range(bits), r):
+            mask = 0
+            for p in positions:
+                mask |= 1 << p
+            masks.append(mask)
+    return tuple(masks)
+
+
+class PhashIndex:
+    """Multi-index hash table over 64-bit perceptual hashes.
+
+    Each hash is split into `bits // chunk_bits` substrings and every substring
+    gets its own bucket table. By the pigeonhole principle two hashes within
+    distance k share at least one substring within distance k // chunks, so a
+    radius query only probes a handful of buckets instead of every row.
+
+    The hashes themselves live in one contiguous uint64 array, so candidate
+    verification, wide-radius scans and batch queries are single XOR+popcount
+    passes in NumPy.
+    """
+
+    def __init__(self, bits=64, chunk_bits=16):
+        if bits % chunk_bits:
+            raise ValueError("bits must be a multiple of chunk_bits")
+        self.bits = bits
+        self.chunk_bits = chunk_bits
+        self.chunks = bits // chunk_bits
+        self._chunk_mask = (1 << chunk_bits) - 1
+        self._tables = [defaultdict(list) for _ in range(self.chunks)]
+        self._keys = []
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def hashes(self):
+        """Contiguous uint64 view of every indexed hash, in insertion order."""
+        return self._hashes[:len(self._keys)]
+
+    def _substrings(self, value):
+        return [(value >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def add(self, key, value):
+        """Index `value` (an int hash, signed or unsigned) under `key`."""
+        value = to_uint64(value)
+        pos = len(self._keys)
+        if pos == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[pos] = value
+        self._keys.append(key)
+        for table, sub in zip(self._tables, self._substrings(value)):
+            table[sub].append(pos)
+
+    def _matches(self, positions, distances, max_distance):
+        hits = distances <= max_distance
+        positions, distances = positions[hits], distances[hits]
+        order = np.argsort(distances, kind="stable")
+        return [(self._keys[p], int(d)) for p, d in zip(positions[order], distances[order])]
+
+    def scan(self, value, max_distance):
+        """Brute-force radius query over the whole hash array."""
+        distances = hamming_distances(to_uint64(value), self.hashes)
+        return self._matches(np.arange(len(self._keys)), distances, max_distance)
+
+    def query(self, value, max_distance):
+        """Return all (key, distance) pairs within `max_distance`, nearest first."""
+        value = to_uint64(value)
+        radius = min(max_distance // self.chunks, self.chunk_bits)
+        masks = _flip_masks(self.chunk_bits, radius)
+        # Probing costs more than a vectorized scan for wide radii or tiny indexes
+        if len(masks) * self.chunks >= len(self._keys):
+            return self.scan(value, max_distance)
+
+        candidates = set()
+        for table, sub in zip(self._tables, self._substrings(value)):
+            for mask in masks:
+                bucket = table.get(sub ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        if not candidates:
+            return []
+
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = hamming_distances(value, self._hashes[positions])
+        return self._matches(positions, distances, max_distance)
+
+    def query_batch(self, values, max_distance):
+        """Radius query for many hashes; returns one match list per value."""
+        queries = np.array([to_uint64(v) for v in values], dtype=np.uint64)
+        hashes = self.hashes
+        positions = np.arange(len(hashes))
+        step = max(1, _BATCH_CELLS // max(len(hashes), 1))
+        results = []
+        for start in range(0, len(queries), step):
+            distances = hamming_distances(queries[start:start + step], hashes)
+            results.extend(self._matches(positions, row, max_distance) for row in distances)
+        return results
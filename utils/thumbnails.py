@@ -0,0 +1,174 @@
+# utils/thumbnails.py
+"""Decode-once upload pipeline and a bounded, content-addressed thumbnail cache.
+
+decode_upload() opens an upload once and derives from that decode:
+
+- the reduced image the fingerprints are computed from, bit-identical to
+  compute_fingerprints;
+- the display image that UI thumbnails are rendered from.
+
+Thumbnails are JPEGs cached on disk under the file's SHA-256, so the UI
+serves a few tens of KB per widget instead of the full original, and
+re-renders nothing for an image it has seen before.
+"""
+import io
+import os
+import threading
+
+from PIL import Image
+
+from utils import metrics
+from utils.fingerprint import DEFAULT_ALGORITHMS, fingerprints_from_image
+from utils.hasher import HASH_DECODE_SIZE, generate_sha256, open_reduced, reduce_to
+
+THUMBNAIL_DIR = os.path.join("data", "thumbnails")
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+PREVIEW_SIZE = 640  # longest edge of the upload preview
+CARD_SIZE = 320  # longest edge of the e-commerce cards
+THUMBNAIL_SIZES = (PREVIEW_SIZE, CARD_SIZE)
+JPEG_QUALITY = 85
+DCT_FORMATS = ("JPEG", "MPO")  # formats PIL can decode at 1/2..1/8 scale via draft()
+
+
+class ThumbnailCache:
+    """Thumbnails at <directory>/<sha256[:2]>/<sha256>-<size>.jpg, least recently used evicted past max_bytes."""
+
+    def __init__(self, directory=THUMBNAIL_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = sum(os.path.getsize(path) for path, _ in self._entries())
+
+    def _entries(self):
+        """(path, last use) for every cached thumbnail."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for sub in os.scandir(self.directory):
+            if sub.is_dir():
+                entries += [(e.path, e.stat().st_mtime) for e in os.scandir(sub.path) if e.name.endswith(".jpg")]
+        return entries
+
+    def path(self, sha256, size):
+        return os.path.join(self.directory, sha256[:2], f"{sha256}-{size}.jpg")
+
+    def get(self, sha256, size):
+        path = self.path(sha256, size)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as last use for eviction
+        except FileNotFoundError:
+            metrics.count("thumbnail_misses")
+            return None
+        metrics.count("thumbnail_hits")
+        return data
+
+    def put(self, sha256, size, data):
+        path = self.path(sha256, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used thumbnails down to 90% of max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(os.path.getsize(path) for path, _ in entries)
+        for path, _ in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                total -= os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._bytes = total
+
+
+def render_thumbnail(img, size):
+    """JPEG bytes of img scaled to fit size x size, transparency flattened onto white."""
+    thumb = img.copy()
+    thumb.thumbnail((size, size), reducing_gap=2.0)
+    if thumb.mode in ("RGBA", "LA", "P"):
+        thumb = thumb.convert("RGBA")
+        background = Image.new("RGB", thumb.size, "white")
+        background.paste(thumb, mask=thumb.getchannel("A"))
+        thumb = background
+    buf = io.BytesIO()
+    thumb.convert("RGB").save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return buf.getvalue()
+
+
+def _open_for_display(file_bytes, size):
+    """Decode at the smallest DCT scale covering size x size (full decode for other formats)."""
+    with metrics.timed("decode"):
+        img = Image.open(io.BytesIO(file_bytes))
+        img.draft("RGB", (size, size))
+        img.load()
+    return img
+
+
+def _decode(file_bytes, display_size=None):
+    """Return (reduced RGB image for hashing, display image or None) from as few decodes as the format allows.
+
+    Formats without DCT scaling (PNG, WebP, ...) are decoded once at full size
+    and both images derive from it. A JPEG's hash image must come from the
+    1/8-scale DCT decode that stored hashes were made with, so its display
+    image (only decoded if display_size is given) is a second decode, also
+    DCT-scaled, never at full resolution.
+    """
+    img = Image.open(io.BytesIO(file_bytes))
+    if img.format in DCT_FORMATS:
+        display = _open_for_display(file_bytes, display_size) if display_size else None
+        return open_reduced(io.BytesIO(file_bytes), mode="RGB"), display
+    with metrics.timed("decode"):
+        img.load()
+    return reduce_to(img.convert("RGB"), HASH_DECODE_SIZE), img
+
+
+def _render(display, sha256, size, cache):
+    with metrics.timed("thumbnail"):
+        data = render_thumbnail(display, size)
+    if cache is not None:
+        cache.put(sha256, size, data)
+    return data
+
+
+def decode_upload(file_bytes, cache=None, sizes=THUMBNAIL_SIZES, algorithms=DEFAULT_ALGORITHMS):
+    """Return (sha256, fingerprints, {size: JPEG thumbnail bytes}) for an uploaded image.
+
+    Thumbnails already in `cache` are reused (a JPEG then isn't decoded for
+    display at all), and new ones are stored there. fingerprints is {} when
+    the bytes aren't a decodable image (no thumbnails then).
+    """
+    sha256 = generate_sha256(file_bytes)
+    thumbnails = {size: cache.get(sha256, size) for size in sizes} if cache is not None else {}
+    missing = [size for size in sizes if thumbnails.get(size) is None]
+    try:
+        hash_rgb, display = _decode(file_bytes, max(missing, default=None))
+        fingerprints = fingerprints_from_image(hash_rgb, algorithms)
+    except Exception as e:
+        print(f"Error decoding image: {e}")
+        return sha256, {}, {}
+    for size in missing:
+        thumbnails[size] = _render(display, sha256, size, cache)
+    return sha256, fingerprints, thumbnails
+
+
+def thumbnail(file_bytes, sha256, size, cache=None):
+    """One thumbnail, served from cache or rendered from a single reduced decode; None if undecodable."""
+    data = cache.get(sha256, size) if cache is not None else None
+    if data is not None:
+        return data
+    try:
+        display = _open_for_display(file_bytes, size)
+    except Exception as e:
+        print(f"Error decoding image: {e}")
+        return None
+    return _render(display, sha256, size, cache)
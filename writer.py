@@ -0,0 +1,123 @@
+"""Single-writer queue for new `files` rows, committed in groups.
+
+Uploads hand their insert to one writer thread instead of each opening a
+transaction. The writer commits whatever queued while the previous commit
+ran (up to MAX_BATCH rows) in one transaction, so groups grow with load.
+A positive flush_interval_s also waits that long for more rows, which
+trades latency for bigger groups when commits are slow to sync.
+
+Each row is an `INSERT ... ON CONFLICT DO NOTHING RETURNING`, so the
+caller learns atomically whether its row was new. Two sessions storing
+the same image can no longer both pass as new.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import storage
+from utils import metrics
+
+FLUSH_INTERVAL_S = 0.0
+MAX_BATCH = 256
+
+
+class GroupCommitWriter:
+    def __init__(self, flush_interval_s=FLUSH_INTERVAL_S, max_batch=MAX_BATCH):
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, sha256, phash, file_name, fingerprints=None):
+        """Queue one record; the Future resolves to True if it was new, False if already stored."""
+        future = Future()
+        self._queue.put(((sha256, phash, file_name, fingerprints), future))
+        return future
+
+    def insert(self, sha256, phash, file_name, fingerprints=None):
+        """Blocking submit(): True if the record was new."""
+        return self.submit(sha256, phash, file_name, fingerprints).result()
+
+    def close(self):
+        """Commit everything queued and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if item is None:
+                self._queue.put(None)  # stop after this group
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        conn = None
+        try:
+            while (batch := self._next_batch()) is not None:
+                if conn is None:
+                    try:
+                        conn = storage.connect()
+                    except Exception as e:
+                        # Fail this group and retry the open with the next, rather than leave inserts waiting forever
+                        print(f"Error opening DB for group commit: {e}")
+                        for _, future in batch:
+                            future.set_exception(e)
+                        continue
+                self._commit(conn, batch)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            with metrics.timed("group_commit"), conn:
+                for record, future in batch:
+                    try:
+                        results.append((future, storage.upsert_file(conn, *record)))
+                    except ValueError as e:  # malformed fingerprint hex; fail that record only
+                        future.set_exception(e)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        metrics.count("group_commits")
+        metrics.count("group_commit_rows", len(batch))
+        for future, is_new in results:
+            future.set_result(is_new)
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get():
+    """This process's writer, started on first use (and again after a fork)."""
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                _writer = GroupCommitWriter()
+                _writer_pid = os.getpid()
+    return _writer